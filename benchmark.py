@@ -0,0 +1,148 @@
+"""
+性能基准：测量游戏状态的内存占用、后继状态生成速度，以及保留大量观测时 Layout 的内存
+
+用法:
+    python benchmark.py                      # 默认地图 map_0，4 个 Ghost
+    python benchmark.py -l test_map -g 2 -n 20000
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+import layout as layoutModule
+from pacman import GameState
+
+
+def _initialState(layout, numGhosts):
+    state = GameState()
+    state.initialize(layout, numGhosts)
+    return state
+
+
+def _randomWalk(state, count, rng):
+    """
+    按 Game.run 的回合顺序随机走 count 步（对局结束时从初始状态重新开始），
+    逐个产出 (前一个状态, agentIndex, action)
+    """
+    initial = state
+    agentIndex = 0
+    for i in range(count):
+        if state.isWin() or state.isLose() or state.data._roundComplete:
+            state, agentIndex = initial, 0
+        legal = state.getLegalActions(agentIndex)
+        if legal:
+            action = rng.choice(legal)
+            yield state, agentIndex, action
+            state = state.generateSuccessor(agentIndex, action)
+        agentIndex = (agentIndex + 1) % state.getNumAgents()
+
+
+def measureStateMemory(layout, numGhosts, count=10000, seed=0):
+    """
+    生成 count 个后继状态并全部保留，用 tracemalloc 测量平均每个状态占用的字节数
+    （与前一个状态共享的部分，例如未被修改的食物网格，不重复计算）
+    Returns:
+        每个状态的平均字节数
+    """
+    rng = random.Random(seed)
+    state = _initialState(layout, numGhosts)
+    moves = list(_randomWalk(state, count, rng))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [parent.generateSuccessor(agentIndex, action) for parent, agentIndex, action in moves]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / float(len(kept))
+
+
+def measureSuccessorRate(layout, numGhosts, count=20000, seed=0):
+    """
+    测量 generateSuccessor 的速度
+    Returns:
+        每秒生成的后继状态数
+    """
+    rng = random.Random(seed)
+    state = _initialState(layout, numGhosts)
+    moves = list(_randomWalk(state, count, rng))
+    start = time.perf_counter()
+    for parent, agentIndex, action in moves:
+        parent.generateSuccessor(agentIndex, action)
+    return len(moves) / (time.perf_counter() - start)
+
+
+def measureApplyRate(layout, numGhosts, count=20000, seed=0):
+    """
+    测量原地 apply/undo 的速度（每次 apply 后立即 undo）
+    Returns:
+        每秒执行的 apply/undo 次数
+    """
+    rng = random.Random(seed)
+    state = _initialState(layout, numGhosts)
+    moves = [(GameState(parent), agentIndex, action)
+             for parent, agentIndex, action in _randomWalk(state, count, rng)]
+    start = time.perf_counter()
+    for working, agentIndex, action in moves:
+        working.apply(agentIndex, action)
+        working.undo()
+    return len(moves) / (time.perf_counter() - start)
+
+
+def measureLayoutMemory(layout, numGhosts, turns, observers, seed=0):
+    """
+    随机走 turns 回合，每一步 observers 个观察者各保留一份 state.deepCopy()（与 Game.run 交给 agent 的观测相同），
+    统计这些状态引用的 Layout 实例数和它们占用的总字节数
+    Returns:
+        (Layout 实例数, 字节数)
+    """
+    rng = random.Random(seed)
+    state = _initialState(layout, numGhosts)
+    kept = []
+    for parent, agentIndex, action in _randomWalk(state, turns * state.getNumAgents(), rng):
+        for i in range(observers):
+            kept.append(parent.deepCopy())
+    layouts = dict((id(observation.data.layout), observation.data.layout) for observation in kept)
+    seen = set()
+    return len(layouts), sum([_deepSize(layout, seen) for layout in layouts.values()])
+
+
+def _deepSize(obj, seen):
+    """obj 及其引用的所有对象的总字节数（seen 中的对象不重复计算）"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum([_deepSize(key, seen) + _deepSize(value, seen) for key, value in obj.items()])
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum([_deepSize(item, seen) for item in obj])
+    elif hasattr(obj, '__dict__'):
+        size += _deepSize(obj.__dict__, seen)
+    return size
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description='游戏状态内存占用和后继生成速度基准')
+    parser.add_argument('-l', '--layout', default='map_0', help='地图名称（默认: map_0）')
+    parser.add_argument('-g', '--ghosts', type=int, default=4, help='Ghost 数量（默认: 4）')
+    parser.add_argument('-n', '--count', type=int, default=20000, help='每项测量的状态数（默认: 20000）')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='随机种子（默认: 0）')
+    args = parser.parse_args(argv)
+
+    layout = layoutModule.getLayout(args.layout)
+    if layout is None:
+        raise Exception("The layout " + args.layout + " cannot be found")
+    print("地图: %s (%dx%d)  Ghost: %d  状态数: %d"
+          % (args.layout, layout.width, layout.height, args.ghosts, args.count))
+    print("每个状态内存:      %8.0f bytes" % measureStateMemory(layout, args.ghosts, args.count, args.seed))
+    print("generateSuccessor: %8.0f 次/秒" % measureSuccessorRate(layout, args.ghosts, args.count, args.seed))
+    print("apply/undo:        %8.0f 次/秒" % measureApplyRate(layout, args.ghosts, args.count, args.seed))
+    for turns in (50, 500):
+        for observers in (1, 4):
+            instances, size = measureLayoutMemory(layout, args.ghosts, turns, observers, args.seed)
+            print("Layout 内存（%3d 回合，%d 个观察者）: %d 个实例 %8d bytes" % (turns, observers, instances, size))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,268 @@
+"""
+训练数据导出：把对局逐回合的 (观测, 动作, 奖励) 写成固定大小的 NumPy 分片
+
+与 TurnBasedInterface（每回合一个 pickle 和一张 PNG）不同，DatasetWriter 把记录攒在预先分配的
+数组里，攒满 shardSize 条后交给后台线程写盘，每个字段一个 .npy 文件，读取时可以直接 memory-map：
+
+    writer = DatasetWriter('dataset', shardSize=1024)
+    for i in range(numGames):
+        game = rules.newGame(...)
+        writer.bindGame(game)        # 同时设置 game.exportInterface
+        game.run()
+    writer.close()
+
+    for shard in iterShards('dataset'):
+        observations, actions = shard['observations'], shard['actions']   # np.memmap
+
+每条记录对应一个回合（Pac-Man 和所有存活的鬼各走一步）：
+    observations  uint8  (FEATURE_PLANES, width, height)  回合开始时的状态（编码同 inferenceBroker.stateFeatures）
+    actions       int8   Pac-Man 在该回合的动作（Directions.INDEX）
+    rewards       float32 该回合的得分变化
+    lives         int16  回合开始时的生命数
+    terminal      bool   对局在该回合结束
+    win           bool   对局在该回合以胜利结束
+    games, turns  int32  写入者内的对局编号、回合编号（从 1 开始）
+
+分片命名为 <prefix>-<writerId>-<序号>.<字段>.npy，writerId 默认由主机名、进程号和随机后缀组成，
+多个进程可以写入同一个目录而不冲突。每个写入者把写完的分片追加到自己的 index-<writerId>.jsonl；
+分片的所有文件写完后才记入索引，读取方只会看到完整的分片。
+
+用法:
+    python pacman.py -p GreedyAgent -q -n 20 --dataset dataset
+    python datasetWriter.py dataset          # 汇总目录中的分片
+"""
+import json
+import os
+import queue
+import re
+import socket
+import sys
+import threading
+
+from game import Directions
+from inferenceBroker import stateFeatures
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INDEX_PREFIX = 'index-'
+
+
+def _fields(observationShape):
+    """各字段的 (名称, dtype, 单条记录的形状)"""
+    return [('observations', 'uint8', tuple(observationShape)),
+            ('actions', 'int8', ()),
+            ('rewards', 'float32', ()),
+            ('lives', 'int16', ()),
+            ('terminal', 'bool', ()),
+            ('win', 'bool', ()),
+            ('games', 'int32', ()),
+            ('turns', 'int32', ())]
+
+
+def defaultWriterId():
+    host = re.sub(r'[^A-Za-z0-9_]', '_', socket.gethostname()) or 'host'
+    return '%s-%d-%s' % (host, os.getpid(), os.urandom(3).hex())
+
+
+class DatasetWriter:
+    """
+    收集逐回合的训练记录并分片写盘；可以作为 Game.exportInterface 使用（见 bindGame）
+    """
+
+    def __init__(self, directory, shardSize=1024, writerId=None, prefix='shard', queueSize=2):
+        """
+        Args:
+            directory: 输出目录（不存在时创建）
+            shardSize: 每个分片的记录数（最后一个分片可能更少）
+            writerId: 写入者标识，出现在分片和索引文件名中；默认由主机名、进程号和随机后缀组成
+            prefix: 分片文件名前缀
+            queueSize: 等待后台线程写盘的分片数上限，写盘跟不上时 add 会阻塞
+        """
+        if np is None:
+            raise Exception("DatasetWriter requires numpy (pip install numpy)")
+        self.directory = directory
+        self.shardSize = max(1, int(shardSize))
+        self.writerId = writerId or defaultWriterId()
+        self.prefix = prefix
+        self.indexPath = os.path.join(directory, '%s%s.jsonl' % (INDEX_PREFIX, self.writerId))
+        os.makedirs(directory, exist_ok=True)
+        self.records = 0
+        self.shards = 0
+        self.gamesWritten = 0
+        self.error = None
+        self.game = None
+        self._previous = None
+        self._buffers = None
+        self._count = 0
+        self._queue = queue.Queue(max(1, int(queueSize)))
+        self._thread = threading.Thread(target=self._run, name='DatasetWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # ---------- 作为 Game.exportInterface ----------
+
+    def bindGame(self, game):
+        """开始记录一局：记下初始状态，并把自己设为 game.exportInterface"""
+        self.gamesWritten += 1
+        self.game = game
+        game.exportInterface = self
+        self._previous = self._snapshot(game.state)
+
+    def export_turn(self, state, turn):
+        """Game 每完成一个回合调用一次：记录上一回合开始时的观测、本回合的动作和得分变化"""
+        self._record(state, turn, False)
+        self._previous = self._snapshot(state)
+        return None, None
+
+    def finalize_game(self, score):
+        """对局结束：结束的那个回合不会经过 export_turn，在这里作为终止记录写入"""
+        if self.game is None:
+            return
+        state = self.game.state
+        self._record(state, self.game.numMoves + 1, True)
+        self.game = None
+        self._previous = None
+
+    def _snapshot(self, state):
+        return stateFeatures(state), state.getScore(), state.data.lives
+
+    def _record(self, state, turn, terminal):
+        observation, score, lives = self._previous
+        action = self.game.lastActions[0]
+        self.add(observation, Directions.INDEX[action] if action is not None else Directions.INDEX[Directions.STOP],
+                 state.getScore() - score, lives, terminal, terminal and state.isWin(), self.gamesWritten, turn)
+
+    # ---------- 通用接口 ----------
+
+    def add(self, observation, action, reward, lives, terminal, win, game, turn):
+        """追加一条记录；观测的形状改变时（换了地图）先结束当前分片"""
+        if self.error is not None:
+            raise self.error
+        if self._buffers is not None and self._buffers['observations'].shape[1:] != observation.shape:
+            self._submit()
+        if self._buffers is None:
+            self._buffers = dict((name, np.empty((self.shardSize,) + shape, dtype=dtype))
+                                 for name, dtype, shape in _fields(observation.shape))
+        row = self._count
+        buffers = self._buffers
+        buffers['observations'][row] = observation
+        buffers['actions'][row] = action
+        buffers['rewards'][row] = reward
+        buffers['lives'][row] = lives
+        buffers['terminal'][row] = terminal
+        buffers['win'][row] = win
+        buffers['games'][row] = game
+        buffers['turns'][row] = turn
+        self._count += 1
+        self.records += 1
+        if self._count == self.shardSize:
+            self._submit()
+
+    def close(self):
+        """写出未满的分片，等待后台线程写完所有分片"""
+        if self._thread is None:
+            return
+        if self._count:
+            self._submit()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self.error is not None:
+            raise self.error
+
+    def _submit(self):
+        buffers, count = self._buffers, self._count
+        self._buffers, self._count = None, 0
+        if count:
+            name = '%s-%s-%05d' % (self.prefix, self.writerId, self.shards)
+            self.shards += 1
+            # 交出整块缓冲区，主线程接着写新分配的缓冲区，不需要复制
+            self._queue.put((name, dict((key, array[:count]) for key, array in buffers.items()), count))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self._writeShard(*item)
+            except Exception as e:
+                self.error = e
+
+    def _writeShard(self, name, arrays, count):
+        files = {}
+        for key, array in arrays.items():
+            filename = '%s.%s.npy' % (name, key)
+            path = os.path.join(self.directory, filename)
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, array)
+            os.replace(path + '.tmp', path)
+            files[key] = filename
+        games = arrays['games']
+        entry = {'shard': name, 'records': count, 'games': [int(games[0]), int(games[-1])],
+                 'observationShape': list(arrays['observations'].shape[1:]), 'files': files}
+        with open(self.indexPath, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def __str__(self):
+        return '%d records in %d shards (%s)' % (self.records, self.shards, self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excinfo):
+        self.close()
+
+
+def readIndex(directory):
+    """读取目录中所有写入者的索引，返回分片条目的列表（按写入者、序号排序）"""
+    entries = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith(INDEX_PREFIX) and filename.endswith('.jsonl'):
+            with open(os.path.join(directory, filename)) as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+    return entries
+
+
+def openShard(directory, entry, mmap=True):
+    """打开一个分片：返回 字段名 -> 数组；mmap 为 True 时数组是只读的 np.memmap"""
+    if np is None:
+        raise Exception("openShard requires numpy (pip install numpy)")
+    mode = 'r' if mmap else None
+    return dict((key, np.load(os.path.join(directory, filename), mmap_mode=mode))
+                for key, filename in entry['files'].items())
+
+
+def iterShards(directory, mmap=True):
+    for entry in readIndex(directory):
+        yield openShard(directory, entry, mmap)
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description='汇总 DatasetWriter 写出的分片')
+    parser.add_argument('directory', help='数据集目录')
+    args = parser.parse_args(argv)
+
+    entries = readIndex(args.directory)
+    records = sum(entry['records'] for entry in entries)
+    writers = set(entry['shard'].rsplit('-', 1)[0] for entry in entries)
+    print('%d shards from %d writers, %d records' % (len(entries), len(writers), records))
+    terminal = wins = 0
+    actions = np.zeros(len(Directions.ORDER), dtype=np.int64) if entries else None
+    for shard in iterShards(args.directory):
+        terminal += int(shard['terminal'].sum())
+        wins += int(shard['win'].sum())
+        actions += np.bincount(shard['actions'], minlength=len(Directions.ORDER))
+    if entries:
+        print('games: %d (%d wins)' % (terminal, wins))
+        print('actions: ' + ' '.join('%s=%d' % (action, count) for action, count in zip(Directions.ORDER, actions)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
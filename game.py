@@ -21,9 +21,15 @@
 # For more info, see http://inst.eecs.berkeley.edu/~cs188/sp09/pacman.html
 
 from util import *
-import time, os
+import time, os, random
+import asyncio
+import inspect
+import threading
 import traceback
 import sys
+from functools import reduce
+from itertools import chain, compress
+from operator import xor
 
 #######################
 # Parts worth reading #
@@ -36,6 +42,10 @@ class Agent:
 
     def registerInitialState(self, state): # inspects the starting state
     """
+    # 限时对局中由 Game 在每次调用前设置：本次调用应当返回的时间点（time.time()），
+    # 可以中途停止的 agent（例如迭代加深搜索）据此提前结束，None 表示不限时
+    moveDeadline = None
+
     def __init__(self, index=0):
         self.index = index
 
@@ -67,6 +77,146 @@ class Directions:
                WEST: EAST,
                STOP: STOP}
 
+    # 紧凑编码：方向 <-> 0..4 的整数（录像文件等使用）
+    ORDER = [NORTH, SOUTH, EAST, WEST, STOP]
+    INDEX = dict([(d, i) for i, d in enumerate(ORDER)])
+
+class ActionDistribution:
+    """
+    动作上的概率分布：5 个槽位按 Directions.ORDER 排列的定长数组
+
+    用来替代 util.Counter 作为 GhostAgent.getDistribution 的返回值：构造和采样都不需要
+    字典和排序。保留了 Counter 的常用接口（d[action]、d[action] += p、items()、keys()、
+    len()、normalize()），因此搜索 agent 等按 Counter 使用分布的代码不需要修改；
+    util.chooseFromDistribution 对两种分布都适用。
+
+    采样时累积概率按动作名称的字母顺序求和，与 util.sample 对 Counter 排序后的顺序相同，
+    所以同一个随机数种子下选出的动作与返回 Counter 时一致。
+    """
+    __slots__ = ('weights', '_cumulative')
+
+    # 采样顺序：槽位下标按动作名称排序
+    SAMPLE_ORDER = sorted(range(len(Directions.ORDER)), key=lambda i: Directions.ORDER[i])
+
+    def __init__(self, weights=None):
+        """
+        Args:
+            weights: 按 Directions.ORDER 排列的 5 个权重，为 None 时全部为 0
+        """
+        self.weights = [0.0] * len(Directions.ORDER) if weights is None else list(weights)
+        self._cumulative = None
+
+    def uniform(actions):
+        """actions 上的均匀分布"""
+        dist = ActionDistribution()
+        if actions:
+            weights = dist.weights
+            p = 1.0 / len(actions)
+            for action in actions:
+                weights[Directions.INDEX[action]] += p
+        return dist
+    uniform = staticmethod(uniform)
+
+    def __getitem__(self, action):
+        return self.weights[Directions.INDEX[action]]
+
+    def __setitem__(self, action, weight):
+        self.weights[Directions.INDEX[action]] = weight
+        self._cumulative = None
+
+    def __contains__(self, action):
+        return self.weights[Directions.INDEX[action]] > 0
+
+    def __len__(self):
+        """权重非零的动作数（与 Counter 的 len 一致）"""
+        count = 0
+        for weight in self.weights:
+            if weight:
+                count += 1
+        return count
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [Directions.ORDER[i] for i, weight in enumerate(self.weights) if weight]
+
+    def values(self):
+        return [weight for weight in self.weights if weight]
+
+    def items(self):
+        return [(Directions.ORDER[i], weight) for i, weight in enumerate(self.weights) if weight]
+
+    def totalCount(self):
+        return sum(self.weights)
+
+    def normalize(self):
+        total = float(sum(self.weights))
+        if total == 0:
+            return
+        self.weights = [weight / total for weight in self.weights]
+        self._cumulative = None
+
+    def copy(self):
+        return ActionDistribution(self.weights)
+
+    def sample(self, rng=random):
+        """
+        按分布随机选择一个动作（未归一化的权重也可以）
+        Args:
+            rng: 提供 random() 的随机数生成器，默认使用 random 模块
+        Returns:
+            选中的动作；分布为空时返回 Directions.STOP
+        """
+        cumulative = self._cumulative
+        if cumulative is None:
+            cumulative = []
+            total = 0.0
+            for i in self.SAMPLE_ORDER:
+                total += self.weights[i]
+                cumulative.append(total)
+            self._cumulative = cumulative
+        total = cumulative[-1]
+        if total <= 0:
+            return Directions.STOP
+        choice = rng.random() * total
+        for position, bound in enumerate(cumulative):
+            if choice <= bound and self.weights[self.SAMPLE_ORDER[position]] > 0:
+                return Directions.ORDER[self.SAMPLE_ORDER[position]]
+        # 浮点误差使 choice 略大于总和时，返回最后一个权重非零的动作
+        for i in reversed(self.SAMPLE_ORDER):
+            if self.weights[i] > 0:
+                return Directions.ORDER[i]
+
+    def __eq__(self, other):
+        if isinstance(other, ActionDistribution):
+            return self.weights == other.weights
+        if isinstance(other, dict):
+            return dict(self.items()) == dict([(k, v) for k, v in other.items() if v])
+        return NotImplemented
+
+    def __repr__(self):
+        return 'ActionDistribution(%s)' % dict(self.items())
+
+def _restoreSlots(obj, state, defaults=None):
+    """
+    __slots__ 类共用的 __setstate__：state 可以是 (None, {字段: 值})（当前的 pickle），也可以是
+    加入 __slots__ 之前写出的 pickle 中的实例字典；旧 pickle 中没有的字段取 defaults 中的值，
+    已经不存在的字段忽略
+    """
+    if isinstance(state, tuple):
+        dictState, slotState = state
+        state = dict(dictState or {})
+        state.update(slotState or {})
+    slots = obj.__slots__
+    if defaults:
+        for name, value in defaults.items():
+            if name not in state:
+                setattr(obj, name, value)
+    for name, value in state.items():
+        if name in slots:
+            setattr(obj, name, value)
+
 class Configuration:
     """
     A Configuration holds the (x,y) coordinate of a character, along with its
@@ -75,11 +225,15 @@ class Configuration:
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
     """
+    __slots__ = ('pos', 'direction')
 
     def __init__(self, pos, direction):
         self.pos = pos
         self.direction = direction
 
+    def __setstate__(self, state):
+        _restoreSlots(self, state)
+
     def getPosition(self):
         return (self.pos)
 
@@ -91,7 +245,7 @@ class Configuration:
         return x == int(x) and y == int(y)
 
     def __eq__(self, other):
-        if other == None: return False
+        if not isinstance(other, Configuration): return False
         return (self.pos == other.pos and self.direction == other.direction)
 
     def __hash__(self):
@@ -121,6 +275,8 @@ class AgentState:
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
     """
+    __slots__ = ('start', 'configuration', 'isPacman', 'scaredTimer', 'numCarrying', 'numReturned', 'respawnTimer')
+    _DEFAULTS = {'scaredTimer': 0, 'numCarrying': 0, 'numReturned': 0, 'respawnTimer': 0}
 
     def __init__( self, startConfiguration, isPacman ):
         self.start = startConfiguration
@@ -132,6 +288,9 @@ class AgentState:
         # 复活机制：鬼被吃后的状态
         self.respawnTimer = 0  # 复活倒计时（回合数），0表示存活
 
+    def __setstate__( self, state ):
+        _restoreSlots( self, state, AgentState._DEFAULTS )
+
     def __str__( self ):
         if self.isPacman:
             return "Pacman: " + str( self.configuration )
@@ -139,15 +298,19 @@ class AgentState:
             return "Ghost: " + str( self.configuration )
 
     def __eq__( self, other ):
-        if other == None:
+        if not isinstance( other, AgentState ):
             return False
-        return self.configuration == other.configuration and self.scaredTimer == other.scaredTimer
+        return (self.configuration == other.configuration and self.scaredTimer == other.scaredTimer
+                and self.respawnTimer == other.respawnTimer)
 
     def __hash__(self):
-        return hash(hash(self.configuration) + 13 * hash(self.scaredTimer))
+        return hash((self.configuration, self.scaredTimer, self.respawnTimer))
 
     def copy( self ):
-        state = AgentState( self.start, self.isPacman )
+        # 跳过 __init__，直接复制所有字段（每次生成后继状态都会为每个 agent 调用）
+        state = AgentState.__new__( AgentState )
+        state.start = self.start
+        state.isPacman = self.isPacman
         state.configuration = self.configuration
         state.scaredTimer = self.scaredTimer
         state.numCarrying = self.numCarrying
@@ -196,27 +359,24 @@ class Grid:
         return self.data == other.data
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        return hash(tuple([tuple(column) for column in self.data]))
 
     def copy(self):
-        g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
-        return g
+        return self._withData([list(x) for x in self.data])
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
+        return self._withData(self.data)
+
+    def _withData(self, data):
+        """用现有数据构造网格，不再先分配一份全 False 的数据"""
+        g = Grid.__new__(Grid)
+        g.CELLS_PER_INT = self.CELLS_PER_INT
+        g.width = self.width
+        g.height = self.height
+        g.data = data
         return g
 
     def count(self, item =True ):
@@ -371,88 +531,230 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
+class ZobristTable:
+    """
+    Zobrist 哈希：为状态的每个分量（位置、方向、计时器、糖豆、能量豆、生命数、标志位）
+    预先生成 64 位随机数，状态键为所有分量的异或。
+
+    糖豆/能量豆部分由 GameStateData 在吃豆时增量维护，agent 部分按需计算，
+    因此计算一个状态的键只与 agent 数量有关，与地图大小无关。
+    位置使用两倍坐标，受惊 Ghost 半速移动时的半格位置也能区分。
+    随机数由固定种子和地图尺寸生成，同样尺寸的地图共用一张表（见 forLayout），
+    键在不同进程之间也保持一致。
+    """
+    TIMER_SLOTS = 64    # 计时器/计数超过该范围时截断（只影响哈希分布，不影响相等判断）
+    MASK = (1 << 64) - 1
+    _tables = {}
+
+    def __init__( self, width, height, seed=0x5eed ):
+        self._random = random.Random('%d:%d:%d' % (seed, width, height))
+        bits = lambda count: [self._random.getrandbits(64) for i in range(count)]
+        self.width = width
+        self.height = height
+        cells = width * height
+        self.position = bits(4 * cells)
+        self.direction = dict(zip(Directions.ORDER, bits(len(Directions.ORDER))))
+        self.scared = bits(self.TIMER_SLOTS)
+        self.respawn = bits(self.TIMER_SLOTS)
+        self.food = bits(cells)
+        self.capsule = bits(cells)
+        self.lives = bits(self.TIMER_SLOTS)
+        self.ghostsEaten = bits(self.TIMER_SLOTS)
+        self.win, self.lose, self.roundComplete = bits(3)
+        # 每个 agent 一个奇数乘子，把共享的位置/计时器表区分到不同 agent 上；
+        # toMove 供搜索区分轮到哪个 agent 移动。两者都按需扩展
+        self.agentMix = []
+        self.toMove = []
+
+    def forLayout( layout ):
+        """返回与 layout 尺寸对应的共享表"""
+        size = (layout.width, layout.height)
+        table = ZobristTable._tables.get(size)
+        if table is None:
+            table = ZobristTable._tables[size] = ZobristTable(layout.width, layout.height)
+        return table
+    forLayout = staticmethod( forLayout )
+
+    def _ensureAgents( self, numAgents ):
+        while len(self.agentMix) < numAgents:
+            self.agentMix.append(self._random.getrandbits(64) | 1)
+            self.toMove.append(self._random.getrandbits(64))
+
+    def turnKey( self, agentIndex ):
+        """“轮到 agentIndex 移动”的键分量"""
+        self._ensureAgents(agentIndex + 1)
+        return self.toMove[agentIndex]
+
+    def foodKey( self, pos ):
+        x, y = pos
+        return self.food[x * self.height + y]
+
+    def capsuleKey( self, pos ):
+        x, y = pos
+        return self.capsule[x * self.height + y]
+
+    def foodHash( self, food, capsules ):
+        """糖豆和能量豆部分的完整哈希（状态初始化时计算一次，之后增量维护）"""
+        return self.cellsHash( chain.from_iterable( food.data ), capsules )
+
+    def cellsHash( self, cells, capsules ):
+        """同 foodHash，糖豆按列展开为布尔序列给出（第 x * height + y 项对应 (x, y)）"""
+        key = reduce( xor, compress( self.food, cells ), 0 )
+        for pos in capsules:
+            key ^= self.capsuleKey(pos)
+        return key
+
+    def agentHash( self, data ):
+        """agent 部分（位置、方向、计时器）以及生命数、连续吃鬼数和标志位的哈希"""
+        agentStates = data.agentStates
+        if len(self.agentMix) < len(agentStates):
+            self._ensureAgents(len(agentStates))
+        position, direction, scared, respawn = self.position, self.direction, self.scared, self.respawn
+        mix, limit, doubleHeight, mask = self.agentMix, self.TIMER_SLOTS - 1, 2 * self.height, self.MASK
+        key = 0
+        index = 0
+        for agentState in agentStates:
+            conf = agentState.configuration
+            x, y = conf.pos
+            part = position[int(2 * x) * doubleHeight + int(2 * y)] ^ direction[conf.direction]
+            timer = agentState.scaredTimer
+            if timer:
+                part ^= scared[timer if timer < limit else limit]
+            timer = agentState.respawnTimer
+            if timer:
+                part ^= respawn[timer if timer < limit else limit]
+            key ^= (part * mix[index]) & mask
+            index += 1
+        key ^= self.lives[min(max(data.lives, 0), limit)] ^ self.ghostsEaten[min(data.ghostsEatenInRow, limit)]
+        if data._win: key ^= self.win
+        if data._lose: key ^= self.lose
+        if data._roundComplete: key ^= self.roundComplete
+        return key
+
 class GameStateData:
     """
 
     """
+    __slots__ = ('food', 'capsules', 'agentStates', 'layout', 'score', 'scoreChange', 'lives',
+                 'ghostsEatenInRow', '_eaten', '_foodEaten', '_foodAdded', '_capsuleEaten', '_agentMoved',
+                 '_lose', '_win', '_roundComplete', '_ownsFood', '_explorationTracker', '_foodHash')
+    # 旧 pickle 中可能没有的字段（_foodHash 在 __setstate__ 中重新计算）
+    _DEFAULTS = {'lives': 4, 'ghostsEatenInRow': 0, '_eaten': None, '_foodAdded': None, '_roundComplete': False,
+                 '_ownsFood': False, '_explorationTracker': None}
+
     def __init__( self, prevState = None ):
         """
         Generates a new data packet by copying information from its predecessor.
         """
-        if prevState != None:
+        if prevState is not None:
             self.food = prevState.food.shallowCopy()
+            # 食物网格与前一个状态共享（写时复制），双方都不能再原地修改
+            prevState._ownsFood = False
             self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+            self._foodHash = prevState._foodHash
+            self.agentStates = [agentState.copy() for agentState in prevState.agentStates]
             self.layout = prevState.layout
             self._eaten = prevState._eaten
+            self._explorationTracker = prevState._explorationTracker
             self.score = prevState.score
             self.lives = prevState.lives  # 复制生命数
             self.ghostsEatenInRow = prevState.ghostsEatenInRow  # 复制连续吃鬼计数
             # 复制 _roundComplete 标志（重要：用于无限循环）
-            if hasattr(prevState, '_roundComplete'):
-                self._roundComplete = prevState._roundComplete
-            else:
-                self._roundComplete = False
+            self._roundComplete = prevState._roundComplete
         else:
             self._roundComplete = False  # 标记是否完成一轮（所有食物被吃光）
+            self._explorationTracker = None  # 可选的探索统计（见 pacman.ExplorationTracker）
 
+        self._ownsFood = False
         self._foodEaten = None
         self._foodAdded = None
         self._capsuleEaten = None
         self._agentMoved = None
         self._lose = False
         self._win = False
-        if not hasattr(self, '_roundComplete'):
-            self._roundComplete = False  # 标记是否完成一轮（所有食物被吃光）
         self.scoreChange = 0
 
+    def __getstate__( self ):
+        # 探索统计属于对局而不是状态：不写入 pickle（TurnBasedInterface 导出等），还原后为 None
+        state = dict((name, getattr(self, name)) for name in self.__slots__ if hasattr(self, name))
+        state['_explorationTracker'] = None
+        return None, state
+
+    def __setstate__( self, state ):
+        _restoreSlots( self, state, GameStateData._DEFAULTS )
+        if not hasattr( self, '_foodHash' ):
+            self._foodHash = ZobristTable.forLayout( self.layout ).foodHash( self.food, self.capsules )
+
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
+        state._ownsFood = True
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
         state._capsuleEaten = self._capsuleEaten
-        # 确保生命数和连续吃鬼计数被复制
-        if hasattr(self, 'lives'):
-            state.lives = self.lives
-        if hasattr(self, 'ghostsEatenInRow'):
-            state.ghostsEatenInRow = self.ghostsEatenInRow
-        # 确保 _roundComplete 标志被复制（重要：用于无限循环）
-        if hasattr(self, '_roundComplete'):
-            state._roundComplete = self._roundComplete
         return state
 
+    def ownFood( self ):
+        """
+        在原地修改食物网格之前调用：网格可能与其他状态共享，必要时先复制一份
+        """
+        if not self._ownsFood:
+            self.food = self.food.copy()
+            self._ownsFood = True
+
+    def updateRespawnTimers( self ):
+        """
+        每轮开始时（Pac-Man 移动之前）调用：所有死亡鬼的复活倒计时减一，
+        倒计时归零的鬼在初始位置复活。Game.run、录像回放和搜索模型共用这一逻辑。
+        """
+        for ghostState in self.agentStates[1:]:
+            if ghostState.respawnTimer > 0:
+                ghostState.respawnTimer -= 1
+                # 如果倒计时为0，鬼复活（保持在初始位置）
+                if ghostState.respawnTimer == 0:
+                    # 创建新的Configuration对象，确保configuration和start是独立的
+                    start_pos = ghostState.start.getPosition()
+                    start_dir = ghostState.start.getDirection()
+                    ghostState.configuration = Configuration(start_pos, start_dir)
+                    ghostState.scaredTimer = 0
+
     def copyAgentStates( self, agentStates ):
         copiedStates = []
         for agentState in agentStates:
             copiedStates.append( agentState.copy() )
         return copiedStates
 
+    def stateKey( self ):
+        """
+        状态的 64 位 Zobrist 键，涵盖所有影响之后对局进程的字段（agent 位置/方向/计时器、
+        糖豆、能量豆、生命数、连续吃鬼数和胜负/轮次标志），不包括分数。
+        糖豆部分增量维护，计算代价只与 agent 数量有关。
+        """
+        return self._foodHash ^ ZobristTable.forLayout( self.layout ).agentHash( self )
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
         """
-        if other == None: return False
-        # TODO Check for type of other
+        if not isinstance( other, GameStateData ): return False
+        # 先比较增量维护的糖豆哈希，不同的状态通常在这里就能区分
+        if self._foodHash != other._foodHash: return False
         if not self.agentStates == other.agentStates: return False
-        if not self.food == other.food: return False
-        if not self.capsules == other.capsules: return False
         if not self.score == other.score: return False
+        if not self.lives == other.lives: return False
+        if not self.ghostsEatenInRow == other.ghostsEatenInRow: return False
+        if (self._win, self._lose, self._roundComplete) != (other._win, other._lose, other._roundComplete): return False
+        if not self.capsules == other.capsules: return False
+        if not self.food == other.food: return False
         return True
 
     def __hash__( self ):
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+        return hash( self.stateKey() )
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
@@ -512,8 +814,9 @@ class GameStateData:
         """
         self.food = layout.food.copy()
         #self.capsules = []
-        self.capsules = layout.capsules[:]
+        self.capsules = list(layout.capsules)
         self.layout = layout
+        self._foodHash = ZobristTable.forLayout( layout ).foodHash( self.food, self.capsules )
         self.score = 0
         self.scoreChange = 0
         self.lives = 4  # 初始4条生命
@@ -554,7 +857,7 @@ class Game:
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False, exportInterface=None ):
+    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False, exportInterface=None, recorder=None ):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -564,13 +867,29 @@ class Game:
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
         self.moveHistory = []
+        # 每个 agent 最近一次执行的动作（不受 keepMoveHistory 影响，见 datasetWriter）
+        self.lastActions = [None for agent in agents]
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
         self.agentTimeout = False
+        # 时间预算（见 ClassicGameRules 的 getMoveTimeout 等）：为 True 时每次调用 agent 都在后台线程中
+        # 限时等待，超时的一步用 defaultAction 代替。由 ClassicGameRules.newGame 设置
+        self.enforceTimeouts = False
+        self.agentTimeouts = [0 for agent in agents]
+        self.agentDefaultMoves = [0 for agent in agents]
+        self.agentOutOfTime = [False for agent in agents]
+        self._pendingCalls = [None for agent in agents]
         import io
         self.agentOutput = [io.StringIO() for agent in agents]
+        self._savedStreams = None  # mute 时替换下来的 (stdout, stderr)
         # 回合制接口：用于导出截图和状态
         self.exportInterface = exportInterface
+        # 流式录像：每一步动作都写入 recorder（见 replay.GameRecorder）
+        self.recorder = recorder
+        # 可选的探索统计（见 pacman.ExplorationTracker），由 ClassicGameRules.newGame 设置
+        self.explorationTracker = None
+        # 是否在内存中保留完整的 moveHistory（流式录像时可以关闭，使内存占用不随对局长度增长）
+        self.keepMoveHistory = True
 
     def getProgress(self):
         if self.gameOver:
@@ -585,29 +904,204 @@ class Game:
         self.agentCrashed = True
         self.rules.agentCrash(self, agentIndex)
 
-    OLD_STDOUT = None
-    OLD_STDERR = None
-
     def mute(self, agentIndex):
-        if not self.muteAgents: return
-        global OLD_STDOUT, OLD_STDERR
-        import io
-        OLD_STDOUT = sys.stdout
-        OLD_STDERR = sys.stderr
+        """
+        把 stdout/stderr 重定向到 agent 的输出缓冲。sys.stdout 是进程共享的，同一个事件循环中
+        可能同时进行多个对局，因此只能包住同步的代码，不能跨过 await（见 _muted）
+        """
+        if not self.muteAgents or self._savedStreams is not None: return
+        self._savedStreams = (sys.stdout, sys.stderr)
         sys.stdout = self.agentOutput[agentIndex]
         sys.stderr = self.agentOutput[agentIndex]
 
     def unmute(self):
-        if not self.muteAgents: return
-        global OLD_STDOUT, OLD_STDERR
+        if self._savedStreams is None: return
         # Revert stdout/stderr to originals
-        sys.stdout = OLD_STDOUT
-        sys.stderr = OLD_STDERR
+        sys.stdout, sys.stderr = self._savedStreams
+        self._savedStreams = None
+
+    def _muted(self, agentIndex, function, *args):
+        """
+        静默地同步调用 agent 的方法。返回值是协程时由调用方在恢复输出之后再等待：
+        协程在 await 时才执行，它的输出不会被重定向
+        """
+        self.mute(agentIndex)
+        try:
+            return function(*args)
+        finally:
+            self.unmute()
+
+    def defaultAction(self, agentIndex):
+        """
+        agent 超时或时间用完时代替它执行的动作：能停则停，否则沿当前方向继续，都不行时取第一个合法动作
+        """
+        legal = self.state.getLegalActions(agentIndex)
+        if not legal or Directions.STOP in legal:
+            return Directions.STOP
+        direction = self.state.data.agentStates[agentIndex].configuration.direction
+        if direction in legal:
+            return direction
+        return legal[0]
+
+    def timingReport(self):
+        """有超时、警告或代替动作的 agent 的时间统计，没有时返回空字符串"""
+        lines = []
+        for i in range(len(self.agents)):
+            if self.agentTimeouts[i] or self.totalAgentTimeWarnings[i] or self.agentDefaultMoves[i]:
+                lines.append('Agent %d: %.2fs total, %d warnings, %d timeouts, %d default moves%s'
+                             % (i, self.totalAgentTimes[i], self.totalAgentTimeWarnings[i], self.agentTimeouts[i],
+                                self.agentDefaultMoves[i], ' (out of time)' if self.agentOutOfTime[i] else ''))
+        return '\n'.join(lines)
+
+    def _remainingTime(self, agentIndex):
+        "本局剩余的总时间预算，None 表示不限制"
+        maxTotal = self.rules.getMaxTotalTime(agentIndex)
+        if not maxTotal:
+            return None
+        return maxTotal - self.totalAgentTimes[agentIndex]
+
+    async def _registerAgent(self, agentIndex, agent):
+        if not self.enforceTimeouts:
+            await _resolve(self._muted(agentIndex, agent.registerInitialState, self.state.deepCopy()))
+            return
+        limit = self.rules.getMaxStartupTime(agentIndex)
+        finished, result = await self._callWithDeadline(agentIndex, agent, agent.registerInitialState,
+                                                        self.state.deepCopy(), limit)
+        if not finished:
+            # 初始化没有按时完成：之后的调用在它返回前都用默认动作代替
+            self.agentTimeouts[agentIndex] += 1
+
+    async def _solicitAction(self, agentIndex, agent, observation):
+        """
+        向 agent 请求一个动作。限时对局中：
+        - 超过 getMoveTimeout（以及剩余的总时间）仍未返回时，本步用 defaultAction 代替并计一次超时，
+          agent 的调用在后台继续，返回之前它的每一步都用默认动作代替
+        - 超过 getMoveWarningTime 时计一次警告，警告超过 getMaxTimeWarnings 次或总时间用完后，
+          本局剩余的步数都用默认动作代替
+        """
+        if not self.enforceTimeouts:
+            return await _resolve(self._muted(agentIndex, agent.getAction, observation))
+        pending = self._pendingCalls[agentIndex]
+        if pending is not None:
+            if not pending.done():
+                self.agentDefaultMoves[agentIndex] += 1
+                return self.defaultAction(agentIndex)
+            self._pendingCalls[agentIndex] = None
+            if not pending.cancelled() and pending.exception() is not None:
+                raise pending.exception()
+        remaining = self._remainingTime(agentIndex)
+        if self.agentOutOfTime[agentIndex] or (remaining is not None and remaining <= 0):
+            self._outOfTime(agentIndex)
+            self.agentDefaultMoves[agentIndex] += 1
+            return self.defaultAction(agentIndex)
+
+        limit = self.rules.getMoveTimeout(agentIndex)
+        if remaining is not None:
+            limit = remaining if limit is None else min(limit, remaining)
+        warning = self.rules.getMoveWarningTime(agentIndex)
+        start_time = time.time()
+        finished, action = await self._callWithDeadline(agentIndex, agent, agent.getAction, observation,
+                                                        limit, warning)
+        if not finished:
+            self.agentTimeouts[agentIndex] += 1
+            self.agentDefaultMoves[agentIndex] += 1
+            return self.defaultAction(agentIndex)
+        if warning is not None and time.time() - start_time > warning:
+            self.totalAgentTimeWarnings[agentIndex] += 1
+            maxWarnings = self.rules.getMaxTimeWarnings(agentIndex)
+            if maxWarnings is not None and self.totalAgentTimeWarnings[agentIndex] > maxWarnings:
+                self._outOfTime(agentIndex)
+        return action
+
+    def _outOfTime(self, agentIndex):
+        if not self.agentOutOfTime[agentIndex]:
+            self.agentOutOfTime[agentIndex] = True
+            self.agentTimeout = True
+            if not getattr(self.rules, 'quiet', False):
+                print("Agent %d ran out of time; it plays default moves for the rest of the game" % agentIndex,
+                      file=sys.stderr)
+
+    async def _callWithDeadline(self, agentIndex, agent, function, argument, limit, softLimit=None):
+        """
+        在后台线程中调用 agent 的方法，最多等待 limit 秒（协程方法直接在事件循环中限时等待）。
+        不使用 SIGALRM，因此 Game 在任何线程或事件循环中运行时都有效；超时的调用无法被打断，
+        会在后台继续运行到返回为止。调用前设置 agent.moveDeadline，支持提前停止的 agent 可以按时返回。
+        后台线程中的调用不静默（muteAgents）：重定向 sys.stdout 会影响整个进程。
+        定义了 pollAction 的交互式 agent 例外，在当前线程中直接调用（见下）。
+        Args:
+            limit: 最长等待时间（秒），None 表示一直等待
+            softLimit: 希望 agent 返回的时间（秒），只用于 moveDeadline
+        Returns:
+            (是否按时返回, 返回值)
+        """
+        loop = asyncio.get_running_loop()
+        budgets = [budget for budget in (limit, softLimit) if budget is not None]
+        try:
+            agent.moveDeadline = time.time() + min(budgets) if budgets else None
+        except AttributeError:
+            pass
+        if hasattr(agent, 'pollAction'):
+            # 交互式 agent（键盘）：必须在事件循环（Tk）所在的线程中等待输入，后台线程里收不到按键。
+            # 直接调用，由 agent 按 moveDeadline 自己按时返回（见 KeyboardAgent.getAction）
+            try:
+                return True, await _resolve(self._muted(agentIndex, function, argument))
+            finally:
+                try:
+                    agent.moveDeadline = None
+                except AttributeError:
+                    pass
+        if inspect.iscoroutinefunction(function):
+            call = asyncio.ensure_future(function(argument))
+        else:
+            call = loop.create_future()
+
+            def target():
+                try:
+                    outcome = (call.set_result, function(argument))
+                    if inspect.isawaitable(outcome[1]):
+                        outcome = (call.set_result, asyncio.run(_resolve(outcome[1])))
+                except BaseException as e:
+                    outcome = (call.set_exception, e)
+                try:
+                    loop.call_soon_threadsafe(_settle, call, *outcome)
+                except RuntimeError:
+                    pass  # 对局（事件循环）已经结束
+            thread = threading.Thread(target=target, name='Agent-%d' % agentIndex)
+            thread.daemon = True
+            thread.start()
+        self._pendingCalls[agentIndex] = call
+        try:
+            if limit is None:
+                result = await call
+            else:
+                result = await asyncio.wait_for(asyncio.shield(call), max(0.0, limit))
+        except asyncio.TimeoutError:
+            return False, None
+        self._pendingCalls[agentIndex] = None
+        try:
+            agent.moveDeadline = None
+        except AttributeError:
+            pass
+        return True, result
 
 
     def run( self ):
         """
         Main control loop for game play.
+
+        同步入口：在新的事件循环中运行 runAsync。已经在事件循环中时应直接 await game.runAsync()。
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.runAsync())
+        raise RuntimeError("Game.run() cannot be called from a running event loop; use 'await game.runAsync()'")
+
+    async def runAsync( self ):
+        """
+        异步的主循环：agent 的 registerInitialState / getAction / final 可以是协程（async def），
+        等待远程或批量推理的 agent 时让出事件循环，一个进程中可以同时推进大量对局（见 runGamesConcurrently）。
+        同步的 agent 直接调用，行为与原来的 run 相同。
         """
         self.display.initialize(self.state.data)
         self.numMoves = 0
@@ -625,27 +1119,26 @@ class Game:
                 self._agentCrash(i, quiet=True)
                 return
             if ("registerInitialState" in dir(agent)):
-                self.mute(i)
                 if self.catchExceptions:
                     try:
-                        # 取消超时检查：直接调用，不限制时间
                         start_time = time.time()
-                        agent.registerInitialState(self.state.deepCopy())
+                        await self._registerAgent(i, agent)
                         time_taken = time.time() - start_time
                         self.totalAgentTimes[i] += time_taken
                     except Exception as data:
+                        self.mute(i)
                         self._agentCrash(i, quiet=False)
                         self.unmute()
                         return
                 else:
-                    agent.registerInitialState(self.state.deepCopy())
-                ## TODO: could this exceed the total time
-                self.unmute()
+                    start_time = time.time()
+                    await self._registerAgent(i, agent)
+                    self.totalAgentTimes[i] += time.time() - start_time
 
         numAgents = len( self.agents )
         # 回合制：每个Ghost走一步后，等待Pac-Man走一步，然后再下一个Ghost
 
-        def processAgentMove(agentIndex):
+        async def processAgentMove(agentIndex):
             """处理单个agent的移动（通用函数）"""
             if self.gameOver:
                 return False
@@ -657,7 +1150,6 @@ class Game:
                 self.mute(agentIndex)
                 if self.catchExceptions:
                     try:
-                        # 取消超时检查：直接调用，不限制时间
                         start_time = time.time()
                         observation = agent.observationFunction(self.state.deepCopy())
                         move_time += time.time() - start_time
@@ -672,33 +1164,31 @@ class Game:
             else:
                 observation = self.state.deepCopy()
 
-            # Solicit an action
+            # Solicit an action（只在同步调用 agent 时静默，见 _muted）
             action = None
-            self.mute(agentIndex)
             if self.catchExceptions:
                 try:
-                    # 取消超时检查：直接调用，不限制时间
                     start_time = time.time()
-                    action = agent.getAction(observation)
+                    action = await self._solicitAction(agentIndex, agent, observation)
                     move_time += time.time() - start_time
-                    # 仍然记录时间，但不用于结束游戏
                     self.totalAgentTimes[agentIndex] += move_time
-                    self.unmute()
                 except Exception as data:
+                    self.mute(agentIndex)
                     self._agentCrash(agentIndex)
                     self.unmute()
                     return False
             else:
-                # 取消超时检查：直接调用，不限制时间
                 start_time = time.time()
-                action = agent.getAction(observation)
+                action = await self._solicitAction(agentIndex, agent, observation)
                 move_time = time.time() - start_time
-                # 仍然记录时间，但不用于结束游戏
                 self.totalAgentTimes[agentIndex] += move_time
-            self.unmute()
 
             # Execute the action
-            self.moveHistory.append( (agentIndex, action) )
+            self.lastActions[agentIndex] = action
+            if self.keepMoveHistory:
+                self.moveHistory.append( (agentIndex, action) )
+            if self.recorder is not None:
+                self.recorder.recordMove( agentIndex, action )
             if self.catchExceptions:
                 try:
                     self.state = self.state.generateSuccessor( agentIndex, action )
@@ -719,22 +1209,11 @@ class Game:
 
         while not self.gameOver:
             # ========== 更新所有鬼的复活倒计时 ==========
-            for ghostIndex in range(1, numAgents):
-                ghostState = self.state.data.agentStates[ghostIndex]
-                if ghostState.respawnTimer > 0:
-                    ghostState.respawnTimer -= 1
-                    # 如果倒计时为0，鬼复活（保持在初始位置）
-                    if ghostState.respawnTimer == 0:
-                        # 创建新的Configuration对象，确保configuration和start是独立的
-                        from game import Configuration
-                        start_pos = ghostState.start.getPosition()
-                        start_dir = ghostState.start.getDirection()
-                        ghostState.configuration = Configuration(start_pos, start_dir)
-                        ghostState.scaredTimer = 0
+            self.state.data.updateRespawnTimers()
             
             # ========== 回合制：Pac-Man先走一步，然后每个Ghost走一步 ==========
             # Pac-Man先移动
-            if not processAgentMove(0):  # Pac-Man is agent 0
+            if not await processAgentMove(0):  # Pac-Man is agent 0
                 break
             if self.gameOver:
                 break
@@ -747,7 +1226,7 @@ class Game:
                     continue  # 跳过死亡状态的鬼
                 
                 # Ghost移动
-                if not processAgentMove(ghostIndex):
+                if not await processAgentMove(ghostIndex):
                     break
                 if self.gameOver:
                     break
@@ -774,11 +1253,10 @@ class Game:
         for agentIndex, agent in enumerate(self.agents):
             if "final" in dir( agent ) :
                 try:
-                    self.mute(agentIndex)
-                    agent.final( self.state )
-                    self.unmute()
+                    await _resolve(self._muted(agentIndex, agent.final, self.state))
                 except Exception as data:
                     if not self.catchExceptions: raise data
+                    self.mute(agentIndex)
                     self._agentCrash(agentIndex)
                     self.unmute()
                     return
@@ -788,3 +1266,37 @@ class Game:
         if self.exportInterface is not None and hasattr(self.exportInterface, 'finalize_game'):
             final_score = self.state.getScore()
             self.exportInterface.finalize_game(final_score)
+
+async def _resolve( result ):
+    "agent 的回调可以是普通函数，也可以是协程：返回值可等待时等待其结果"
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+def _settle( future, setter, value ):
+    "在事件循环线程中设置后台调用的结果（等待方已超时取消时 future 仍然有效，见 asyncio.shield）"
+    if not future.done():
+        setter(value)
+
+async def runGamesAsync( games, limit=None ):
+    """
+    在当前事件循环中并发运行多个对局
+    Args:
+        games: Game 列表
+        limit: 同时运行的对局数上限，None 表示不限制
+    Returns:
+        games（运行结束后）
+    """
+    if limit is None:
+        await asyncio.gather(*[game.runAsync() for game in games])
+        return games
+    semaphore = asyncio.Semaphore(limit)
+    async def runOne(game):
+        async with semaphore:
+            await game.runAsync()
+    await asyncio.gather(*[runOne(game) for game in games])
+    return games
+
+def runGamesConcurrently( games, limit=None ):
+    "同步入口：在一个新的事件循环中并发运行所有对局（见 runGamesAsync）"
+    return asyncio.run(runGamesAsync(games, limit))
@@ -15,10 +15,18 @@
 from game import Agent
 from game import Actions
 from game import Directions
+from game import ActionDistribution
 import random
 from util import manhattanDistance
+from util import nearestPoint
 import util
 import search
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class GhostAgent( Agent ):
     def __init__( self, index ):
@@ -28,20 +36,20 @@ class GhostAgent( Agent ):
         dist = self.getDistribution(state)
         if len(dist) == 0:
             return Directions.STOP
+        elif isinstance(dist, ActionDistribution):
+            return dist.sample()
         else:
+            # 兼容返回 util.Counter 的 Ghost
             return util.chooseFromDistribution( dist )
 
     def getDistribution(self, state):
-        "Returns a Counter encoding a distribution over actions from the provided state."
+        "Returns an ActionDistribution (or a Counter) encoding a distribution over actions from the provided state."
         util.raiseNotDefined()
 
 class RandomGhost( GhostAgent ):
     "A ghost that chooses a legal action uniformly at random."
     def getDistribution( self, state ):
-        dist = util.Counter()
-        for a in state.getLegalActions( self.index ): dist[a] = 1.0
-        dist.normalize()
-        return dist
+        return ActionDistribution.uniform( state.getLegalActions( self.index ) )
 
 class GhostPositionSearchProblem:
     """
@@ -148,7 +156,7 @@ class DirectionalGhost( GhostAgent ):
             bestActions = legalActions
 
         # Construct distribution
-        dist = util.Counter()
+        dist = ActionDistribution()
         if isScared:
             bestProb = self.prob_scaredFlee
         else:
@@ -171,3 +179,215 @@ class DirectionalGhost( GhostAgent ):
         else:
             bestScore = min( distancesToPacman )
         return [action for action, distance in zip( legalActions, distancesToPacman ) if distance == bestScore]
+
+
+class VectorizedGhostTeam:
+    """
+    多 Ghost 对局的向量化决策引擎
+
+    每轮只做一次 NumPy 计算，同时得到所有 Ghost 的合法动作、偏好方向（来自共享的
+    以 Pac-Man 为源点的 BFS 距离场）、动作分布和采样结果；各个 VectorizedGhost 在
+    Game.run 中仍然依次移动，只是取用计划中属于自己的动作。
+
+    Ghost 的决策只依赖自身状态和 Pac-Man（与 DirectionalGhost 相同），因此在前面的
+    Ghost 移动之后计划仍然有效；如果中途发生碰撞（Pac-Man 被吃、位置重置）导致某个
+    Ghost 的输入与计划不符，会基于当前状态重新计算。
+
+    与 DirectionalGhost 的区别：距离相同的多条最短路径的方向平分最佳概率（A* 只取其中一条）；
+    最短路径的第一步是掉头时，DirectionalGhost 退回曼哈顿距离，这里直接在合法方向中取距离场最小的方向。
+
+    一个 team 只服务一局：同时进行的对局不能共用 team；依次进行的对局（runGames）在每局开始时
+    由 VectorizedGhost.registerInitialState 调用 reset 清空上一局的计划和缓存。
+    """
+    COLUMNS = Directions.ORDER[:4]  # 北、南、东、西；Ghost 不能停
+    VECTORS = [Actions.directionToVector(d) for d in Directions.ORDER[:4]]
+
+    def __init__(self, prob_attack=0.8, prob_scaredFlee=0.8, cacheSize=256, seed=None):
+        """
+        Args:
+            prob_attack: 追击时选择最短路径方向的概率
+            prob_scaredFlee: 受惊时选择远离方向的概率
+            cacheSize: 最多缓存多少个 Pac-Man 位置的距离场
+            seed: NumPy 随机数生成器的种子，为 None 时从 random 模块取（随 -f 固定）
+        """
+        if np is None:
+            raise Exception("VectorizedGhostTeam requires numpy (pip install numpy)")
+        self.prob_attack = prob_attack
+        self.prob_scaredFlee = prob_scaredFlee
+        self.cacheSize = cacheSize
+        self.rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+        self._walls = None
+        self._wallArray = None
+        self._neighbors = None
+        self._fields = OrderedDict()
+        self._plan = {}  # ghostIndex -> (输入, 动作, 分布)
+
+    def _prepareWalls(self, walls):
+        """地图改变时重建墙数组、邻接表并清空距离场缓存"""
+        if walls is self._walls or (self._walls is not None and walls == self._walls):
+            return
+        self._walls = walls
+        self._wallArray = np.array(walls.data, dtype=bool)
+        height = walls.height
+        neighbors = []
+        for x in range(walls.width):
+            for y in range(height):
+                cells = []
+                if not walls[x][y]:
+                    for dx, dy in self.VECTORS:
+                        nx, ny = x + int(dx), y + int(dy)
+                        if 0 <= nx < walls.width and 0 <= ny < height and not walls[nx][ny]:
+                            cells.append(nx * height + ny)
+                neighbors.append(cells)
+        self._neighbors = neighbors
+        self._fields = OrderedDict()
+
+    def reset(self):
+        """开始新的一局：丢弃计划、距离场缓存和墙的缓存"""
+        self._walls = None
+        self._wallArray = None
+        self._neighbors = None
+        self._fields = OrderedDict()
+        self._plan = {}
+
+    def distanceField(self, pacmanCell):
+        """
+        以 Pac-Man 所在格为源点的迷宫距离场（形状与墙网格相同，不可达为 -1）
+        结果按 Pac-Man 位置做 LRU 缓存
+        """
+        field = self._fields.get(pacmanCell)
+        if field is not None:
+            self._fields.move_to_end(pacmanCell)
+            return field
+        walls = self._walls
+        height = walls.height
+        distances = [-1] * (walls.width * height)
+        start = pacmanCell[0] * height + pacmanCell[1]
+        distances[start] = 0
+        frontier = [start]
+        neighbors = self._neighbors
+        distance = 0
+        while frontier:
+            distance += 1
+            nextFrontier = []
+            for cell in frontier:
+                for other in neighbors[cell]:
+                    if distances[other] < 0:
+                        distances[other] = distance
+                        nextFrontier.append(other)
+            frontier = nextFrontier
+        field = np.array(distances, dtype=np.int32).reshape(walls.width, height)
+        self._fields[pacmanCell] = field
+        if len(self._fields) > self.cacheSize:
+            self._fields.popitem(last=False)
+        return field
+
+    def _inputs(self, state, index):
+        """决定 index 号 Ghost 动作的全部输入；与计划中记录的不同时需要重新计算"""
+        data = state.data
+        ghostState = data.agentStates[index]
+        conf = ghostState.configuration
+        return (conf.pos, conf.direction, ghostState.scaredTimer, ghostState.respawnTimer,
+                data.agentStates[0].configuration.pos, data.lives, data.ghostsEatenInRow)
+
+    def plan(self, state):
+        """为所有存活的 Ghost 一次性计算动作分布并采样"""
+        data = state.data
+        self._prepareWalls(data.layout.walls)
+        indices = [i for i in range(1, len(data.agentStates)) if data.agentStates[i].respawnTimer == 0]
+        self._plan = {}
+        if not indices:
+            return
+        ghostStates = [data.agentStates[i] for i in indices]
+        count = len(indices)
+
+        positions = np.array([g.configuration.pos for g in ghostStates], dtype=float)
+        directions = np.array([Directions.INDEX[g.configuration.direction] for g in ghostStates])
+        scaredTimers = np.array([g.scaredTimer for g in ghostStates])
+        pacmanPos = data.agentStates[0].configuration.pos
+        pacmanCell = nearestPoint(pacmanPos)
+
+        # 合法动作（与 GhostRules.getLegalActions 相同：不能停，非死路不能掉头，格点之间只能直行）
+        cells = np.floor(positions + 0.5).astype(int)
+        onGrid = np.abs(positions - cells).sum(axis=1) <= Actions.TOLERANCE
+        vectors = np.array(self.VECTORS, dtype=int)
+        nextX = cells[:, 0:1] + vectors[:, 0]
+        nextY = cells[:, 1:2] + vectors[:, 1]
+        legal = ~self._wallArray[nextX, nextY]
+        rows = np.arange(count)
+        offGrid = ~onGrid
+        if offGrid.any():
+            legal[offGrid] = False
+            straight = offGrid & (directions < 4)
+            legal[rows[straight], directions[straight]] = True
+        reverse = np.array([Directions.INDEX[Directions.REVERSE[d]] for d in Directions.ORDER])[directions]
+        canReverse = (reverse < 4) & (legal.sum(axis=1) > 1)
+        legal[rows[canReverse], reverse[canReverse]] = False
+
+        # 偏好方向：追击时走距离场下降最快的方向（Pac-Man 不可达时退回曼哈顿距离），
+        # 受惊时远离 Pac-Man；与 DirectionalGhost._fallbackToDistance 一样按单位步长计算曼哈顿距离
+        scared = (scaredTimers > 0) | (data.ghostsEatenInRow >= 20)
+        manhattan = (np.abs(positions[:, 0:1] + vectors[:, 0] - pacmanPos[0])
+                     + np.abs(positions[:, 1:2] + vectors[:, 1] - pacmanPos[1]))
+        chase = self.distanceField(pacmanCell)[nextX, nextY].astype(float)
+        chase[(chase < 0) | ~legal] = np.inf
+        unreachable = ~np.isfinite(chase.min(axis=1))
+        chase[unreachable] = manhattan[unreachable]
+        score = np.where(scared[:, None], -manhattan, chase)
+        score[~legal] = np.inf
+        best = legal & (score == score.min(axis=1)[:, None])
+
+        # 分布：最佳方向分得 bestProb，其余概率均匀分给所有合法动作
+        bestProb = np.where(scared, self.prob_scaredFlee, self.prob_attack)[:, None]
+        numLegal = np.maximum(legal.sum(axis=1), 1)[:, None]
+        numBest = np.maximum(best.sum(axis=1), 1)[:, None]
+        probs = best * (bestProb / numBest) + legal * ((1 - bestProb) / numLegal)
+
+        # 采样：累积概率与均匀随机数比较
+        cumulative = probs.cumsum(axis=1)
+        draws = self.rng.random(count) * cumulative[:, -1]
+        choices = (cumulative > draws[:, None]).argmax(axis=1)
+
+        for row, index in enumerate(indices):
+            if not legal[row].any():
+                action = Directions.STOP
+            else:
+                action = self.COLUMNS[choices[row]]
+            self._plan[index] = (self._inputs(state, index), action, probs[row])
+
+    def getAction(self, state, index):
+        entry = self._plan.pop(index, None)
+        if entry is None or entry[0] != self._inputs(state, index):
+            self.plan(state)
+            entry = self._plan.pop(index, None)
+            if entry is None:
+                return Directions.STOP
+        return entry[1]
+
+    def getDistribution(self, state, index):
+        entry = self._plan.get(index)
+        if entry is None or entry[0] != self._inputs(state, index):
+            self.plan(state)
+            entry = self._plan.get(index)
+        if entry is None:
+            return ActionDistribution()
+        return ActionDistribution([float(prob) for prob in entry[2]] + [0.0])
+
+
+class VectorizedGhost( GhostAgent ):
+    """
+    由 VectorizedGhostTeam 统一决策的 Ghost（行为与 DirectionalGhost 相同，最短路径由距离场给出）
+    同一局中的 Ghost 共用一个 team（pacman.py -g VectorizedGhost 时由 readCommand 创建）
+    """
+    def __init__( self, index, team ):
+        self.index = index
+        self.team = team
+
+    def registerInitialState( self, state ):
+        self.team.reset()
+
+    def getAction( self, state ):
+        return self.team.getAction( state, self.index )
+
+    def getDistribution( self, state ):
+        return self.team.getDistribution( state, self.index )
@@ -18,6 +18,11 @@ from game import Directions
 import tkinter
 import graphicsUtils
 
+try:
+    from PIL import Image, ImageDraw, ImageTk
+except ImportError:
+    Image = None
+
 ###########################
 #  GRAPHICS DISPLAY CODE  #
 ###########################
@@ -87,6 +92,13 @@ CAPSULE_SIZE = 0.25  # 保留用于向后兼容
 # Drawing walls
 WALL_RADIUS = 0.15
 
+# 用 Pillow 把墙和食物预先渲染为一张图片（没有 Pillow 时退回到逐个绘制多边形）
+PRERENDER_BOARD = True
+
+# 调试叠加层（见 DebugOverlay）
+OVERLAY_LAYERS = ('expanded', 'ghostDistances', 'values', 'distributions')
+GHOST_FIELD_RANGE = 12  # ghostDistances 层绘制的最大距离（格）
+
 class InfoPane:
     def __init__(self, layout, gridWidth, gridHeight):
         self.gridWidth = gridWidth
@@ -96,6 +108,7 @@ class InfoPane:
         self.height = INFO_PANE_HEIGHT
         self.fontSize = 24
         self.textColor = PACMAN_COLOR
+        self.ghostDistanceText = None
         self.drawPane()
 
     def toScreen(self, pos, y = None):
@@ -140,7 +153,7 @@ class InfoPane:
 
     def updateGhostDistances(self, distances):
         if len(distances) == 0: return
-        if 'ghostDistanceText' not in dir(self): self.initializeGhostDistances(distances)
+        if self.ghostDistanceText is None: self.initializeGhostDistances(distances)
         else:
             for i, d in enumerate(distances):
                 changeText(self.ghostDistanceText[i], d)
@@ -164,8 +177,175 @@ class InfoPane:
         pass
 
 
+class BoardImage:
+    """
+    预先渲染的棋盘：墙和食物画在一张图片上，作为一个画布图形项显示。
+    吃掉食物时只把该格的食物区域填回背景色，新回合时重新渲染食物层，
+    因此打开大地图和刷新食物的开销与画布图形项数量无关。
+    """
+
+    def __init__(self, display, walls):
+        self.display = display
+        self.width = int(round((display.width + 1) * display.gridWidth))
+        self.height = int(round((display.height + 1) * display.gridHeight))
+        self.walls = Image.new('RGB', (self.width, self.height), BACKGROUND_COLOR)
+        draw = ImageDraw.Draw(self.walls)
+        for (x0, y0, x1, y1), wallColor in display.wallRectangles(walls):
+            left, top, _, _ = self.cellBox((x0, y1), 0.5, 0.5)
+            _, _, right, bottom = self.cellBox((x1, y0), 0.5, 0.5)
+            draw.rectangle((left, top, right - 1, bottom - 1), fill=wallColor)
+        self.photo = None
+        self.item = None
+
+    def cellBox(self, cell, widthScale, heightScale):
+        """格子 cell 中心处半宽 widthScale、半高 heightScale（相对格子大小）的矩形，像素坐标，不含右下边界"""
+        x, y = self.display.to_screen(cell)
+        halfWidth = widthScale * self.display.gridWidth
+        halfHeight = heightScale * self.display.gridHeight
+        return (int(round(x - halfWidth)), int(round(y - halfHeight)),
+                int(round(x + halfWidth)), int(round(y + halfHeight)))
+
+    def drawFood(self, foodMatrix):
+        image = self.walls.copy()
+        draw = ImageDraw.Draw(image)
+        for xNum, column in enumerate(foodMatrix):
+            color = FOOD_COLOR
+            if self.display.capture: color = TEAM_COLORS[0] if (xNum * 2) <= foodMatrix.width else TEAM_COLORS[1]
+            for yNum, cell in enumerate(column):
+                if cell:
+                    x0, y0, x1, y1 = self.cellBox((xNum, yNum), FOOD_WIDTH_SCALE, FOOD_HEIGHT_SCALE)
+                    draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=color)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(image)
+            self.item = photo_image((0, 0), self.photo)
+        else:
+            self.photo.paste(image)
+
+    def removeFood(self, cell):
+        fill_photo(self.photo, BACKGROUND_COLOR, self.cellBox(cell, FOOD_WIDTH_SCALE, FOOD_HEIGHT_SCALE))
+
+
+def checkOverlayName(name):
+    if name not in OVERLAY_LAYERS:
+        raise Exception("Unknown overlay '%s' (choose from %s)" % (name, ', '.join(OVERLAY_LAYERS)))
+
+
+class DebugOverlay:
+    """
+    调试叠加层：在墙和食物之上、agent 之下按格子绘制的彩色方块，分为以下几层
+        expanded        搜索展开的格子（drawExpandedCells）
+        ghostDistances  到最近的存活 Ghost 的迷宫距离场（GHOST_FIELD_RANGE 以内）
+        values          agent 给出的价值图（drawValues）
+        distributions   Ghost 位置的信念分布（updateDistributions）
+    每层的图形项共用一个画布标签，整层显示或隐藏只需一次调用。没有启用的层不创建图形项，
+    也不计算颜色和距离场，只保留最新一次设置的原始数据，启用时再计算并绘制；启用的层按格子增量更新，
+    只有颜色变化的格子才修改画布。
+    """
+
+    def __init__(self, display, enabled=()):
+        """
+        Args:
+            display: 所属的 PacmanGraphics（已经画好静态的墙和食物，还没有画 agent）
+            enabled: 启用的层
+        """
+        for name in enabled:
+            checkOverlayName(name)
+        self.display = display
+        self.enabled = set(enabled)
+        self.marker = layer_marker()
+        self.cells = dict((name, {}) for name in OVERLAY_LAYERS)  # 层 -> {格子: (图形项, 颜色)}
+        self.pending = {}  # 层 -> 未启用时最近一次设置的 (颜色函数, 原始数据)
+        self._ghostCells = None
+
+    def isEnabled(self, name):
+        return name in self.enabled
+
+    def setEnabled(self, name, enabled):
+        checkOverlayName(name)
+        if enabled and name not in self.enabled:
+            self.enabled.add(name)
+            if name in self.pending:
+                colorFunction, data = self.pending.pop(name)
+                self._apply(name, colorFunction(data))
+            set_visible('overlay-' + name, True)
+        elif not enabled and name in self.enabled:
+            self.enabled.discard(name)
+            set_visible('overlay-' + name, False)
+            if name == 'ghostDistances':
+                self._ghostCells = None  # 隐藏期间不跟踪 Ghost，重新启用时重新计算
+
+    def setData(self, name, colorFunction, data):
+        """
+        设置一层的内容
+        Args:
+            colorFunction: 把 data 转换成 {格子: 颜色} 的函数，不在结果中的格子不绘制
+            data: 原始数据；层没有启用时只保存引用，不调用 colorFunction
+        Returns:
+            层是否启用（是否修改了画布）
+        """
+        if name not in self.enabled:
+            self.pending[name] = (colorFunction, data)
+            return False
+        self._apply(name, colorFunction(data))
+        return True
+
+    def clear(self, name):
+        self.pending.pop(name, None)
+        for item, color in self.cells[name].values():
+            remove_from_screen(item)
+        self.cells[name] = {}
+
+    def update(self, state):
+        """每帧调用：只有启用了 ghostDistances 并且 Ghost 换了格子时才重新计算距离场"""
+        if 'ghostDistances' not in self.enabled:
+            return
+        ghostCells = tuple((int(agentState.configuration.pos[0] + 0.5), int(agentState.configuration.pos[1] + 0.5))
+                           for agentState in state.agentStates[1:]
+                           if agentState.respawnTimer == 0 and agentState.configuration is not None)
+        if ghostCells == self._ghostCells:
+            return
+        self._ghostCells = ghostCells
+        self._apply('ghostDistances', self.ghostDistanceColors(state.layout.walls, ghostCells))
+
+    def ghostDistanceColors(self, walls, sources):
+        """从 sources 出发按层 BFS（Ghost 把传送门当作墙），距离越近颜色越接近 Ghost 的红色"""
+        near = GHOST_VEC_COLORS[1]
+        far = colorToVector(BACKGROUND_COLOR)
+        colors = dict((cell, formatColor(*near)) for cell in sources)
+        frontier = list(colors)
+        for distance in range(1, GHOST_FIELD_RANGE + 1):
+            weight = float(distance) / (GHOST_FIELD_RANGE + 1)
+            color = formatColor(*[n + (f - n) * weight for n, f in zip(near, far)])
+            nextFrontier = []
+            for x, y in frontier:
+                for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if cell not in colors and 0 <= cell[0] < walls.width and 0 <= cell[1] < walls.height \
+                            and not walls[cell[0]][cell[1]]:
+                        colors[cell] = color
+                        nextFrontier.append(cell)
+            frontier = nextFrontier
+        return colors
+
+    def _apply(self, name, colors):
+        cells = self.cells[name]
+        for cell in [cell for cell in cells if cell not in colors]:
+            remove_from_screen(cells.pop(cell)[0])
+        display = self.display
+        tag = 'overlay-' + name
+        for cell, color in colors.items():
+            current = cells.get(cell)
+            if current is None:
+                item = square(display.to_screen(cell), 0.5 * min(display.gridWidth, display.gridHeight), color)
+                add_tag(item, tag)
+                lower_below(item, self.marker)
+                cells[cell] = (item, color)
+            elif current[1] != color:
+                edit(current[0], ('fill', color), ('outline', color))
+                cells[cell] = (current[0], color)
+
+
 class PacmanGraphics:
-    def __init__(self, zoom=1.0, frameTime=0.0, capture=False, gridWidth=None, gridHeight=None):
+    def __init__(self, zoom=1.0, frameTime=0.0, capture=False, gridWidth=None, gridHeight=None, overlays=()):
         self.have_window = 0
         self.currentGhostImages = {}
         self.pacmanImage = None
@@ -187,6 +367,8 @@ class PacmanGraphics:
         self.gridSize = (self.gridWidth + self.gridHeight) / 2.0
         self.capture = capture
         self.frameTime = frameTime
+        self.overlays = tuple(overlays)  # 启用的调试叠加层（见 DebugOverlay）
+        self.overlay = None
 
     def checkNullDisplay(self):
         return False
@@ -195,9 +377,8 @@ class PacmanGraphics:
         self.isBlue = isBlue
         self.startGraphics(state)
 
-        # self.drawDistributions(state)
-        self.distributionImages = None  # Initialized lazily
         self.drawStaticObjects(state)
+        self.overlay = DebugOverlay(self, self.overlays)
         self.drawAgentObjects(state)
 
         # Information
@@ -212,24 +393,13 @@ class PacmanGraphics:
         self.infoPane = InfoPane(layout, self.gridWidth, self.gridHeight)
         self.currentState = layout
 
-    def drawDistributions(self, state):
-        walls = state.layout.walls
-        dist = []
-        for x in range(walls.width):
-            distx = []
-            dist.append(distx)
-            for y in range(walls.height):
-                ( screen_x, screen_y ) = self.to_screen( (x, y) )
-                block = square( (screen_x, screen_y),
-                                0.5 * min(self.gridWidth, self.gridHeight),
-                                color = BACKGROUND_COLOR,
-                                filled = 1, behind=2)
-                distx.append(block)
-        self.distributionImages = dist
-
     def drawStaticObjects(self, state):
         layout = self.layout
-        self.drawWalls(layout.walls)
+        self.board = None
+        if PRERENDER_BOARD and Image is not None:
+            self.board = BoardImage(self, layout.walls)
+        else:
+            self.drawWalls(layout.walls)
         # 使用 state.food 和 state.capsules，而不是 layout.food 和 layout.capsules
         # 这样在新回合开始时，食物和能量豆能正确显示
         # 注意：state 是 GameStateData 对象，不是 GameState 对象
@@ -266,6 +436,14 @@ class PacmanGraphics:
         refresh()
 
     def update(self, newState):
+        # 一帧中的移动、删除合并提交，只处理一次 Tk 事件（见 graphicsUtils.begin_batch）
+        begin_batch()
+        try:
+            self.drawUpdate(newState)
+        finally:
+            end_batch()
+
+    def drawUpdate(self, newState):
         # 检测新回合开始：检查 _roundComplete 标志或食物数量突然增加
         # 需要重新绘制所有食物和能量豆
         should_refresh_food = False
@@ -349,12 +527,57 @@ class PacmanGraphics:
         # 显示得分和生命数
         lives = getattr(newState, 'lives', None)
         self.infoPane.updateScore(newState.score, lives)
-        if 'ghostDistances' in dir(newState):
-            self.infoPane.updateGhostDistances(newState.ghostDistances)
+        ghostDistances = getattr(newState, 'ghostDistances', None)
+        if ghostDistances:
+            self.infoPane.updateGhostDistances(ghostDistances)
+        if self.overlay.enabled:
+            self.overlay.update(newState)
         
         # 更新 previousState 以便下次比较
         self.previousState = newState
 
+    def redrawState(self, newState):
+        """
+        直接把画面同步到 newState（不做逐帧动画）
+        用于回放跳帧/跳转：中间帧没有经过 update，增量更新无法使用
+        """
+        begin_batch()
+        try:
+            self.drawState(newState)
+        finally:
+            end_batch()
+
+    def drawState(self, newState):
+        if self.food is not None:
+            for row in self.food:
+                for item in row:
+                    if item is not None:
+                        remove_from_screen(item)
+        if self.capsules is not None:
+            for item in self.capsules.values():
+                remove_from_screen(item)
+        for agentState, image in self.agentImages:
+            for item in image:
+                remove_from_screen(item)
+
+        self.food = self.drawFood(newState.food)
+        self.capsules = self.drawCapsules(newState.capsules)
+        # agentImages 的下标与 agent 下标保持一致，死亡的鬼不绘制
+        self.agentImages = []
+        for index, agentState in enumerate(newState.agentStates):
+            if agentState.isPacman:
+                image = self.drawPacman(agentState, index)
+            elif agentState.respawnTimer > 0:
+                image = []
+            else:
+                image = self.drawGhost(agentState, index)
+            self.agentImages.append( (agentState, image) )
+
+        self.infoPane.updateScore(newState.score, getattr(newState, 'lives', None))
+        if self.overlay.enabled:
+            self.overlay.update(newState)
+        self.previousState = newState
+
     def make_window(self, width, height):
         grid_width = (width-1) * self.gridWidth
         grid_height = (height-1) * self.gridHeight
@@ -539,7 +762,6 @@ class PacmanGraphics:
 
         for ghostImagePart in ghostImageParts:
             move_by(ghostImagePart, delta)
-        refresh()
 
         if ghost.scaredTimer > 0:
             color = SCARED_COLOR
@@ -576,31 +798,55 @@ class PacmanGraphics:
         return ( x, y )
 
     def drawWalls(self, wallMatrix):
-        wallColor = WALL_COLOR
-        # 获取传送门位置列表
-        portals = getattr(self.layout, 'portals', [])
-        for xNum, x in enumerate(wallMatrix):
-            if self.capture and (xNum * 2) < wallMatrix.width: wallColor = TEAM_COLORS[0]
-            if self.capture and (xNum * 2) >= wallMatrix.width: wallColor = TEAM_COLORS[1]
+        """
+        墙是静态的：相邻的墙格合并为尽量少的矩形（见 wallRectangles），
+        大地图上画布中的图形项从每格一个减少到每段连续墙体一个
+        """
+        for (x0, y0, x1, y1), wallColor in self.wallRectangles(wallMatrix):
+            left = self.to_screen((x0, y1))
+            right = self.to_screen((x1, y0))
+            half_width = 0.5 * self.gridWidth
+            half_height = 0.5 * self.gridHeight
+            coords = [
+                (left[0] - half_width, left[1] - half_height),
+                (right[0] + half_width, left[1] - half_height),
+                (right[0] + half_width, right[1] + half_height),
+                (left[0] - half_width, right[1] + half_height)
+            ]
+            polygon(coords, wallColor, wallColor, filled=1, smoothed=0)
 
-            for yNum, cell in enumerate(x):
-                if cell: # There's a wall here
-                    pos = (xNum, yNum)
-                    # 如果是传送门位置，跳过绘制（透明）
-                    if pos in portals:
-                        continue
-                    
-                    screen = self.to_screen(pos)
-                    # 绘制矩形墙壁，宽度和高度分别使用 gridWidth 和 gridHeight，确保墙壁填满整个网格单元
-                    half_width = 0.5 * self.gridWidth
-                    half_height = 0.5 * self.gridHeight
-                    coords = [
-                        (screen[0] - half_width, screen[1] - half_height),
-                        (screen[0] + half_width, screen[1] - half_height),
-                        (screen[0] + half_width, screen[1] + half_height),
-                        (screen[0] - half_width, screen[1] + half_height)
-                    ]
-                    polygon(coords, wallColor, wallColor, filled=1, smoothed=0)
+    def wallRectangles(self, wallMatrix):
+        """
+        把墙格（传送门除外，传送门透明）合并为矩形：先把每列中连续的墙格合并为竖直线段，
+        再把相邻列中上下端完全相同的线段合并
+        Returns:
+            [((x0, y0, x1, y1), 颜色)]，坐标为包含两端的格子坐标
+        """
+        portals = set(getattr(self.layout, 'portals', []))
+        rectangles = []
+        openRuns = {}  # (y0, y1, 颜色) -> 起始列
+        for xNum in range(wallMatrix.width + 1):
+            runs = set()
+            if xNum < wallMatrix.width:
+                wallColor = WALL_COLOR
+                if self.capture and (xNum * 2) < wallMatrix.width: wallColor = TEAM_COLORS[0]
+                if self.capture and (xNum * 2) >= wallMatrix.width: wallColor = TEAM_COLORS[1]
+                column = wallMatrix[xNum]
+                yNum = 0
+                while yNum < wallMatrix.height:
+                    if column[yNum] and (xNum, yNum) not in portals:
+                        y0 = yNum
+                        while yNum + 1 < wallMatrix.height and column[yNum + 1] and (xNum, yNum + 1) not in portals:
+                            yNum += 1
+                        runs.add((y0, yNum, wallColor))
+                    yNum += 1
+            for key in list(openRuns):
+                if key not in runs:
+                    rectangles.append(((openRuns.pop(key), key[0], xNum - 1, key[1]), key[2]))
+            for key in runs:
+                if key not in openRuns:
+                    openRuns[key] = xNum
+        return rectangles
 
     def isWall(self, x, y, walls):
         if x < 0 or y < 0:
@@ -610,6 +856,10 @@ class PacmanGraphics:
         return walls[x][y]
 
     def drawFood(self, foodMatrix ):
+        if getattr(self, 'board', None) is not None:
+            # 食物画在预渲染的棋盘图片上，没有单独的图形项
+            self.board.drawFood(foodMatrix)
+            return None
         foodImages = []
         color = FOOD_COLOR
         for xNum, x in enumerate(foodMatrix):
@@ -653,6 +903,9 @@ class PacmanGraphics:
         return capsuleImages
 
     def removeFood(self, cell, foodImages ):
+        if foodImages is None:
+            self.board.removeFood(cell)
+            return
         x, y = cell
         remove_from_screen(foodImages[x][y])
 
@@ -660,52 +913,77 @@ class PacmanGraphics:
         x, y = cell
         remove_from_screen(capsuleImages[(x, y)])
 
+    def setOverlay(self, name, enabled=True):
+        """启用或关闭一个调试叠加层（名称见 OVERLAY_LAYERS）"""
+        if self.overlay is None:
+            # 窗口还没有打开：记下来，initialize 时启用
+            checkOverlayName(name)
+            self.overlays = tuple(n for n in self.overlays if n != name) + ((name,) if enabled else ())
+            return
+        self.overlay.setEnabled(name, enabled)
+        if enabled and name == 'ghostDistances':
+            self.overlay.update(self.previousState)
+        refresh()
+
     def drawExpandedCells(self, cells):
         """
         Draws an overlay of expanded grid positions for search agents
+        （叠加层 expanded，启用后才显示；先展开的格子颜色更亮）
         """
+        if self.overlay.setData('expanded', self.expandedColors, cells):
+            refresh()
+
+    def expandedColors(self, cells):
         n = float(len(cells))
         baseColor = [1.0, 0.0, 0.0]
-        self.clearExpandedCells()
-        self.expandedCells = []
+        colors = {}
         for k, cell in enumerate(cells):
-            screenPos = self.to_screen( cell)
-            cellColor = formatColor(*[(n-k) * c * .5 / n + .25 for c in baseColor])
-            block = square(screenPos,
-                     0.5 * min(self.gridWidth, self.gridHeight),
-                     color = cellColor,
-                     filled = 1, behind=2)
-            self.expandedCells.append(block)
-            if self.frameTime < 0:
-                refresh()
+            colors[cell] = formatColor(*[(n-k) * c * .5 / n + .25 for c in baseColor])
+        return colors
 
     def clearExpandedCells(self):
-        if 'expandedCells' in dir(self) and len(self.expandedCells) > 0:
-            for cell in self.expandedCells:
-                remove_from_screen(cell)
+        self.overlay.clear('expanded')
+
+    def drawValues(self, values):
+        """
+        画出 agent 的价值图（叠加层 values，启用后才显示）
+        Args:
+            values: {格子: 数值}；正值为绿色、负值为红色，绝对值越大颜色越亮，不在其中的格子不绘制
+        """
+        if self.overlay.setData('values', self.valueColors, values):
+            refresh()
 
+    def valueColors(self, values):
+        scale = max([abs(value) for value in values.values()] + [1e-9])
+        colors = {}
+        for cell, value in values.items():
+            weight = min(1.0, abs(value) / scale)
+            color = [0.0, 0.0, 0.0]
+            color[1 if value >= 0 else 0] = 0.15 + 0.85 * weight
+            colors[cell] = formatColor(*color)
+        return colors
 
     def updateDistributions(self, distributions):
-        "Draws an agent's belief distributions"
+        "Draws an agent's belief distributions（叠加层 distributions，启用后才显示）"
+        if self.overlay.setData('distributions', self.distributionColors, distributions):
+            refresh()
+
+    def distributionColors(self, distributions):
         # copy all distributions so we don't change their state
-        distributions = map(lambda x: x.copy(), distributions)
-        if self.distributionImages == None:
-            self.drawDistributions(self.previousState)
-        for x in range(len(self.distributionImages)):
-            for y in range(len(self.distributionImages[0])):
-                image = self.distributionImages[x][y]
+        distributions = [dist.copy() for dist in distributions]
+        walls = self.layout.walls
+        colors = {}
+        ghostColors = GHOST_VEC_COLORS[1:] # With Pacman
+        if self.capture: ghostColors = GHOST_VEC_COLORS
+        for x in range(walls.width):
+            for y in range(walls.height):
                 weights = [dist[ (x,y) ] for dist in distributions]
-
-                if sum(weights) != 0:
-                    pass
                 # Fog of war
                 color = [0.0,0.0,0.0]
-                colors = GHOST_VEC_COLORS[1:] # With Pacman
-                if self.capture: colors = GHOST_VEC_COLORS
-                for weight, gcolor in zip(weights, colors):
+                for weight, gcolor in zip(weights, ghostColors):
                     color = [min(1.0, c + 0.95 * g * weight ** .3) for c,g in zip(color, gcolor)]
-                changeColor(image, formatColor(*color))
-        refresh()
+                colors[(x, y)] = formatColor(*color)
+        return colors
 
 class FirstPersonPacmanGraphics(PacmanGraphics):
     def __init__(self, zoom = 1.0, showGhosts = True, capture = False, frameTime=0):
@@ -723,8 +1001,8 @@ class FirstPersonPacmanGraphics(PacmanGraphics):
         self.layout = state.layout
 
         # Draw the rest
-        self.distributionImages = None  # initialize lazily
         self.drawStaticObjects(state)
+        self.overlay = DebugOverlay(self, self.overlays)
         self.drawAgentObjects(state)
 
         # Information
@@ -762,6 +1040,7 @@ def add(x, y):
 # Note: to make an animated gif from this postscript output, try the command:
 # convert -delay 7 -loop 1 -compress lzw -layers optimize frame* out.gif
 # convert is part of imagemagick (freeware)
+# 不需要逐帧文件时可以直接用 videoSink.VideoSink 作为显示，整局输出为一个动画文件
 
 SAVE_POSTSCRIPT = False
 POSTSCRIPT_OUTPUT_DIR = 'frames'
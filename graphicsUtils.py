@@ -18,6 +18,8 @@ import random
 import string
 import time
 import types
+import queue
+import threading
 import tkinter
 import os.path
 
@@ -50,6 +52,7 @@ def sleep(secs):
     if _root_window == None:
         time.sleep(secs)
     else:
+        _flush_batch()
         _root_window.update_idletasks()
         _root_window.after(int(1000 * secs), _root_window.quit)
         _root_window.mainloop()
@@ -61,6 +64,7 @@ def begin_graphics(width=640, height=480, color=formatColor(0, 0, 0), title=None
     # Check for duplicate call
     if _root_window is not None:
         # Lose the window.
+        _pending_releases.clear()
         _root_window.destroy()
 
     # Save the canvas size parameters
@@ -70,6 +74,7 @@ def begin_graphics(width=640, height=480, color=formatColor(0, 0, 0), title=None
 
     # Create the root window
     _root_window = tkinter.Tk()
+    _tk_thread[0] = threading.current_thread()
     _root_window.protocol('WM_DELETE_WINDOW', _destroy_window)
     _root_window.title(title or 'Graphics Window')
     _root_window.resizable(0, 0)
@@ -154,11 +159,14 @@ def end_graphics():
         _root_window = None
         _canvas = None
         _mouse_enabled = 0
+        _pending_releases.clear()
         _clear_keys()
+        _clear_batch()
 
 def clear_screen(background=None):
     global _canvas_x, _canvas_y
     _canvas.delete('all')
+    _clear_batch()
     draw_background()
     _canvas_x, _canvas_y = 0, _canvas_ys
 
@@ -198,8 +206,76 @@ def image(pos, file="../../blueghost.gif"):
     return _canvas.create_image(x, y, image = tkinter.PhotoImage(file=file), anchor = tkinter.NW)
 
 
+def photo_image(pos, photo):
+    """在 pos（左上角）放置一张已创建的图片（tkinter.PhotoImage 或 ImageTk.PhotoImage），调用方需保留 photo 的引用"""
+    x, y = pos
+    return _canvas.create_image(x, y, image=photo, anchor=tkinter.NW)
+
+def fill_photo(photo, color, box):
+    """把图片中的矩形区域 box = (x0, y0, x1, y1)（不含 x1, y1）填充为 color，不创建画布图形项"""
+    _canvas.tk.call(str(photo), 'put', color, '-to', *box)
+
+def layer_marker():
+    """创建一个不可见的图形项，作为分层的参照：之后用 lower_below 把图形项放在它的下面"""
+    return _canvas.create_line(0, 0, 0, 0, state='hidden')
+
+def lower_below(tagOrId, marker):
+    _canvas.tag_lower(tagOrId, marker)
+
+def add_tag(id, tag):
+    _canvas.addtag_withtag(tag, id)
+
+def set_visible(tagOrId, visible):
+    """显示或隐藏一个图形项（或带某个标签的所有图形项）；隐藏的图形项不参与绘制"""
+    _canvas.itemconfigure(tagOrId, state='normal' if visible else 'hidden')
+
 def refresh():
+    if _batch_depth > 0:
+        return  # 批量绘制中：在 end_batch 时统一刷新
+    _canvas.update_idletasks()
+
+##############################################################################
+### Batched drawing ##########################################################
+##############################################################################
+
+# 批量绘制：begin_batch() 与 end_batch() 之间的 move_to / move_by / remove_from_screen
+# 不立即处理 Tk 事件，移动按图形项累加为一次 canvas.move，删除合并为一次 canvas.delete，
+# end_batch 时统一提交，整帧只处理一次事件。批量可以嵌套，最外层的 end_batch 才提交。
+
+_batch_depth = 0
+_batch_moves = {}      # 尚未提交的移动：图形项 -> [dx, dy]
+_batch_deletes = []    # 尚未提交的删除
+
+def begin_batch():
+    global _batch_depth
+    _batch_depth += 1
+
+def end_batch(d_o_e=lambda arg: _root_window.dooneevent(arg),
+              d_w=tkinter._tkinter.DONT_WAIT):
+    global _batch_depth
+    _batch_depth = max(0, _batch_depth - 1)
+    if _batch_depth > 0 or _canvas is None:
+        return
+    _flush_batch()
     _canvas.update_idletasks()
+    d_o_e(d_w)
+
+def _clear_batch():
+    global _batch_depth
+    _batch_depth = 0
+    _batch_moves.clear()
+    del _batch_deletes[:]
+
+def _flush_batch():
+    if _canvas is None:
+        return
+    for item, (dx, dy) in _batch_moves.items():
+        if dx or dy:
+            _canvas.move(item, dx, dy)
+    _batch_moves.clear()
+    if _batch_deletes:
+        _canvas.delete(*_batch_deletes)
+        del _batch_deletes[:]
 
 def moveCircle(id, pos, r, endpoints=None):
     global _canvas_x, _canvas_y
@@ -248,29 +324,42 @@ def line(here, there, color=formatColor(0, 0, 0), width=2):
 ##############################################################################
 
 # We bind to key-down and key-up events.
+#
+# 按下和松开都会放入线程安全的队列 _key_events（元素为 ('press' | 'release', keysym)），
+# 等待按键的一方阻塞在 wait_for_key_event 上，不需要轮询。
+# 自动重复：按住一个键时 X11 会不断产生成对的 KeyRelease/KeyPress，Windows/macOS 只重复 KeyPress。
+# 松开先推迟 KEY_RELEASE_DELAY 毫秒确认，期间同一个键又被按下就视为自动重复，两者都丢弃；
+# 已经按下的键再次按下同样视为自动重复。因此按住一个键只产生一次 press 和一次 release。
+
+KEY_RELEASE_DELAY = 30
 
 _keysdown = {}
 _keyswaiting = {}
-# This holds an unprocessed key release.  We delay key releases by up to
-# one call to keys_pressed() to get round a problem with auto repeat.
-_got_release = None
+_key_events = queue.Queue()
+_pending_releases = {}  # keysym -> 确认松开的 after 定时器
+_tk_thread = [None]     # 创建窗口的线程：只有它可以驱动 Tk 的事件循环
 
 def _keypress(event):
-    global _got_release
-    #remap_arrows(event)
-    _keysdown[event.keysym] = 1
-    _keyswaiting[event.keysym] = 1
-#    print(event.char, event.keycode)
-    _got_release = None
+    key = event.keysym
+    pending = _pending_releases.pop(key, None)
+    if pending is not None:
+        _root_window.after_cancel(pending)
+        return  # 自动重复（X11）
+    if key in _keysdown:
+        return  # 自动重复（Windows / macOS）
+    _keysdown[key] = 1
+    _keyswaiting[key] = 1
+    _key_events.put(('press', key))
 
 def _keyrelease(event):
-    global _got_release
-    #remap_arrows(event)
-    try:
-        del _keysdown[event.keysym]
-    except:
-        pass
-    _got_release = 1
+    key = event.keysym
+    if key in _keysdown and key not in _pending_releases:
+        _pending_releases[key] = _root_window.after(KEY_RELEASE_DELAY, _confirm_release, key)
+
+def _confirm_release(key):
+    _pending_releases.pop(key, None)
+    _keysdown.pop(key, None)
+    _key_events.put(('release', key))
 
 def remap_arrows(event):
     # TURN ARROW PRESSES INTO LETTERS (SHOULD BE IN KEYBOARD AGENT)
@@ -286,16 +375,25 @@ def remap_arrows(event):
         event.char = 's'
 
 def _clear_keys(event=None):
-    global _keysdown, _got_release, _keyswaiting
+    global _keysdown, _keyswaiting
     _keysdown = {}
     _keyswaiting = {}
-    _got_release = None
+    for pending in _pending_releases.values():
+        _root_window.after_cancel(pending)
+    _pending_releases.clear()
+    clear_key_events()
+
+def clear_key_events():
+    """丢弃还没有被取走的按键事件"""
+    try:
+        while True:
+            _key_events.get_nowait()
+    except queue.Empty:
+        pass
 
 def keys_pressed(d_o_e=lambda arg: _root_window.dooneevent(arg),
                  d_w=tkinter._tkinter.DONT_WAIT):
     d_o_e(d_w)
-    if _got_release:
-        d_o_e(d_w)
     return _keysdown.keys()
 
 def keys_waiting():
@@ -304,18 +402,86 @@ def keys_waiting():
     _keyswaiting = {}
     return keys
 
+def wait_for_key_event(timeout=None):
+    """
+    阻塞等待下一个按键事件
+    Args:
+        timeout: 最长等待时间（秒），None 表示一直等待
+    Returns:
+        ('press' | 'release', keysym)，超时返回 None
+    在创建窗口的线程中调用时，等待期间由 Tk 的事件循环阻塞在 select 上（不占 CPU），
+    超时由 after 定时器唤醒；在其他线程中调用时直接阻塞在队列上，此时需要由窗口线程处理事件。
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        try:
+            return _key_events.get_nowait()
+        except queue.Empty:
+            pass
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining <= 0:
+            return None
+        if _root_window is None or threading.current_thread() is not _tk_thread[0]:
+            try:
+                return _key_events.get(timeout=remaining)
+            except queue.Empty:
+                return None
+        _flush_batch()
+        timer = None
+        if remaining is not None:
+            timer = _root_window.after(max(1, int(remaining * 1000)), _wake)
+        _root_window.dooneevent(0)  # 处理一个事件，没有事件时阻塞
+        if timer is not None:
+            _root_window.after_cancel(timer)
+
+def _wake():
+    pass
+
+def pump_events(timeout=0.0):
+    """
+    处理 Tk 事件，代替 time.sleep 用在主循环中：先处理完所有积压的事件，再在 timeout 秒内
+    继续处理新到的事件（等待期间阻塞在 select 上，不占 CPU），睡眠期间窗口仍然响应按键、重绘和拖动。
+    没有窗口或不在创建窗口的线程中调用时等同于 time.sleep
+    """
+    if _root_window is None or threading.current_thread() is not _tk_thread[0]:
+        if timeout > 0:
+            time.sleep(timeout)
+        return
+    _flush_batch()
+    while _root_window.dooneevent(tkinter._tkinter.DONT_WAIT):
+        pass
+    if timeout <= 0:
+        return
+    expired = []
+    _root_window.after(max(1, int(round(timeout * 1000))), expired.append, True)
+    while not expired:
+        _root_window.dooneevent(0)  # 处理一个事件，没有事件时阻塞到定时器
+
+def wait_for_keypress(timeout=None):
+    """阻塞等待下一次按下（忽略松开事件），返回 keysym；超时返回 None"""
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        remaining = None if deadline is None else max(0.0, deadline - time.time())
+        event = wait_for_key_event(remaining)
+        if event is None:
+            return None
+        if event[0] == 'press':
+            return event[1]
+
 # Block for a list of keys...
 
 def wait_for_keys():
-    keys = []
-    while keys == []:
-        keys = keys_pressed()
-        sleep(0.05)
-    return keys
+    """阻塞到有键按下，返回当前按下的键（新按下的键在最前面）"""
+    key = wait_for_keypress()
+    return [key] + [other for other in _keysdown if other != key]
 
 def remove_from_screen(x,
                        d_o_e=lambda arg: _root_window.dooneevent(arg),
                        d_w=tkinter._tkinter.DONT_WAIT):
+    if _batch_depth > 0:
+        _batch_moves.pop(x, None)
+        _batch_deletes.append(x)
+        return
     _canvas.delete(x)
     d_o_e(d_w)
 
@@ -330,22 +496,15 @@ def move_to(object, x, y=None,
             d_w=tkinter._tkinter.DONT_WAIT):
     if y is None:
         try: x, y = x
-        except: raise  'incomprehensible coordinates'
+        except: raise Exception('incomprehensible coordinates')
 
-    horiz = True
-    newCoords = []
+    # 只读取第一个点，整体平移用 canvas.move 完成（不再读回并重写所有坐标）
     current_x, current_y = _canvas.coords(object)[0:2] # first point
-    for coord in  _canvas.coords(object):
-        if horiz:
-            inc = x - current_x
-        else:
-            inc = y - current_y
-        horiz = not horiz
-
-        newCoords.append(coord + inc)
-
-    _canvas.coords(object, *newCoords)
-    d_o_e(d_w)
+    if _batch_depth > 0:
+        pending = _batch_moves.get(object)
+        if pending is not None:
+            current_x, current_y = current_x + pending[0], current_y + pending[1]
+    move_by(object, x - current_x, y - current_y, d_o_e, d_w)
 
 def move_by(object, x, y=None,
             d_o_e=lambda arg: _root_window.dooneevent(arg),
@@ -354,19 +513,13 @@ def move_by(object, x, y=None,
         try: x, y = x
         except: raise Exception('incomprehensible coordinates')
 
-    horiz = True
-    newCoords = []
-    for coord in  _canvas.coords(object):
-        if horiz:
-            inc = x
-        else:
-            inc = y
-        horiz = not horiz
-
-        newCoords.append(coord + inc)
-
-    _canvas.coords(object, *newCoords)
-    d_o_e(d_w)
+    if _batch_depth > 0:
+        pending = _batch_moves.setdefault(object, [0, 0])
+        pending[0] += x
+        pending[1] += y
+    else:
+        _canvas.move(object, x, y)
+        d_o_e(d_w)
     if lift:
         _canvas.tag_raise(object)
 
@@ -0,0 +1,299 @@
+"""
+批量推理代理：在多个并发运行的对局（线程或 asyncio 任务）与一个模型之间收集观测，
+组成小批量后一次调用模型，再把结果分发回各个 agent
+
+    broker = InferenceBroker(model, maxBatchSize=32, maxLatency=0.002)
+    agents = [BrokeredAgent(broker) for i in range(numGames)]
+    ...
+    print(broker.report())
+    broker.close()
+
+批量的组成规则：后台线程取到第一个请求后，继续收集请求直到达到 maxBatchSize，
+或距离第一个请求提交已经过了 maxLatency 秒，然后对整批调用一次模型。
+模型是任意可调用对象：输入形状为 (batch, ...) 的 float32 数组，返回每个观测对应的
+5 个动作得分（按 Directions.ORDER 排列）。
+
+用法（演示）:
+    python inferenceBroker.py -n 32 -l map_0          # 32 个对局线程共用一个模型
+    python inferenceBroker.py -n 32 --maxBatch 1      # 对比：不做批量
+    python inferenceBroker.py -n 256 --asyncio        # 256 个对局在同一个事件循环中运行
+"""
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from game import Agent
+from game import Directions
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FEATURE_PLANES = 6  # 墙、食物、能量豆、Pac-Man、正常的鬼、受惊的鬼
+
+
+def stateFeatures(state):
+    """
+    把状态编码为 (FEATURE_PLANES, width, height) 的 float32 数组，作为模型的输入
+    """
+    data = state.data
+    layout = data.layout
+    planes = np.zeros((FEATURE_PLANES, layout.width, layout.height), dtype=np.float32)
+    planes[0] = _wallPlane(layout)
+    planes[1] = data.food.data
+    for x, y in data.capsules:
+        planes[2, x, y] = 1.0
+    for index, agentState in enumerate(data.agentStates):
+        if agentState.respawnTimer > 0:
+            continue
+        x, y = agentState.configuration.pos
+        x, y = int(x + 0.5), int(y + 0.5)
+        if index == 0:
+            planes[3, x, y] = 1.0
+        elif agentState.scaredTimer > 0:
+            planes[5, x, y] += 1.0
+        else:
+            planes[4, x, y] += 1.0
+    return planes
+
+
+def _wallPlane(layout):
+    # 墙是静态的：每个 Layout 只转换一次（与 PacmanRules.getWalls 的缓存方式相同）
+    plane = getattr(layout, '_wallPlane', None)
+    if plane is None:
+        plane = layout._wallPlane = np.array(layout.walls.data, dtype=np.float32)
+    return plane
+
+
+class Histogram:
+    """固定分桶的直方图：bounds 为各桶的上界（含），超过最后一个上界的值计入溢出桶"""
+
+    def __init__(self, bounds, unit=''):
+        self.bounds = list(bounds)
+        self.unit = unit
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value, count=1):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.counts[i] += count
+        self.total += count
+        self.sum += value * count
+        self.max = max(self.max, value)
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0.0
+
+    def percentile(self, fraction):
+        """按桶估计的分位数（返回所在桶的上界）"""
+        if not self.total:
+            return 0.0
+        target = fraction * self.total
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+    def format(self, title, width=40):
+        lines = ['%s: n=%d mean=%.3g%s p50<=%.3g%s p99<=%.3g%s max=%.3g%s'
+                 % (title, self.total, self.mean(), self.unit, self.percentile(0.5), self.unit,
+                    self.percentile(0.99), self.unit, self.max, self.unit)]
+        peak = max(self.counts) or 1
+        labels = ['<= %g%s' % (bound, self.unit) for bound in self.bounds] + ['>  %g%s' % (self.bounds[-1], self.unit)]
+        for label, count in zip(labels, self.counts):
+            if count:
+                lines.append('  %-12s %8d %s' % (label, count, '#' * max(1, int(width * count / peak))))
+        return '\n'.join(lines)
+
+
+class InferenceBroker:
+    """
+    模型调用的批量代理：submit 可以在任意线程中调用，返回 concurrent.futures.Future；
+    submitAsync 返回可以在事件循环中 await 的 asyncio.Future。
+    """
+
+    def __init__(self, model, maxBatchSize=32, maxLatency=0.002):
+        """
+        Args:
+            model: 批量模型，model(inputs) 返回与 inputs 等长的输出序列
+            maxBatchSize: 每批最多的观测数
+            maxLatency: 第一个请求最多等待多久（秒）就必须开始推理
+        """
+        if np is None:
+            raise Exception("InferenceBroker requires numpy (pip install numpy)")
+        self.model = model
+        self.maxBatchSize = max(1, int(maxBatchSize))
+        self.maxLatency = float(maxLatency)
+        self.requests = queue.Queue()
+        self.batchSizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256])
+        self.latencies = Histogram([0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100], 'ms')
+        self.modelTimes = Histogram([0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100], 'ms')
+        self._thread = threading.Thread(target=self._loop, name='InferenceBroker')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, features):
+        """提交一个观测；返回的 Future 在所在批次推理完成后得到该观测的模型输出"""
+        future = Future()
+        self.requests.put((features, future, time.perf_counter()))
+        return future
+
+    def submitAsync(self, features):
+        import asyncio
+        return asyncio.wrap_future(self.submit(features))
+
+    def close(self):
+        """处理完已提交的请求后停止后台线程"""
+        if self._thread is not None:
+            self.requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        running = True
+        while running:
+            first = self.requests.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = first[2] + self.maxLatency
+            while len(batch) < self.maxBatchSize:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._runBatch(batch)
+
+    def _runBatch(self, batch):
+        start = time.perf_counter()
+        try:
+            outputs = self.model(np.stack([features for features, future, submitted in batch]))
+        except Exception as e:
+            for features, future, submitted in batch:
+                future.set_exception(e)
+            return
+        done = time.perf_counter()
+        self.modelTimes.add((done - start) * 1000.0)
+        self.batchSizes.add(len(batch))
+        for (features, future, submitted), output in zip(batch, outputs):
+            self.latencies.add((done - submitted) * 1000.0)
+            future.set_result(output)
+
+    def report(self):
+        return '\n'.join([self.batchSizes.format('batch size'),
+                          self.latencies.format('request latency'),
+                          self.modelTimes.format('model call')])
+
+
+class BrokeredAgent(Agent):
+    """
+    通过 InferenceBroker 调用共享模型的 agent：选择模型得分最高的合法动作
+    """
+
+    def __init__(self, broker, index=0, featurize=stateFeatures):
+        """
+        Args:
+            broker: 共享的 InferenceBroker
+            featurize: 把 GameState 转为模型输入的函数
+        """
+        self.index = index
+        self.broker = broker
+        self.featurize = featurize
+
+    def getAction(self, state):
+        scores = self.broker.submit(self.featurize(state)).result()
+        return self.chooseAction(state, scores)
+
+    def chooseAction(self, state, scores):
+        legal = state.getLegalActions(self.index)
+        if not legal:
+            return Directions.STOP
+        return max(legal, key=lambda action: scores[Directions.INDEX[action]])
+
+
+class AsyncBrokeredAgent(BrokeredAgent):
+    """
+    协程版的 BrokeredAgent：等待推理结果时让出事件循环，用于 Game.runAsync / runGamesConcurrently
+    """
+
+    async def getAction(self, state):
+        scores = await self.broker.submitAsync(self.featurize(state))
+        return self.chooseAction(state, scores)
+
+
+class DummyNumpyModel:
+    """
+    测试用的随机线性模型：把输入展平后乘以固定的随机权重，得到 5 个动作得分
+    delay 模拟每次调用的固定开销（例如一次 GPU kernel 启动），用来观察批量的效果
+    """
+
+    def __init__(self, inputShape, numActions=len(Directions.ORDER), seed=0, delay=0.0):
+        rng = np.random.default_rng(seed)
+        size = int(np.prod(inputShape))
+        self.weights = rng.standard_normal((size, numActions)).astype(np.float32) / np.sqrt(size)
+        self.delay = delay
+
+    def __call__(self, inputs):
+        if self.delay:
+            time.sleep(self.delay)
+        return inputs.reshape(len(inputs), -1) @ self.weights
+
+
+def main(argv):
+    import argparse
+    import layout as layoutModule
+    import textDisplay
+    from game import runGamesConcurrently
+    from pacman import ClassicGameRules
+    from ghostAgents import DirectionalGhost
+    parser = argparse.ArgumentParser(description='批量推理代理演示：多个对局线程共用一个模型')
+    parser.add_argument('-l', '--layout', default='map_0', help='地图名称（默认: map_0）')
+    parser.add_argument('-n', '--games', type=int, default=16, help='并发对局数（默认: 16）')
+    parser.add_argument('-g', '--ghosts', type=int, default=4, help='Ghost 数量（默认: 4）')
+    parser.add_argument('--maxBatch', type=int, default=32, help='每批最多观测数（默认: 32）')
+    parser.add_argument('--maxLatency', type=float, default=2.0, help='最长等待时间，毫秒（默认: 2）')
+    parser.add_argument('--asyncio', action='store_true', help='所有对局在一个 asyncio 事件循环中运行（默认每个对局一个线程）')
+    parser.add_argument('--delay', type=float, default=1.0, help='模拟的每次模型调用开销，毫秒（默认: 1）')
+    args = parser.parse_args(argv)
+
+    layout = layoutModule.getLayout(args.layout)
+    if layout is None:
+        raise Exception("The layout " + args.layout + " cannot be found")
+    model = DummyNumpyModel((FEATURE_PLANES, layout.width, layout.height), delay=args.delay / 1000.0)
+    broker = InferenceBroker(model, args.maxBatch, args.maxLatency / 1000.0)
+    rules = ClassicGameRules()
+    agentClass = AsyncBrokeredAgent if args.asyncio else BrokeredAgent
+    games = [rules.newGame(layout, agentClass(broker), [DirectionalGhost(i + 1) for i in range(args.ghosts)],
+                           textDisplay.NullGraphics(), quiet=True) for i in range(args.games)]
+    start = time.perf_counter()
+    if args.asyncio:
+        runGamesConcurrently(games)
+    else:
+        threads = [threading.Thread(target=game.run) for game in games]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    broker.close()
+    moves = sum([game.numMoves for game in games])
+    print("%d games, %d turns in %.2fs (%.0f turns/s)" % (len(games), moves, elapsed, moves / elapsed))
+    print(broker.report())
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,144 @@
+"""
+输入录制：把键盘会话中 Pac-Man 的每个动作连同时间戳写入紧凑的文件，之后用
+simpleAgents.ScriptedAgent 在无界面下全速重放，把一次人工操作的对局变成可以重复运行的回归用例
+
+与 replay.GameRecorder 不同，这里只录制 Pac-Man 的输入（鬼的动作在重放时由同样的随机种子重新算出），
+因此重放会完整地经过 agent、规则和显示的整条流水线：
+
+    python pacman.py -l map_0 -g DirectionalGhost --recordInput session.inp     # 键盘操作并录制
+    python pacman.py --replayInput session.inp -q                               # 无界面全速重放
+    python pacman.py --replayInput session.inp --frameTime 0                    # 重放并渲染，测量显示的开销
+
+录制的是 KeyboardAgent.getAction 最终返回的动作（按键经 getMove 以及空格/Q/沿上次方向等规则处理之后），
+时间戳是从开始录制到做出该动作经过的毫秒数。只支持回合制：实时模式下鬼基于上一个 tick 的观测
+在后台线程中决策，对局本身不可复现。
+
+文件格式（流式）:
+    INPUT_MAGIC
+    头部：一行 UTF-8 JSON（版本、地图文本、Ghost 类型和数量、对局数、随机种子等），以 '\n' 结尾
+    动作：每个动作 5 字节，小端 uint32 毫秒时间戳 + uint8 方向编码（Directions.INDEX）
+"""
+import json
+import struct
+import sys
+import time
+
+from game import Directions
+import layout as layoutModule
+
+INPUT_MAGIC = b'PACINP\x01\n'
+INPUT_VERSION = 1
+_RECORD = struct.Struct('<IB')
+
+
+class InputRecorder:
+    """
+    流式写入 Pac-Man 的输入；通过 KeyboardAgent.recorder 挂到键盘 agent 上
+    """
+
+    def __init__(self, filename, layout, numGhosts, seed=None, flushInterval=1, **extra):
+        """
+        Args:
+            filename: 输出文件路径
+            layout: 对局使用的 Layout（地图文本写入头部）
+            numGhosts: Ghost 数量
+            seed: 对局开始前设置的随机种子，重放时用同一个种子才能复现鬼的动作
+            flushInterval: 每录制多少个动作刷新一次文件（人工操作很慢，默认每个动作都刷新）
+            extra: 其他写入头部的信息（例如 ghost、numGames）
+        """
+        self.filename = filename
+        self.flushInterval = max(1, int(flushInterval))
+        self.numMoves = 0
+        self.elapsed = 0.0
+        self._buffer = bytearray()
+        header = {
+            'version': INPUT_VERSION,
+            'layout': list(layout.layoutText),
+            'numGhosts': numGhosts,
+            'seed': seed,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        header.update(extra)
+        self._file = open(filename, 'wb')
+        self._file.write(INPUT_MAGIC)
+        self._file.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        self._start = time.perf_counter()
+
+    def record(self, action):
+        """记录一个动作，时间戳为从开始录制经过的毫秒数"""
+        self.elapsed = time.perf_counter() - self._start
+        self._buffer += _RECORD.pack(min(int(self.elapsed * 1000), 0xFFFFFFFF), Directions.INDEX[action])
+        self.numMoves += 1
+        if len(self._buffer) >= self.flushInterval * _RECORD.size:
+            self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def __str__(self):
+        return '%d moves over %.1fs (%s)' % (self.numMoves, self.elapsed, self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def readInputRecording(filename):
+    """
+    读取输入录制文件
+    Returns:
+        (header, layout, actions, times) 元组；actions 是动作列表，times 是对应的时间戳（秒）。
+        进程中途退出时最后一个不完整的记录被忽略
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(INPUT_MAGIC)) != INPUT_MAGIC:
+            raise Exception("%s is not an input recording" % filename)
+        header = json.loads(f.readline().decode('utf-8'))
+        if header.get('version') != INPUT_VERSION:
+            raise Exception("Unsupported input recording version: %s" % header.get('version'))
+        data = f.read()
+    data = data[:len(data) - len(data) % _RECORD.size]
+    actions, times = [], []
+    for milliseconds, code in _RECORD.iter_unpack(data):
+        actions.append(Directions.ORDER[code])
+        times.append(milliseconds / 1000.0)
+    return header, layoutModule.Layout(header['layout']), actions, times
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description='查看输入录制文件')
+    parser.add_argument('recording', help='输入录制文件')
+    args = parser.parse_args(argv)
+
+    header, layout, actions, times = readInputRecording(args.recording)
+    print('%s: %d moves over %.1fs, layout %dx%d, %d x %s, seed %r, created %s'
+          % (args.recording, len(actions), times[-1] if times else 0.0, layout.width, layout.height,
+             header['numGhosts'], header.get('ghost', '?'), header.get('seed'), header.get('created')))
+    counts = dict((action, 0) for action in Directions.ORDER)
+    for action in actions:
+        counts[action] += 1
+    print('actions: ' + ' '.join('%s=%d' % (action, counts[action]) for action in Directions.ORDER))
+    if len(times) > 1:
+        gaps = sorted(b - a for a, b in zip(times, times[1:]))
+        print('time between moves: median %.0fms max %.0fms' % (1000 * gaps[len(gaps) // 2], 1000 * gaps[-1]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
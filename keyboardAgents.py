@@ -15,6 +15,7 @@
 from game import Agent
 from game import Directions
 import random
+import time
 
 class KeyboardAgent(Agent):
     """
@@ -32,57 +33,22 @@ class KeyboardAgent(Agent):
         self.lastMove = Directions.STOP
         self.index = index
         self.keys = []
-        self.pendingAction = None  # 回合制：存储待执行的动作
+        self.recorder = None  # inputRecording.InputRecorder：录制回合制中每一步的动作
 
     def getAction( self, state):
-        from graphicsUtils import keys_waiting
-        from graphicsUtils import keys_pressed
-        import time
-        
-        # 回合制模式：等待按键按下并释放才算一个完整动作
-        # 1. 等待按键按下
-        # 2. 等待按键释放
-        # 3. 返回对应的动作
-        
-        # 初始化按键状态跟踪
-        if not hasattr(self, '_key_pressed_state'):
-            self._key_pressed_state = {}  # 记录哪些键被按下
-        
-        # 第一步：等待按键按下
-        key_pressed = None
-        while key_pressed is None:
-            # 检查新按下的键
-            waiting_keys = list(keys_waiting())
-            current_pressed = set(keys_pressed())
-            
-            # 找出新按下的键（在current_pressed中但不在_key_pressed_state中）
-            new_keys = current_pressed - set(self._key_pressed_state.keys())
-            
-            if new_keys:
-                # 记录新按下的键
-                key_pressed = list(new_keys)[0]
-                self._key_pressed_state[key_pressed] = True
-                break
-            
-            # 更新按键状态
-            for key in list(self._key_pressed_state.keys()):
-                if key not in current_pressed:
-                    # 键已释放，从状态中移除
-                    del self._key_pressed_state[key]
-            
-            time.sleep(0.05)
-        
-        # 第二步：等待按键释放
-        while key_pressed in self._key_pressed_state:
-            current_pressed = set(keys_pressed())
-            if key_pressed not in current_pressed:
-                # 按键已释放
-                del self._key_pressed_state[key_pressed]
-                break
-            time.sleep(0.05)
-        
-        # 按键已按下并释放，记录按键
-        self.keys = [key_pressed]
+        """
+        回合制：每次按下一个键走一步（按下即生效；按住时的自动重复不会产生额外的动作，
+        等待期间连续按下的键会依次用于之后的回合）。
+        等待时 Tk 的事件循环阻塞在 select 上，不占 CPU。设置了时间预算（moveDeadline）时
+        最多等到截止时间，超时按没有按键处理。
+        """
+        from graphicsUtils import wait_for_keypress
+
+        timeout = None
+        if self.moveDeadline is not None:
+            timeout = max(0.0, self.moveDeadline - time.time())
+        key = wait_for_keypress(timeout)
+        self.keys = [key] if key is not None else []
         
         legal = state.getLegalActions(self.index)
         move = self.getMove(legal)
@@ -91,9 +57,7 @@ class KeyboardAgent(Agent):
         # 检查是否有空格键
         if 'space' in self.keys or ' ' in self.keys:
             if Directions.STOP in legal:
-                move = Directions.STOP
-                self.lastMove = move
-                return move
+                return self._commit(Directions.STOP)
 
         # 如果没有有效移动，且上次移动合法，继续上次方向
         if move == Directions.STOP:
@@ -114,9 +78,33 @@ class KeyboardAgent(Agent):
         if move not in legal:
             move = random.choice(legal)
 
+        return self._commit(move)
+
+    def _commit( self, move ):
         self.lastMove = move
+        if self.recorder is not None:
+            self.recorder.record(move)
         return move
 
+    def pollAction( self, state ):
+        """
+        实时模式（见 realtime.py）：不阻塞地读取当前按下的方向键。
+        按键设定的方向会一直保持，直到按下其他方向键；当前不能走的方向由调度器处理
+        （沿原方向继续或停下），因此可以在路口前提前按下转向键。
+        """
+        from graphicsUtils import keys_waiting
+        from graphicsUtils import keys_pressed
+        from graphicsUtils import clear_key_events
+        self.keys = list(keys_waiting()) + list(keys_pressed())
+        clear_key_events()  # 实时模式只看按键状态，不使用事件队列
+        for direction, keys in ((Directions.WEST, (self.WEST_KEY, 'Left')), (Directions.EAST, (self.EAST_KEY, 'Right')),
+                                (Directions.NORTH, (self.NORTH_KEY, 'Up')), (Directions.SOUTH, (self.SOUTH_KEY, 'Down'))):
+            if keys[0] in self.keys or keys[1] in self.keys:
+                self.lastMove = direction
+        if self.STOP_KEY in self.keys or 'space' in self.keys or ' ' in self.keys:
+            self.lastMove = Directions.STOP
+        return self.lastMove
+
     def getMove(self, legal):
         move = Directions.STOP
         if   (self.WEST_KEY in self.keys or 'Left' in self.keys) and Directions.WEST in legal:  move = Directions.WEST
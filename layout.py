@@ -14,18 +14,47 @@
 
 from util import manhattanDistance
 from game import Grid
+import hashlib
 import os
 import random
+import threading
+import weakref
 from functools import reduce
 
 VISIBILITY_MATRIX_CACHE = {}
 
+# 已创建的 Layout，按地图内容的哈希索引（见 Layout.__new__）；不再被引用的地图自动移除
+_LAYOUTS = weakref.WeakValueDictionary()
+_LAYOUTS_LOCK = threading.Lock()
+
 class Layout:
     """
     A Layout manages the static information about the game board.
+
+    Layout 创建后不可修改，并按地图内容驻留：用相同的文本构造 Layout（包括 deepCopy、
+    pickle 还原、录像和观测解码）得到的都是同一个实例，所有状态共用一份墙和食物网格。
+    下划线开头的属性留给派生数据的缓存（例如 PacmanRules.getWalls 的 _pacmanWalls）。
     """
 
-    def __init__(self, layoutText):
+    def __new__(cls, layoutText=None):
+        if layoutText is None:
+            # 旧版本 pickle 中的 Layout：由 __setstate__ 重新构造（不驻留），可用 observations.internLayout 换成共享实例
+            return object.__new__(cls)
+        layoutText = tuple(layoutText)
+        key = hashlib.sha1('\n'.join(layoutText).encode('utf-8')).hexdigest()
+        with _LAYOUTS_LOCK:
+            layout = _LAYOUTS.get(key)
+            if layout is None:
+                layout = object.__new__(cls)
+                layout._build(layoutText, key)
+                _LAYOUTS[key] = layout
+        return layout
+
+    def __init__(self, layoutText=None):
+        pass  # 由 __new__ 构造（已驻留的实例不再重新解析）
+
+    def _build(self, layoutText, key):
+        self.key = key
         self.width = len(layoutText[0])
         self.height= len(layoutText)
         self.walls = Grid(self.width, self.height, False)
@@ -38,6 +67,27 @@ class Layout:
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
         # self.initializeVisibilityMatrix()
+        # 冻结：网格和列表都换成元组，之后不能再修改公开属性
+        self.walls.data = tuple(map(tuple, self.walls.data))
+        self.food.data = tuple(map(tuple, self.food.data))
+        self.capsules = tuple(self.capsules)
+        self.agentPositions = tuple(self.agentPositions)
+        self.portals = tuple(self.portals)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_frozen') and not name.startswith('_'):
+            raise AttributeError("Layout is immutable (cannot set '%s')" % name)
+        object.__setattr__(self, name, value)
+
+    def __reduce__(self):
+        # pickle 只保存地图文本，还原时得到驻留的实例
+        return (Layout, (self.layoutText,))
+
+    def __setstate__(self, state):
+        # 旧版本 pickle 中的 Layout（实例字典）：从地图文本重新构造，得到与驻留实例相同的不可变 Layout
+        layoutText = tuple(state['layoutText'])
+        self._build(layoutText, hashlib.sha1('\n'.join(layoutText).encode('utf-8')).hexdigest())
 
     def getNumGhosts(self):
         return self.numGhosts
@@ -58,10 +108,12 @@ class Layout:
                             while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)] :
                                 vis[x][y][direction].add((nextx, nexty))
                                 nextx, nexty = x + dx, y + dy
-            self.visibility = vis
+            self._visibility = vis
             VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
         else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)]
+            self._visibility = VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)]
+
+    visibility = property(lambda self: self._visibility)
 
     def isWall(self, pos):
         x, col = pos
@@ -92,7 +144,7 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        return self  # 不可修改，副本就是自身
 
     def processLayoutText(self, layoutText):
         """
@@ -0,0 +1,333 @@
+# mctsAgents.py
+# 蒙特卡洛树搜索（MCTS / UCT）Pac-Man agent
+#
+# 树中的每个决策节点对应一轮开始时（Pac-Man 即将移动）的状态。一次转移 = Pac-Man 走一步、
+# 存活的 Ghost 按 DirectionalGhost 的分布依次随机走一步、再更新复活倒计时，与 Game.run
+# 的回合顺序一致。由于 Ghost 是随机的，同一个动作下按状态键区分不同的结果节点，
+# 这也使得下一步可以在树中找到实际到达的状态，复用其子树。
+#
+# 支持两种并行方式（workers > 1 时生效）：
+#   root: 每个工作进程从根节点独立建树，最后合并根节点各动作的统计
+#   leaf: 主进程选择并扩展叶子，叶子的多次 rollout 分发到进程池中并行执行
+
+from game import Agent
+from game import Directions
+from ghostAgents import DirectionalGhost
+import util
+import math
+import random
+import time
+
+LIFE_VALUE = 200.0   # 估值中一条命相当的分数
+REWARD_SCALE = 100.0 # 回报归一化尺度，使 UCT 的探索常数与分数量级无关
+
+
+def _evaluate(state):
+    data = state.data
+    return data.score + LIFE_VALUE * data.lives
+
+
+class DecisionNode:
+    """Pac-Man 即将移动的状态节点"""
+
+    def __init__(self, state):
+        self.state = state
+        self.visits = 0
+        self.edges = {}   # action -> ActionEdge
+        self.terminal = state.isWin() or state.isLose() or state.data._roundComplete
+        self.untried = [] if self.terminal else state.getLegalActions(0)
+        random.shuffle(self.untried)
+
+
+class ActionEdge:
+    """决策节点下的一个动作；Ghost 的随机行为使其可能通向多个结果节点"""
+
+    def __init__(self):
+        self.visits = 0
+        self.total = 0.0
+        self.outcomes = {}  # GameState.getStateKey() -> DecisionNode
+
+    def mean(self):
+        return self.total / self.visits if self.visits else 0.0
+
+
+class TreeSearch:
+    """
+    UCT 搜索的核心，不依赖 Agent，因此也可以在工作进程中单独使用
+    """
+
+    def __init__(self, numAgents, exploration=1.0, rolloutDepth=10):
+        """
+        Args:
+            numAgents: agent 总数（Pac-Man + Ghost）
+            exploration: UCT 探索常数
+            rolloutDepth: 每次 rollout 最多模拟的回合数
+        """
+        self.exploration = exploration
+        self.rolloutDepth = rolloutDepth
+        self.ghostModels = [None] + [DirectionalGhost(i) for i in range(1, numAgents)]
+
+    def simulateRound(self, state, action):
+        """
+        执行一轮：Pac-Man 执行 action，存活的 Ghost 依次按分布随机移动，最后更新复活倒计时
+        Returns:
+            新状态；对局结束或本轮吃完糖豆时提前返回
+        """
+        state = state.generateSuccessor(0, action)
+        if state.isWin() or state.isLose() or state.data._roundComplete:
+            return state
+        for index in range(1, state.getNumAgents()):
+            if state.data.agentStates[index].respawnTimer > 0:
+                continue
+            dist = self.ghostModels[index].getDistribution(state)
+            ghostAction = util.chooseFromDistribution(dist) if len(dist) else Directions.STOP
+            state = state.generateSuccessor(index, ghostAction)
+            if state.isWin() or state.isLose():
+                return state
+        # 后继状态是独立的副本，可以原地更新倒计时
+        state.data.updateRespawnTimers()
+        return state
+
+    def rollout(self, state):
+        """
+        从 state 开始快速模拟到 rolloutDepth 回合或对局结束
+        Pac-Man 使用简单的随机策略：不原地停留，尽量不掉头
+        Returns:
+            终局估值
+        """
+        for depth in range(self.rolloutDepth):
+            if state.isWin() or state.isLose() or state.data._roundComplete:
+                break
+            state = self.simulateRound(state, self._rolloutAction(state))
+        return _evaluate(state)
+
+    def _rolloutAction(self, state):
+        legal = [a for a in state.getLegalActions(0) if a != Directions.STOP]
+        if not legal:
+            return Directions.STOP
+        reverse = Directions.REVERSE[state.data.agentStates[0].configuration.direction]
+        if len(legal) > 1 and reverse in legal:
+            legal.remove(reverse)
+        return random.choice(legal)
+
+    def _selectEdge(self, node):
+        logVisits = math.log(max(node.visits, 1))
+        best, bestScore = None, None
+        for action, edge in node.edges.items():
+            score = edge.mean() + self.exploration * math.sqrt(logVisits / edge.visits)
+            if bestScore is None or score > bestScore:
+                best, bestScore = action, score
+        return best
+
+    def select(self, root):
+        """
+        选择并扩展：沿 UCT 下降，遇到未尝试的动作或新的随机结果时创建新节点
+        Returns:
+            (路径 [(节点, 动作)], 叶子节点)
+        """
+        node = root
+        path = []
+        while not node.terminal:
+            if node.untried:
+                action = node.untried.pop()
+                edge = node.edges[action] = ActionEdge()
+            else:
+                action = self._selectEdge(node)
+                edge = node.edges[action]
+            path.append((node, action))
+            nextState = self.simulateRound(node.state, action)
+            key = nextState.getStateKey()
+            child = edge.outcomes.get(key)
+            if child is None:
+                child = edge.outcomes[key] = DecisionNode(nextState)
+                return path, child
+            node = child
+        return path, node
+
+    def backup(self, path, leaf, total, count=1):
+        """把 count 次 rollout 的回报之和 total 反向传播到路径上"""
+        leaf.visits += count
+        for node, action in path:
+            node.visits += count
+            edge = node.edges[action]
+            edge.visits += count
+            edge.total += total
+
+    def iterate(self, root, baseline):
+        path, leaf = self.select(root)
+        reward = (self.rollout(leaf.state) - baseline) / REWARD_SCALE
+        self.backup(path, leaf, reward)
+
+    def search(self, root, deadline, maxIterations=0):
+        """在时间/次数预算内迭代；返回完成的迭代次数"""
+        baseline = _evaluate(root.state)
+        iterations = 0
+        while not root.terminal:
+            self.iterate(root, baseline)
+            iterations += 1
+            if maxIterations and iterations >= maxIterations:
+                break
+            if time.time() >= deadline:
+                break
+        return iterations
+
+
+def _rootWorker(args):
+    """root 并行的工作进程：独立建树并返回根节点各动作的 (访问次数, 回报和)"""
+    state, params, timeLimit, maxIterations, seed = args
+    random.seed(seed)
+    searcher = TreeSearch(state.getNumAgents(), **params)
+    root = DecisionNode(state)
+    searcher.search(root, time.time() + timeLimit, maxIterations)
+    return dict([(action, (edge.visits, edge.total)) for action, edge in root.edges.items()])
+
+
+def _rolloutWorker(args):
+    """leaf 并行的工作进程：从叶子状态执行一次 rollout"""
+    state, params, seed = args
+    random.seed(seed)
+    searcher = TreeSearch(state.getNumAgents(), **params)
+    return searcher.rollout(state)
+
+
+class MCTSAgent(Agent):
+    """
+    UCT Pac-Man agent
+
+    每步在时间预算（timeLimit 秒）和/或迭代次数预算（rollouts）内搜索，
+    最终选择访问次数最多的动作。下一步时如果实际到达的状态已在树中，则复用其子树。
+    """
+
+    def __init__(self, index=0, timeLimit=0.5, rollouts=0, rolloutDepth=10, exploration=1.0,
+                 workers=1, parallel='root', reuseTree=True, verbose=False):
+        """
+        Args:
+            timeLimit: 每步搜索的时间预算（秒）
+            rollouts: 每步最多迭代次数，0 表示只受时间限制
+            rolloutDepth: 每次 rollout 最多模拟的回合数
+            exploration: UCT 探索常数
+            workers: 并行进程数，1 表示不使用进程池
+            parallel: 并行方式，'root' 或 'leaf'
+            reuseTree: 是否在相邻两步之间复用子树
+            verbose: 是否在每步后打印搜索统计
+        """
+        self.index = index
+        # 命令行通过 -a 传入的参数是字符串
+        flag = lambda value: value not in (False, 'False', 'false', '0', 0)
+        self.timeLimit = float(timeLimit)
+        self.rollouts = int(rollouts)
+        self.workers = max(1, int(workers))
+        self.parallel = parallel
+        if parallel not in ('root', 'leaf'):
+            raise Exception("Unknown parallel mode: %s (expected 'root' or 'leaf')" % parallel)
+        self.reuseTree = flag(reuseTree)
+        self.verbose = flag(verbose)
+        self.params = {'exploration': float(exploration), 'rolloutDepth': int(rolloutDepth)}
+        self.searcher = None
+        self.root = None
+        self.lastAction = None
+        self.pool = None
+        self.lastSearchInfo = {}
+
+    def registerInitialState(self, state):
+        self.searcher = None
+        self.root = None
+        self.lastAction = None
+
+    def _getPool(self):
+        if self.pool is None:
+            import multiprocessing
+            self.pool = multiprocessing.Pool(self.workers)
+        return self.pool
+
+    def close(self):
+        """关闭进程池"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def final(self, state):
+        self.close()
+
+    def _findRoot(self, state):
+        """在上一步的树中查找当前状态（子树复用），找不到时新建根节点"""
+        if self.searcher is None:
+            self.searcher = TreeSearch(state.getNumAgents(), **self.params)
+        if self.reuseTree and self.root is not None and self.lastAction in self.root.edges:
+            child = self.root.edges[self.lastAction].outcomes.get(state.getStateKey())
+            if child is not None and child.state == state:
+                return child, True
+        return DecisionNode(state), False
+
+    def getAction(self, state):
+        legal = state.getLegalActions(self.index)
+        if not legal:
+            return Directions.STOP
+        if len(legal) == 1:
+            self.root = None
+            return legal[0]
+
+        root, reused = self._findRoot(state)
+        startVisits = root.visits
+        deadline = time.time() + self.timeLimit
+        if self.moveDeadline is not None:
+            # 限时对局：在 Game 规定的时间点之前停止搜索
+            deadline = min(deadline, self.moveDeadline - 0.01)
+        if self.workers > 1 and self.parallel == 'root':
+            stats = self._rootParallel(root, deadline)
+        elif self.workers > 1:
+            self._leafParallel(root, deadline)
+            stats = None
+        else:
+            self.searcher.search(root, deadline, self.rollouts)
+            stats = None
+
+        if stats is None:
+            stats = dict([(action, (edge.visits, edge.total)) for action, edge in root.edges.items()])
+        action = max(legal, key=lambda a: stats.get(a, (0, 0.0)))
+
+        self.root = root
+        self.lastAction = action
+        self.lastSearchInfo = {'iterations': root.visits - startVisits, 'reused': reused,
+                               'visits': stats.get(action, (0, 0.0))[0]}
+        if self.verbose:
+            print("MCTS: %(iterations)d iterations, reused=%(reused)s, visits(best)=%(visits)d" % self.lastSearchInfo)
+        return action
+
+    def _rootParallel(self, root, deadline):
+        """
+        root 并行：工作进程各自从根节点建树，主进程同时在（可能复用的）树上继续搜索，
+        最后把各棵树根节点的动作统计相加
+        """
+        pool = self._getPool()
+        remaining = max(0.0, deadline - time.time())
+        maxIterations = self.rollouts // self.workers if self.rollouts else 0
+        jobs = [(root.state, self.params, remaining, maxIterations, random.getrandbits(32))
+                for i in range(self.workers - 1)]
+        pending = pool.map_async(_rootWorker, jobs)
+        self.searcher.search(root, deadline, maxIterations)
+        stats = dict([(action, (edge.visits, edge.total)) for action, edge in root.edges.items()])
+        for workerStats in pending.get():
+            for action, (visits, total) in workerStats.items():
+                oldVisits, oldTotal = stats.get(action, (0, 0.0))
+                stats[action] = (oldVisits + visits, oldTotal + total)
+        return stats
+
+    def _leafParallel(self, root, deadline):
+        """leaf 并行：每个新叶子的 rollout 分发给 workers 个进程，回报之和一次性回传"""
+        pool = self._getPool()
+        searcher = self.searcher
+        baseline = _evaluate(root.state)
+        iterations = 0
+        while not root.terminal:
+            path, leaf = searcher.select(root)
+            jobs = [(leaf.state, self.params, random.getrandbits(32)) for i in range(self.workers)]
+            values = pool.map(_rolloutWorker, jobs)
+            total = sum([(value - baseline) / REWARD_SCALE for value in values])
+            searcher.backup(path, leaf, total, len(values))
+            iterations += len(values)
+            if self.rollouts and iterations >= self.rollouts:
+                break
+            if time.time() >= deadline:
+                break
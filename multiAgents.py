@@ -0,0 +1,294 @@
+# multiAgents.py
+# 基于搜索的 Pac-Man agent：迭代加深的 expectimax / minimax（alpha-beta），
+# 以 GameState.getStateKey()（Zobrist 哈希）为键的置换表避免重复计算经由不同路径到达的相同状态。
+#
+# 搜索模型与 Game.run 的回合制一致：Pac-Man 先走，然后存活的 Ghost 按下标依次走，
+# 一轮结束后更新复活倒计时。Ghost 的行为由 DirectionalGhost 的动作分布建模。
+# 搜索在一个私有的工作状态上用 GameState.apply/undo 原地展开，不为每个节点复制状态。
+
+from game import Agent
+from game import Directions
+from game import ZobristTable
+from pacman import GameState
+from ghostAgents import DirectionalGhost
+from util import manhattanDistance
+import random
+import time
+
+# 置换表条目类型（alpha-beta 需要区分上下界）
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    """单步搜索超出时间预算"""
+    pass
+
+
+class ExpectimaxAgent(Agent):
+    """
+    迭代加深的 expectimax Pac-Man agent
+
+    Pac-Man 节点取最大值，Ghost 节点按 DirectionalGhost 的动作分布取期望。
+    深度以回合计（Pac-Man 走一步加所有存活 Ghost 各走一步为一层）。
+    在每步的时间预算内从深度 1 开始逐层加深，超时后使用最后一个完整完成的深度的结果。
+    """
+
+    def __init__(self, index=0, timeLimit=0.5, maxDepth=6, tableSize=200000, verbose=False):
+        """
+        Args:
+            timeLimit: 每步搜索的时间预算（秒）
+            maxDepth: 最大搜索深度（回合数）
+            tableSize: 置换表最多保存的条目数，超过后清空
+            verbose: 是否在每步后打印搜索统计
+        """
+        self.index = index
+        # 命令行通过 -a 传入的参数是字符串
+        self.timeLimit = float(timeLimit)
+        self.maxDepth = int(maxDepth)
+        self.tableSize = int(tableSize)
+        self.verbose = verbose not in (False, 'False', 'false', '0', 0)
+        self.zobrist = None
+        self.table = {}
+        self.ghostModels = {}
+        self.lastSearchInfo = {}
+
+    def registerInitialState(self, state):
+        self._prepare(state)
+
+    def _prepare(self, state):
+        numAgents = state.getNumAgents()
+        zobrist = ZobristTable.forLayout(state.data.layout)
+        if zobrist is not self.zobrist:
+            # 换了地图尺寸，旧的置换表没有意义
+            self.zobrist = zobrist
+            self.table = {}
+        self.turnKeys = [zobrist.turnKey(index) for index in range(numAgents)]
+        for index in range(1, numAgents):
+            if index not in self.ghostModels:
+                self.ghostModels[index] = DirectionalGhost(index)
+
+    def getAction(self, state):
+        legal = state.getLegalActions(self.index)
+        if not legal:
+            return Directions.STOP
+        self._prepare(state)
+        if len(self.table) > self.tableSize:
+            self.table = {}
+
+        self.nodes = 0
+        self.tableHits = 0
+        self.deadline = time.time() + self.timeLimit
+        if self.moveDeadline is not None:
+            # 限时对局：在 Game 规定的时间点之前停止搜索
+            self.deadline = min(self.deadline, self.moveDeadline - 0.01)
+        foodLeft = state.getNumFood()
+        working = GameState(state)
+
+        bestAction = random.choice(legal)
+        bestValue = None
+        depthReached = 0
+        for depth in range(1, self.maxDepth + 1):
+            try:
+                value, action = self._rootSearch(working, depth, foodLeft, bestAction)
+            except SearchTimeout:
+                # 超时时工作状态停留在搜索中途，直接丢弃
+                break
+            bestValue, bestAction, depthReached = value, action, depth
+            if state.isWin() or state.isLose():
+                break
+
+        self.lastSearchInfo = {'depth': depthReached, 'nodes': self.nodes, 'value': bestValue,
+                               'tableHits': self.tableHits, 'tableSize': len(self.table)}
+        if self.verbose:
+            print("depth=%(depth)d nodes=%(nodes)d hits=%(tableHits)d value=%(value)s" % self.lastSearchInfo)
+        return bestAction
+
+    def _rootSearch(self, state, depth, foodLeft, principal):
+        """根节点：先搜索上一轮的最佳动作（主变例），其余动作按置换表排序"""
+        actions = self._orderActions(state, state.getLegalActions(0), principal)
+        bestValue, bestAction = None, actions[0]
+        alpha = float('-inf')
+        for action in actions:
+            value = self._successorValue(state, 0, action, depth, foodLeft, alpha, float('inf'))
+            if bestValue is None or value > bestValue:
+                bestValue, bestAction = value, action
+            alpha = max(alpha, bestValue)
+        return bestValue, bestAction
+
+    def _orderActions(self, state, actions, principal=None):
+        """走法排序：主变例 / 置换表中记录的最佳动作优先"""
+        best = principal
+        if best is None:
+            entry = self.table.get(state.getStateKey() ^ self.turnKeys[0])
+            if entry is not None:
+                best = entry[3]
+        if best in actions:
+            actions = [best] + [a for a in actions if a != best]
+        return actions
+
+    def _nextAgent(self, state, agentIndex):
+        """按 Game.run 的顺序找到下一个移动的 agent（跳过等待复活的鬼），0 表示新的一轮"""
+        agentStates = state.data.agentStates
+        for index in range(agentIndex + 1, len(agentStates)):
+            if agentStates[index].respawnTimer == 0:
+                return index
+        return 0
+
+    def _value(self, state, movedIndex, depth, foodLeft, alpha, beta):
+        """
+        计算 movedIndex 刚刚走完之后的状态价值
+        depth 为剩余的回合数；返回值为绝对分数（置换表中保存相对当前分数的增量）
+        """
+        self.nodes += 1
+        if self.nodes & 127 == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+        if state.isWin() or state.isLose() or state.data._roundComplete:
+            return self.evaluate(state, foodLeft)
+
+        agentIndex = self._nextAgent(state, movedIndex)
+        if agentIndex == 0:
+            depth -= 1
+            if depth <= 0:
+                return self.evaluate(state, foodLeft)
+            # 新的一轮开始：更新复活倒计时
+            state.applyRespawnTick()
+            value = self._search(state, 0, depth, foodLeft, alpha, beta)
+            state.undo()
+            return value
+        return self._search(state, agentIndex, depth, foodLeft, alpha, beta)
+
+    def _search(self, state, agentIndex, depth, foodLeft, alpha, beta):
+        """轮到 agentIndex 移动的节点：查置换表，未命中时展开并写回"""
+        score = state.data.score
+        key = state.getStateKey() ^ self.turnKeys[agentIndex]
+        entry = self.table.get(key)
+        bestAction = None
+        if entry is not None:
+            entryDepth, entryValue, entryFlag, bestAction = entry
+            if entryDepth >= depth:
+                value = entryValue + score
+                if entryFlag == EXACT or (entryFlag == LOWER and value >= beta) \
+                        or (entryFlag == UPPER and value <= alpha):
+                    self.tableHits += 1
+                    return value
+
+        originalAlpha, originalBeta = alpha, beta
+        if agentIndex == 0:
+            value, bestAction = self._maxValue(state, depth, foodLeft, alpha, beta, bestAction)
+        else:
+            value, bestAction = self._ghostValue(state, agentIndex, depth, foodLeft, alpha, beta)
+
+        if value <= originalAlpha:
+            flag = UPPER
+        elif value >= originalBeta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[key] = (depth, value - score, flag, bestAction)
+        return value
+
+    def _successorValue(self, state, agentIndex, action, depth, foodLeft, alpha, beta):
+        state.apply(agentIndex, action)
+        if state.data._foodEaten is not None:
+            foodLeft -= 1
+        value = self._value(state, agentIndex, depth, foodLeft, alpha, beta)
+        state.undo()
+        return value
+
+    def _maxValue(self, state, depth, foodLeft, alpha, beta, hint):
+        actions = state.getLegalActions(0)
+        if hint in actions:
+            actions = [hint] + [a for a in actions if a != hint]
+        bestValue, bestAction = float('-inf'), None
+        for action in actions:
+            value = self._successorValue(state, 0, action, depth, foodLeft, alpha, beta)
+            if value > bestValue:
+                bestValue, bestAction = value, action
+            alpha = max(alpha, bestValue)
+            if self.prunes() and bestValue >= beta:
+                break
+        return bestValue, bestAction
+
+    def _ghostValue(self, state, agentIndex, depth, foodLeft, alpha, beta):
+        """Ghost 节点：按 DirectionalGhost 的分布取期望（期望节点不做剪枝）"""
+        dist = self.ghostModels[agentIndex].getDistribution(state)
+        total = 0.0
+        for action, prob in dist.items():
+            if prob <= 0:
+                continue
+            total += prob * self._successorValue(state, agentIndex, action, depth, foodLeft,
+                                                 float('-inf'), float('inf'))
+        return total, None
+
+    def prunes(self):
+        """期望节点的存在使得 Pac-Man 节点也不能做 alpha-beta 剪枝"""
+        return False
+
+    def evaluate(self, state, foodLeft):
+        """
+        叶子节点估值：当前分数 + 生命价值 - 到最近糖豆的距离 - 剩余糖豆数，
+        再根据与 Ghost 的距离加上危险惩罚或追击受惊 Ghost 的奖励
+        """
+        data = state.data
+        value = data.score + 200.0 * data.lives
+        if state.isLose():
+            return value
+        if data._roundComplete or foodLeft <= 0:
+            return value + 100.0
+        pacmanPos = state.getPacmanPosition()
+        value -= 1.5 * foodLeft + 0.5 * self._nearestFoodDistance(state, pacmanPos)
+        for ghostState in data.agentStates[1:]:
+            if ghostState.respawnTimer > 0:
+                continue
+            distance = manhattanDistance(pacmanPos, ghostState.configuration.pos)
+            if ghostState.scaredTimer > distance:
+                value += 15.0 / (distance + 1)
+            elif distance <= 2:
+                value -= 40.0 / (distance + 1)
+        return value
+
+    def _nearestFoodDistance(self, state, start, limit=40):
+        """从 start 出发的广度优先搜索，返回到最近糖豆的迷宫距离（最多搜索 limit 步）"""
+        food = state.data.food
+        walls = state.data.layout.walls
+        x, y = int(start[0] + 0.5), int(start[1] + 0.5)
+        if food[x][y]:
+            return 0
+        frontier = [(x, y)]
+        visited = set(frontier)
+        for distance in range(1, limit + 1):
+            nextFrontier = []
+            for x, y in frontier:
+                for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if (nx, ny) in visited or walls[nx][ny]:
+                        continue
+                    if food[nx][ny]:
+                        return distance
+                    visited.add((nx, ny))
+                    nextFrontier.append((nx, ny))
+            if not nextFrontier:
+                break
+            frontier = nextFrontier
+        return limit
+
+
+class MinimaxAgent(ExpectimaxAgent):
+    """
+    迭代加深的 minimax agent：Ghost 被视为对抗者（取最小值），可以使用 alpha-beta 剪枝，
+    走法排序（主变例和置换表最佳动作优先）使剪枝更有效。
+    """
+
+    def prunes(self):
+        return True
+
+    def _ghostValue(self, state, agentIndex, depth, foodLeft, alpha, beta):
+        actions = state.getLegalActions(agentIndex)
+        bestValue, bestAction = float('inf'), None
+        for action in actions:
+            value = self._successorValue(state, agentIndex, action, depth, foodLeft, alpha, beta)
+            if value < bestValue:
+                bestValue, bestAction = value, action
+            beta = min(beta, bestValue)
+            if bestValue <= alpha:
+                break
+        return bestValue, bestAction
@@ -0,0 +1,173 @@
+"""
+紧凑的观测编码：把 GameState 序列化为很小的 bytes，供跨进程 / 跨机器的 agent 使用
+
+地图是静态的，只在会话开始时通过 encodeLayout 发送一次，之后每步的观测只包含
+动态部分（分数、生命、各 agent 的位置和计时器、能量豆、按位压缩的食物网格）。
+接收方用 decodeObservation(blob, layout) 还原出一个完整可用的 GameState，
+可以直接调用 getLegalActions / generateSuccessor 等方法。
+
+观测格式（小端）:
+    头部:   版本 B, agent 数量 H, 分数 d, 生命 i, 连续吃鬼数 i, 标志位 B（win/lose/本关完成）
+    agent:  位置 x*2, y*2 (h, h), 方向 B, 起点 x*2, y*2 (h, h), 起点方向 B,
+            isPacman B, scaredTimer h, respawnTimer h, numCarrying h, numReturned h, 本步被吃 B
+    能量豆: 数量 H，每个 (x, y) 为 (H, H)
+    食物:   按列展开的网格，每格 1 位
+坐标按 2 倍存储：受惊的鬼以半格速度移动，位置可能是 0.5 的倍数。
+"""
+import struct
+from itertools import chain
+
+from game import AgentState
+from game import Configuration
+from game import Directions
+from game import Grid
+from game import ZobristTable
+import layout as layoutModule
+
+OBSERVATION_VERSION = 1
+
+_HEADER = struct.Struct('<BHdiiB')
+_AGENT = struct.Struct('<hhBhhBBhhhhB')
+_COUNT = struct.Struct('<H')
+_POINT = struct.Struct('<HH')
+
+_WIN, _LOSE, _ROUND_COMPLETE = 1, 2, 4
+
+
+def layoutKey(layout):
+    """地图内容的哈希，用于在接收方缓存已解码的 Layout"""
+    return layout.key
+
+
+def internLayout(layout):
+    """返回与 layout 内容相同的共享实例（Layout 本身已按内容驻留，见 layout.Layout）"""
+    return layoutModule.Layout(layout.layoutText)
+
+
+def encodeLayout(layout):
+    return '\n'.join(layout.layoutText).encode('utf-8')
+
+
+def decodeLayout(blob):
+    return layoutModule.Layout(blob.decode('utf-8').split('\n'))
+
+
+def _doubled(value):
+    doubled = value * 2
+    if doubled != int(doubled):
+        raise ValueError("Position %s is not on the half-grid and cannot be encoded" % value)
+    return int(doubled)
+
+
+def encodeObservation(state):
+    """
+    把 GameState 编码为 bytes（不包含地图）
+    Args:
+        state: 要编码的 GameState
+    Returns:
+        bytes
+    """
+    data = state.data
+    agentStates = data.agentStates
+    flags = (_WIN if data._win else 0) | (_LOSE if data._lose else 0) \
+        | (_ROUND_COMPLETE if data._roundComplete else 0)
+    parts = [_HEADER.pack(OBSERVATION_VERSION, len(agentStates), data.score, data.lives,
+                          data.ghostsEatenInRow, flags)]
+    eaten = data._eaten
+    for index, agentState in enumerate(agentStates):
+        conf, start = agentState.configuration, agentState.start
+        parts.append(_AGENT.pack(
+            _doubled(conf.pos[0]), _doubled(conf.pos[1]), Directions.INDEX[conf.direction],
+            _doubled(start.pos[0]), _doubled(start.pos[1]), Directions.INDEX[start.direction],
+            agentState.isPacman, agentState.scaredTimer, agentState.respawnTimer,
+            agentState.numCarrying, agentState.numReturned, bool(eaten[index])))
+    parts.append(_COUNT.pack(len(data.capsules)))
+    for x, y in data.capsules:
+        parts.append(_POINT.pack(x, y))
+    parts.append(packGrid(data.food))
+    return b''.join(parts)
+
+
+def decodeObservation(blob, layout):
+    """
+    从 encodeObservation 的结果还原 GameState
+    Args:
+        blob: encodeObservation 返回的 bytes
+        layout: 对局使用的 Layout（通常由 decodeLayout 得到并缓存）
+    Returns:
+        GameState
+    """
+    from pacman import GameState
+    version, numAgents, score, lives, ghostsEatenInRow, flags = _HEADER.unpack_from(blob, 0)
+    if version != OBSERVATION_VERSION:
+        raise ValueError("Unsupported observation version: %d" % version)
+    offset = _HEADER.size
+    agentStates = []
+    eaten = []
+    for i in range(numAgents):
+        (x, y, direction, startX, startY, startDirection, isPacman, scaredTimer, respawnTimer,
+         numCarrying, numReturned, wasEaten) = _AGENT.unpack_from(blob, offset)
+        offset += _AGENT.size
+        agentState = AgentState(Configuration((startX / 2.0, startY / 2.0), Directions.ORDER[startDirection]),
+                                bool(isPacman))
+        agentState.configuration = Configuration((x / 2.0, y / 2.0), Directions.ORDER[direction])
+        agentState.scaredTimer = scaredTimer
+        agentState.respawnTimer = respawnTimer
+        agentState.numCarrying = numCarrying
+        agentState.numReturned = numReturned
+        agentStates.append(agentState)
+        eaten.append(bool(wasEaten))
+    numCapsules, = _COUNT.unpack_from(blob, offset)
+    offset += _COUNT.size
+    capsules = []
+    for i in range(numCapsules):
+        capsules.append(_POINT.unpack_from(blob, offset))
+        offset += _POINT.size
+
+    state = GameState()
+    data = state.data
+    data.layout = layout
+    height = layout.height
+    cells = unpackCells(blob[offset:], layout.width * height)
+    data.food = layout.food._withData([cells[x * height:(x + 1) * height] for x in range(layout.width)])
+    data._ownsFood = True
+    data.capsules = capsules
+    data.agentStates = agentStates
+    data._eaten = eaten
+    data.score = score
+    data.lives = lives
+    data.ghostsEatenInRow = ghostsEatenInRow
+    data._win = bool(flags & _WIN)
+    data._lose = bool(flags & _LOSE)
+    data._roundComplete = bool(flags & _ROUND_COMPLETE)
+    data._foodHash = ZobristTable.forLayout(layout).cellsHash(cells, capsules)
+    return state
+
+
+def packGrid(grid):
+    """布尔网格按列展开后每格压缩为 1 位（大端，不足整字节时在最前面补 0）"""
+    cells = grid.width * grid.height
+    if not cells:
+        return b''
+    pad = -cells % 8
+    flat = [False] * pad + list(chain.from_iterable(grid.data))
+    return bytes(map(_BITS_TO_BYTE.__getitem__, zip(*[iter(flat)] * 8)))
+
+
+def unpackCells(blob, cells):
+    """packGrid 的逆过程：返回按列展开的 cells 个布尔值"""
+    size = (cells + 7) // 8
+    flat = list(chain.from_iterable(map(_BYTE_TO_BITS.__getitem__, blob[:size])))
+    return flat[size * 8 - cells:]
+
+
+def unpackGrid(blob, width, height):
+    flat = unpackCells(blob, width * height)
+    grid = Grid(width, 0)
+    grid.height = height
+    grid.data = [flat[x * height:(x + 1) * height] for x in range(width)]
+    return grid
+
+
+_BYTE_TO_BITS = [tuple(bool(byte >> (7 - i) & 1) for i in range(8)) for byte in range(256)]
+_BITS_TO_BYTE = dict((bits, byte) for byte, bits in enumerate(_BYTE_TO_BITS))
@@ -44,6 +44,7 @@ from game import Game
 from game import Directions
 from game import Actions
 from game import Configuration
+from game import ZobristTable
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -72,7 +73,8 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
+    # 旧接口，保留以兼容：generateSuccessor 不再向这个全局集合添加状态，
+    # 探索统计改为按对局、可选开启，见 ExplorationTracker / setExplorationTracker
     explored = set()
     def getAndResetExplored():
         tmp = GameState.explored.copy()
@@ -80,6 +82,15 @@ class GameState:
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def setExplorationTracker( self, tracker ):
+        """
+        为该状态以及之后由它生成的所有状态开启探索统计（tracker 为 None 时关闭）
+        """
+        self.data._explorationTracker = tracker
+
+    def getExplorationTracker( self ):
+        return self.data._explorationTracker
+
     def getLegalActions( self, agentIndex=0 ):
         """
         Returns the legal actions for the agent specified.
@@ -123,10 +134,110 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        tracker = state.data._explorationTracker
+        if tracker is not None:
+            tracker.record( state )
         return state
 
+    def apply( self, agentIndex, action ):
+        """
+        原地执行一步动作，效果与 generateSuccessor 相同，但不复制状态。
+        每一步只记录恢复所需的最少信息（移动的 agent 的位置和计时器、吃掉的糖豆/能量豆、
+        分数、生命数和标志位）；只有吃能量豆或发生碰撞时才保存所有 agent 的状态。
+        用 undo() 撤销最近一次 apply。
+
+        供深度优先搜索使用：在一个私有的工作状态（例如 GameState(state)）上反复
+        apply/undo，可以在不分配新状态的情况下展开大量节点。
+        """
+        data = self.data
+        if data._win or data._lose: raise Exception('Can\'t apply an action to a terminal state.')
+        agentStates = data.agentStates
+        agentState = agentStates[agentIndex]
+        configuration, scaredTimer = agentState.configuration, agentState.scaredTimer
+        score, scoreChange, eaten = data.score, data.scoreChange, data._eaten
+        flags = (data.lives, data.ghostsEatenInRow, data._roundComplete,
+                 data._foodEaten, data._capsuleEaten, data._agentMoved, data._foodHash)
+        snapshot = capsule = None
+
+        if agentIndex == 0:
+            position = PacmanRules.move( self, action )
+            data.scoreChange = 0
+            data._foodEaten = data._capsuleEaten = None
+            if True in eaten:
+                data._eaten = [False] * len(agentStates)
+            capsuleEaten = position is not None and position in data.capsules
+            if capsuleEaten or GhostRules.willCollide( self, 0 ):
+                snapshot = self._agentSnapshot()
+            if capsuleEaten:
+                capsule = (data.capsules.index(position), position)
+            if position is not None:
+                PacmanRules.consume( position, self )
+        else:
+            GhostRules.applyAction( self, action, agentIndex )
+            data.scoreChange = 0
+            data._foodEaten = data._capsuleEaten = None
+            GhostRules.decrementTimer( agentState )
+            if GhostRules.willCollide( self, agentIndex ):
+                snapshot = self._agentSnapshot()
+
+        if snapshot is not None:
+            # collide 会原地标记 _eaten，先复制一份，避免影响共享该列表的其他状态
+            data._eaten = list(data._eaten)
+        GhostRules.checkDeath( self, agentIndex )
+        data._agentMoved = agentIndex
+        data.score += data.scoreChange
+
+        if self._undoStack is None:
+            self._undoStack = []
+        self._undoStack.append((agentIndex, configuration, scaredTimer, snapshot, data._foodEaten,
+                                capsule, score, scoreChange, eaten, flags))
+
+    def applyRespawnTick( self ):
+        """可撤销的 GameStateData.updateRespawnTimers（每轮开始、Pac-Man 移动之前调用）"""
+        snapshot = None
+        for agentState in self.data.agentStates:
+            if agentState.respawnTimer > 0:
+                snapshot = self._agentSnapshot()
+                self.data.updateRespawnTimers()
+                break
+        if self._undoStack is None:
+            self._undoStack = []
+        self._undoStack.append((None, snapshot))
+
+    def undo( self ):
+        """撤销最近一次 apply / applyRespawnTick"""
+        record = self._undoStack.pop()
+        data = self.data
+        if record[0] is None:
+            if record[1] is not None:
+                self._restoreAgents( record[1] )
+            return
+        agentIndex, configuration, scaredTimer, snapshot, food, capsule, score, scoreChange, eaten, flags = record
+        if snapshot is not None:
+            self._restoreAgents( snapshot )
+        agentState = data.agentStates[agentIndex]
+        agentState.configuration = configuration
+        agentState.scaredTimer = scaredTimer
+        if food is not None:
+            data.ownFood()
+            x, y = food
+            data.food[x][y] = True
+        if capsule is not None:
+            data.capsules.insert( capsule[0], capsule[1] )
+        data.score, data.scoreChange, data._eaten = score, scoreChange, eaten
+        (data.lives, data.ghostsEatenInRow, data._roundComplete,
+         data._foodEaten, data._capsuleEaten, data._agentMoved, data._foodHash) = flags
+        data._win = data._lose = False
+
+    def _agentSnapshot( self ):
+        return tuple([(s.configuration, s.scaredTimer, s.respawnTimer) for s in self.data.agentStates])
+
+    def _restoreAgents( self, snapshot ):
+        for agentState, (configuration, scaredTimer, respawnTimer) in zip(self.data.agentStates, snapshot):
+            agentState.configuration = configuration
+            agentState.scaredTimer = scaredTimer
+            agentState.respawnTimer = respawnTimer
+
     def getLegalPacmanActions( self ):
         return self.getLegalActions( 0 )
 
@@ -228,12 +339,20 @@ class GameState:
             self.data = GameStateData(prevState.data)
         else:
             self.data = GameStateData()
+        self._undoStack = None  # apply/undo 的撤销记录，只属于当前状态对象
 
     def deepCopy( self ):
         state = GameState( self )
         state.data = self.data.deepCopy()
         return state
 
+    def getStateKey( self ):
+        """
+        返回状态的 64 位 Zobrist 键（见 GameStateData.stateKey），代价只与 agent 数量有关。
+        键相同的状态之后的对局进程相同（分数除外），可用作搜索和缓存的字典键。
+        """
+        return self.data.stateKey()
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
@@ -256,6 +375,67 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+    def to_snapshot( self ):
+        """
+        把状态的动态部分编码为紧凑的 bytes（不含地图，格式见 observations.encodeObservation），
+        用于检查点和导出；地图大小只影响其中按位压缩的食物网格
+        """
+        import observations
+        return observations.encodeObservation( self )
+
+    def from_snapshot( blob, layout ):
+        """
+        从 to_snapshot 的结果还原状态。layout 由调用方提供，从同一张地图还原的所有状态共用它
+        （可用 observations.internLayout 取得进程内共享的实例）
+        """
+        import observations
+        return observations.decodeObservation( blob, layout )
+    from_snapshot = staticmethod( from_snapshot )
+
+class ExplorationTracker:
+    """
+    按对局统计状态探索，取代旧的全局 GameState.explored 集合
+
+    默认只计数生成的后继状态；capacity > 0 时再用蓄水池抽样保留最多 capacity 个状态，
+    内存占用有上界。状态哈希只在调用 getExplored() 时才计算，不影响生成后继的开销。
+    通过 GameState.setExplorationTracker 或 ClassicGameRules.newGame 挂到对局上，
+    由状态复制时传递给所有后继（包括 agent 收到的观察状态）。
+    """
+    def __init__( self, capacity=0, seed=None ):
+        """
+        Args:
+            capacity: 最多保留的状态样本数，0 表示只计数
+            seed: 抽样使用的随机种子
+        """
+        self.capacity = int(capacity)
+        self.generated = 0
+        self.samples = []
+        self._random = random.Random(seed)
+
+    def record( self, state ):
+        self.generated += 1
+        if not self.capacity:
+            return
+        if len(self.samples) < self.capacity:
+            self.samples.append(state)
+        else:
+            index = self._random.randrange(self.generated)
+            if index < self.capacity:
+                self.samples[index] = state
+
+    def getExplored( self ):
+        """返回抽样保留的状态集合"""
+        return set(self.samples)
+
+    def reset( self ):
+        self.generated = 0
+        self.samples = []
+
+    def __str__( self ):
+        if self.capacity:
+            return "Generated %d states (%d sampled)" % (self.generated, len(self.samples))
+        return "Generated %d states" % self.generated
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -271,15 +451,35 @@ class ClassicGameRules:
     These game rules manage the control flow of a game, deciding when
     and how the game starts and ends.
     """
-    def __init__(self, timeout=30):
+    def __init__(self, timeout=30, moveTimeout=None, moveWarningTime=None, maxStartupTime=None, maxTimeWarnings=None):
+        """
+        Args:
+            timeout: 每个 agent 一局的总计算时间（秒），0 或 None 表示不限制
+            moveTimeout: 每步的硬性时限（秒），超时的一步由 Game.defaultAction 代替
+            moveWarningTime: 每步的软性时限（秒），超过时记一次警告
+            maxStartupTime: registerInitialState 的时限（秒），默认与 timeout 相同
+            maxTimeWarnings: 允许的警告次数，超过后该 agent 本局剩余的步数都由默认动作代替
+        只有设置了 moveTimeout / moveWarningTime / maxStartupTime 之一时才检查时间（见 enforcesTimeouts），
+        因此默认的对局（例如键盘操作）不受影响。
+        """
         self.timeout = timeout
+        self.moveTimeout = moveTimeout
+        self.moveWarningTime = moveWarningTime
+        self.maxStartupTime = maxStartupTime
+        self.maxTimeWarnings = maxTimeWarnings
+
+    def enforcesTimeouts(self):
+        return self.moveTimeout is not None or self.moveWarningTime is not None or self.maxStartupTime is not None
 
-    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False):
+    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False, explorationTracker=None):
         agents = [pacmanAgent] + ghostAgents  # 使用所有提供的鬼，不受地图中鬼数量限制
         initState = GameState()
         initState.initialize( layout, len(ghostAgents) )  # 使用实际提供的鬼数量
+        initState.setExplorationTracker( explorationTracker )
         game = Game(agents, display, self, catchExceptions=catchExceptions)
         game.state = initState
+        game.enforceTimeouts = self.enforcesTimeouts()
+        game.explorationTracker = explorationTracker
         self.initialState = initState.deepCopy()
         self.quiet = quiet
         return game
@@ -328,6 +528,7 @@ class ClassicGameRules:
         initialState = self.initialState
         state.data.food = initialState.data.food.deepCopy()
         state.data.capsules = initialState.data.capsules[:]
+        state.data._foodHash = initialState.data._foodHash
         
         # 重置所有agent位置到初始位置
         # 重置Pac-Man位置
@@ -367,20 +568,22 @@ class ClassicGameRules:
         else:
             print("A ghost crashed")
 
+    # 以下时间预算（秒）在 Game.enforceTimeouts 为 True 时生效，None 表示不限制
+
     def getMaxTotalTime(self, agentIndex):
         return self.timeout
 
     def getMaxStartupTime(self, agentIndex):
-        return self.timeout
+        return self.maxStartupTime if self.maxStartupTime is not None else self.timeout
 
     def getMoveWarningTime(self, agentIndex):
-        return self.timeout
+        return self.moveWarningTime
 
     def getMoveTimeout(self, agentIndex):
-        return self.timeout
+        return self.moveTimeout
 
     def getMaxTimeWarnings(self, agentIndex):
-        return 0
+        return self.maxTimeWarnings
 
 class PacmanRules:
     """
@@ -394,20 +597,40 @@ class PacmanRules:
         Returns a list of possible actions.
         For Pac-Man, portals (Q) are not considered walls, allowing movement through them.
         """
-        # 创建 walls 的副本，将传送门位置标记为非墙（仅对 Pac-Man）
-        walls = state.data.layout.walls.copy()
-        portals = getattr(state.data.layout, 'portals', [])
-        for portal_pos in portals:
-            x, y = portal_pos
-            walls[x][y] = False  # 传送门对 Pac-Man 来说不是墙
-        
-        return Actions.getPossibleActions( state.getPacmanState().configuration, walls )
+        walls = PacmanRules.getWalls( state.data.layout )
+        return Actions.getPossibleActions( state.data.agentStates[0].configuration, walls )
     getLegalActions = staticmethod( getLegalActions )
 
+    def getWalls( layout ):
+        """
+        Pac-Man 眼中的墙：传送门位置不算墙
+        地图在对局中不会改变，结果缓存在 layout 上，避免每次查询合法动作都复制整张墙网格
+        """
+        walls = getattr(layout, '_pacmanWalls', None)
+        if walls is None:
+            walls = layout.walls.copy()
+            for x, y in getattr(layout, 'portals', []):
+                walls[x][y] = False  # 传送门对 Pac-Man 来说不是墙
+            layout._pacmanWalls = walls
+        return walls
+    getWalls = staticmethod( getWalls )
+
     def applyAction( state, action ):
         """
         Edits the state to reflect the results of the action.
         """
+        position = PacmanRules.move( state, action )
+        if position is not None:
+            # Remove food
+            PacmanRules.consume( position, state )
+    applyAction = staticmethod( applyAction )
+
+    def move( state, action ):
+        """
+        移动 Pac-Man（包括传送门传送），不处理吃豆
+        Returns:
+            Pac-Man 到达格点时返回该格点（随后由 consume 吃豆），否则返回 None
+        """
         legal = PacmanRules.getLegalActions( state )
         if action not in legal:
             raise Exception("Illegal action " + str(action))
@@ -474,18 +697,18 @@ class PacmanRules:
                 # 更新位置用于后续的吃豆逻辑
                 next = target_pos
                 nearest = target_pos
-            
-            # Remove food
-            PacmanRules.consume( nearest, state )
-    applyAction = staticmethod( applyAction )
+            return nearest
+        return None
+    move = staticmethod( move )
 
     def consume( position, state ):
         x,y = position
         # Eat food (糖豆：1分)
         if state.data.food[x][y]:
             state.data.scoreChange += 1
-            state.data.food = state.data.food.copy()
+            state.data.ownFood()
             state.data.food[x][y] = False
+            state.data._foodHash ^= ZobristTable.forLayout( state.data.layout ).foodKey( position )
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -496,6 +719,7 @@ class PacmanRules:
         # Eat capsule (能量丸)
         if( position in state.getCapsules() ):
             state.data.capsules.remove( position )
+            state.data._foodHash ^= ZobristTable.forLayout( state.data.layout ).capsuleKey( position )
             state.data._capsuleEaten = position
             # 能量丸分数：5分
             state.data.scoreChange += 5
@@ -556,7 +780,9 @@ class GhostRules:
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            # 新建Configuration而不是原地修改pos：Configuration在前后状态之间是共享的
+            conf = ghostState.configuration
+            ghostState.configuration = Configuration( nearestPoint( conf.pos ), conf.direction )
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -581,6 +807,20 @@ class GhostRules:
                 GhostRules.collide( state, ghostState, agentIndex )
     checkDeath = staticmethod( checkDeath )
 
+    def willCollide( state, agentIndex ):
+        """checkDeath( state, agentIndex ) 是否会发生碰撞（不修改状态）"""
+        agentStates = state.data.agentStates
+        pacmanPosition = agentStates[0].configuration.pos
+        if agentIndex == 0:
+            ghostStates = agentStates[1:]
+        else:
+            ghostStates = [agentStates[agentIndex]]
+        for ghostState in ghostStates:
+            if ghostState.respawnTimer == 0 and GhostRules.canKill( pacmanPosition, ghostState.configuration.pos ):
+                return True
+        return False
+    willCollide = staticmethod( willCollide )
+
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
             # 吃鬼分数递增：10 × 2^n（n为连续吃掉的第n个鬼）
@@ -693,6 +933,10 @@ def readCommand( argv ):
                       help='Writes game histories to a file (named by the time they were played)', default=False)
     parser.add_option('--replay', dest='gameToReplay',
                       help='A recorded game file (pickle) to replay', default=None)
+    parser.add_option('--replayStart', dest='replayStart', type='int',
+                      help=default('Turn to start the replay from (earlier turns are fast-forwarded)'), default=0)
+    parser.add_option('--replayStride', dest='replayStride', type='int',
+                      help=default('Only render every Nth frame of the replay'), default=1)
     parser.add_option('-a','--agentArgs',dest='agentArgs',
                       help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
     parser.add_option('-x', '--numTraining', dest='numTraining', type='int',
@@ -701,29 +945,81 @@ def readCommand( argv ):
                       help=default('Time to delay between frames; <0 means keyboard'), default=0.1)
     parser.add_option('-c', '--catchExceptions', action='store_true', dest='catchExceptions',
                       help='Turns on exception handling and timeouts during games', default=False)
-    parser.add_option('--timeout', dest='timeout', type='int',
+    parser.add_option('--timeout', dest='timeout', type='float',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--moveTimeout', dest='moveTimeout', type='float',
+                      help='Hard per-move time limit in seconds; a late move is replaced by a default action', default=None)
+    parser.add_option('--moveWarning', dest='moveWarningTime', type='float',
+                      help='Soft per-move time limit in seconds; exceeding it counts a warning', default=None)
+    parser.add_option('--startupTime', dest='maxStartupTime', type='float',
+                      help='Time limit for registerInitialState (defaults to --timeout)', default=None)
+    parser.add_option('--maxWarnings', dest='maxTimeWarnings', type='int',
+                      help='Warnings allowed before an agent only plays default moves', default=None)
+    parser.add_option('--video', dest='video',
+                      help='Render the games offscreen into an animation file (.gif, or .mp4/.webm with ffmpeg) instead of a window', default=None)
+    parser.add_option('--videoStride', dest='videoStride', type='int',
+                      help=default('Write one video frame every N turns'), default=1)
+    parser.add_option('--videoFps', dest='videoFps', type='float',
+                      help=default('Frame rate of the video'), default=10)
+    parser.add_option('--dataset', dest='dataset',
+                      help='Write (observation, action, reward) records of every game as NumPy shards into this directory', default=None)
+    parser.add_option('--shardSize', dest='shardSize', type='int',
+                      help=default('Records per dataset shard'), default=1024)
+    parser.add_option('--trajectories', dest='trajectories',
+                      help='Append the full state of every turn to the memory-mapped trajectory store in this directory', default=None)
+    parser.add_option('--recordInput', dest='recordInput',
+                      help='Record the keyboard actions of the session (with timestamps) to this file', default=None)
+    parser.add_option('--replayInput', dest='inputToReplay',
+                      help='Replay a keyboard session recorded with --recordInput at full speed', default=None)
+    parser.add_option('--overlay', dest='overlay',
+                      help='Comma separated debug overlays to show: expanded, ghostDistances, values, distributions', default=None)
+    parser.add_option('--trackExploration', dest='trackExploration', type='int',
+                      help='Count generated states per game, keeping up to N sampled states (0 = count only)', default=None)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
         raise Exception('Command line input not understood: ' + str(otherjunk))
     args = dict()
 
+    # Replaying recorded input: layout, ghosts and seed come from the recording
+    if options.inputToReplay:
+        import inputRecording
+        inputHeader, inputLayout, inputActions, inputTimes = inputRecording.readInputRecording(options.inputToReplay)
+        options.pacman = 'ScriptedAgent'
+        options.agentArgs = None
+        options.ghost = inputHeader['ghost']
+        options.numGhosts = inputHeader['numGhosts']
+        options.numGames = inputHeader.get('numGames', 1)
+        print('Replaying input %s: %d moves recorded over %.1fs' % (options.inputToReplay, len(inputActions),
+                                                                     inputTimes[-1] if inputTimes else 0.0))
+
     # Fix the random seed
-    if options.fixRandomSeed: random.seed('cs188')
+    seed = 'cs188' if options.fixRandomSeed else None
+    if options.inputToReplay:
+        seed = inputHeader['seed']
+    elif options.recordInput and seed is None:
+        # 重放时要用同一个种子复现鬼的动作
+        seed = random.randrange(1 << 31)
+    if seed is not None: random.seed(seed)
 
     # Choose a layout
-    args['layout'] = layout.getLayout( options.layout )
+    if options.inputToReplay:
+        args['layout'] = inputLayout
+    else:
+        args['layout'] = layout.getLayout( options.layout )
     if args['layout'] == None: raise Exception("The layout " + options.layout + " cannot be found")
 
     # Choose a Pacman agent
-    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics)
+    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics or options.video)
     pacmanType = loadAgent(options.pacman, noKeyboard)
     agentOpts = parseAgentArgs(options.agentArgs)
     if options.numTraining > 0:
         args['numTraining'] = options.numTraining
         if 'numTraining' not in agentOpts: agentOpts['numTraining'] = options.numTraining
-    pacman = pacmanType(**agentOpts) # Instantiate Pacman with agentArgs
+    if options.inputToReplay:
+        pacman = pacmanType(actions=inputActions)
+    else:
+        pacman = pacmanType(**agentOpts) # Instantiate Pacman with agentArgs
     args['pacman'] = pacman
 
     # Don't display training games
@@ -733,10 +1029,19 @@ def readCommand( argv ):
 
     # Choose a ghost agent
     ghostType = loadAgent(options.ghost, noKeyboard)
-    args['ghosts'] = [ghostType( i+1 ) for i in range( options.numGhosts )]
+    import ghostAgents
+    if ghostType is ghostAgents.VectorizedGhost:
+        # 同一局的 Ghost 共用一个向量化决策引擎，每局开始时清空（见 VectorizedGhostTeam.reset）
+        team = ghostAgents.VectorizedGhostTeam()
+        args['ghosts'] = [ghostType( i+1, team ) for i in range( options.numGhosts )]
+    else:
+        args['ghosts'] = [ghostType( i+1 ) for i in range( options.numGhosts )]
 
     # Choose a display format
-    if options.quietGraphics:
+    if options.video:
+        import videoSink
+        args['display'] = videoSink.VideoSink(options.video, options.videoFps, options.videoStride, options.zoom)
+    elif options.quietGraphics:
         import textDisplay
         args['display'] = textDisplay.NullGraphics()
     elif options.textGraphics:
@@ -745,21 +1050,44 @@ def readCommand( argv ):
         args['display'] = textDisplay.PacmanGraphics()
     else:
         import graphicsDisplay
-        args['display'] = graphicsDisplay.PacmanGraphics(options.zoom, frameTime = options.frameTime)
+        overlays = [name for name in (options.overlay or '').split(',') if name]
+        args['display'] = graphicsDisplay.PacmanGraphics(options.zoom, frameTime = options.frameTime, overlays = overlays)
     args['numGames'] = options.numGames
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['timeBudgets'] = dict(moveTimeout=options.moveTimeout, moveWarningTime=options.moveWarningTime,
+                               maxStartupTime=options.maxStartupTime, maxTimeWarnings=options.maxTimeWarnings)
+    args['trackExploration'] = options.trackExploration
+    if options.dataset:
+        import datasetWriter
+        args['dataset'] = datasetWriter.DatasetWriter(options.dataset, options.shardSize)
+    if options.trajectories:
+        if options.dataset:
+            raise Exception('--dataset and --trajectories cannot be used together')
+        import trajectoryStore
+        if os.path.exists(os.path.join(options.trajectories, 'meta.json')):
+            args['dataset'] = trajectoryStore.TrajectoryStore.open(options.trajectories, writable=True)
+        else:
+            args['dataset'] = trajectoryStore.TrajectoryStore.create(options.trajectories, args['layout'],
+                                                                     options.numGhosts + 1)
+
+    args['seed'] = seed
+
+    if options.recordInput:
+        if not hasattr(pacman, 'recorder'):
+            raise Exception('--recordInput requires a keyboard agent')
+        import inputRecording
+        pacman.recorder = inputRecording.InputRecorder(options.recordInput, args['layout'], options.numGhosts, seed=seed,
+                                                       ghost=options.ghost, numGames=options.numGames)
+        args['inputRecorder'] = pacman.recorder
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
         print('Replaying recorded game %s.' % options.gameToReplay)
-        import pickle
-        f = open(options.gameToReplay, 'rb')
-        try: recorded = pickle.load(f)
-        finally: f.close()
-        recorded['display'] = args['display']
-        replayGame(**recorded)
+        import replay
+        engine = replay.loadRecording(options.gameToReplay)
+        engine.play(args['display'], startTurn=options.replayStart, frameStride=options.replayStride)
         sys.exit(0)
 
     return args
@@ -787,29 +1115,16 @@ def loadAgent(pacman, nographics):
                 return getattr(module, pacman)
     raise Exception('The agent ' + pacman + ' is not specified in any *Agents.py.')
 
-def replayGame( layout, actions, display ):
-    import pacmanAgents, ghostAgents
-    rules = ClassicGameRules()
-    agents = [pacmanAgents.GreedyAgent()] + [ghostAgents.RandomGhost(i+1) for i in range(layout.getNumGhosts())]
-    game = rules.newGame( layout, agents[0], agents[1:], display )
-    state = game.state
-    display.initialize(state.data)
-
-    for action in actions:
-            # Execute the action
-        state = state.generateSuccessor( *action )
-        # Change the display
-        display.update( state.data )
-        # Allow for game specific conditions (winning, losing, etc.)
-        rules.process(state, game)
-
-    display.finish()
-
-def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30 ):
+def replayGame( layout, actions, display, startTurn=0, frameStride=1 ):
+    import replay
+    engine = replay.ReplayEngine( layout, actions )
+    engine.play( display, startTurn=startTurn, frameStride=frameStride )
+
+def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30, seed=None, trackExploration=None, timeBudgets=None, dataset=None, inputRecorder=None ):
     import __main__
     __main__.__dict__['_display'] = display
 
-    rules = ClassicGameRules(timeout)
+    rules = ClassicGameRules(timeout, **(timeBudgets or {}))
     games = []
 
     for i in range( numGames ):
@@ -822,17 +1137,35 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
         else:
             gameDisplay = display
             rules.quiet = False
-        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions)
-        game.run()
-        if not beQuiet: games.append(game)
-
+        tracker = None
+        if trackExploration is not None:
+            tracker = ExplorationTracker( trackExploration )
+        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions, tracker)
         if record:
-            import time, pickle
+            # 流式录像：动作边玩边写入文件，不在内存中保留 moveHistory
+            import time, replay
             fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = open(fname, 'wb')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            pickle.dump(components, f)
-            f.close()
+            game.recorder = replay.GameRecorder(fname, layout, len(ghosts), seed=seed, gameNumber=i + 1)
+            game.keepMoveHistory = False
+        if dataset is not None:
+            # 训练局也写入数据集（datasetWriter.DatasetWriter 或 trajectoryStore.TrajectoryStore）
+            dataset.bindGame(game)
+        try:
+            game.run()
+        finally:
+            if game.recorder is not None:
+                game.recorder.close()
+        if tracker is not None and not beQuiet:
+            print('Exploration: %s' % tracker)
+        if game.enforceTimeouts and not beQuiet and game.timingReport():
+            print('Time budgets:\n%s' % game.timingReport())
+        if not beQuiet: games.append(game)
+    if dataset is not None:
+        dataset.close()
+        print('Dataset: %s' % dataset)
+    if inputRecorder is not None:
+        inputRecorder.close()
+        print('Input recording: %s' % inputRecorder)
 
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
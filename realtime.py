@@ -0,0 +1,322 @@
+"""
+实时（非回合制）模式：固定时间步长的调度器
+
+模拟按固定的 tick 频率推进，一个 tick 相当于回合制中的一轮（更新复活倒计时，Pac-Man 移动，
+存活的鬼依次移动，每次移动后检查碰撞），因此规则、计分以及受惊的鬼以半格速度移动都与
+回合制一致。不同之处在于 agent 不再阻塞主循环：
+
+- 普通 agent 在各自的工作线程中运行：每个 tick 开始时收到最新的观测，算完的动作在
+  下一个 tick 使用；没有及时算完的 agent（迟到）沿用上一次的动作
+- 定义了 pollAction(state) 的 agent（例如键盘）在主循环中直接轮询，必须立即返回
+- 动作在执行时不合法（例如迟到的动作撞墙）时，沿当前方向继续走，不能继续则停下
+
+画面与模拟解耦：渲染频率独立于 tick 频率，两次 tick 之间按时间比例插值 agent 的位置。
+主循环落后过多时丢弃积压的 tick（避免越追越慢），并统计超时的 tick。
+
+用法:
+    python test_turn_based.py -m realtime --tick-rate 10
+    python realtime.py -l map_0 -g 4 --tickRate 20 --headless     # 无界面测试调度器
+"""
+import asyncio
+import inspect
+import random
+import sys
+import threading
+import time
+
+from game import Directions
+
+
+class AgentWorker:
+    """
+    在后台线程中运行一个 agent：主循环每个 tick 发布最新的观测（旧的未处理观测直接被覆盖），
+    worker 算完后留下 (tick, action)，主循环在需要时取走
+    """
+
+    def __init__(self, agent, index):
+        self.agent = agent
+        self.index = index
+        self.condition = threading.Condition()
+        self.observation = None
+        self.result = None
+        self.error = None
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='AgentWorker-%d' % index)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def post(self, tick, state):
+        with self.condition:
+            self.observation = (tick, state)
+            self.condition.notify()
+
+    def take(self):
+        """取走最新算完的动作；还没有新结果时返回 None"""
+        with self.condition:
+            result, self.result = self.result, None
+        return result
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self.observation is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                tick, state = self.observation
+                self.observation = None
+            try:
+                action = self.agent.getAction(state)
+                if inspect.isawaitable(action):
+                    action = asyncio.run(_awaitResult(action))
+            except Exception as e:
+                self.error = e
+                return
+            with self.condition:
+                self.result = (tick, action)
+
+
+async def _awaitResult(awaitable):
+    return await awaitable
+
+
+class RealtimeGame:
+    """
+    以固定 tick 频率运行一个由 ClassicGameRules.newGame 创建的 Game
+    """
+
+    def __init__(self, game, tickRate=10.0, renderRate=60.0, maxCatchUp=5, quiet=False):
+        """
+        Args:
+            game: ClassicGameRules.newGame 返回的 Game
+            tickRate: 每秒模拟的 tick 数
+            renderRate: 每秒最多渲染的帧数（无界面显示时不渲染）
+            maxCatchUp: 落后超过多少个 tick 时丢弃积压的 tick
+            quiet: 结束时是否不打印统计
+        """
+        self.game = game
+        self.tickRate = float(tickRate)
+        self.renderRate = float(renderRate)
+        self.maxCatchUp = max(1, int(maxCatchUp))
+        self.quiet = quiet
+        self.ticks = 0
+        self.frames = 0
+        self.overruns = 0
+        self.skippedTicks = 0
+        self.maxTickTime = 0.0
+        self.totalTickTime = 0.0
+        numAgents = len(game.agents)
+        self.lateActions = [0] * numAgents
+        self.lastActions = [Directions.STOP] * numAgents
+        self.workers = [None] * numAgents
+        self.previousPositions = None
+        self.currentPositions = None
+        self.drawnPositions = None
+
+    def run(self):
+        game = self.game
+        display = game.display
+        display.initialize(game.state.data)
+        game.numMoves = 0
+        for index, agent in enumerate(game.agents):
+            if hasattr(agent, 'registerInitialState'):
+                agent.registerInitialState(game.state.deepCopy())
+            if not hasattr(agent, 'pollAction'):
+                self.workers[index] = AgentWorker(agent, index)
+        self._postObservations()
+        self.currentPositions = self.previousPositions = self._positions(game.state)
+        self.drawnPositions = list(self.currentPositions)
+        interpolate = not (hasattr(display, 'checkNullDisplay') and display.checkNullDisplay()) \
+            and hasattr(display, 'agentImages')
+
+        if interpolate:
+            import graphicsUtils
+            wait = graphicsUtils.pump_events  # 等待时继续处理窗口事件，按键不会积压到下一帧
+        else:
+            wait = time.sleep
+        tickTime = 1.0 / self.tickRate
+        frameTime = 1.0 / self.renderRate if self.renderRate > 0 else None
+        start = time.perf_counter()
+        nextTick = start + tickTime
+        nextFrame = start
+        try:
+            while not game.gameOver:
+                now = time.perf_counter()
+                if now >= nextTick:
+                    behind = int((now - nextTick) / tickTime)
+                    if behind >= self.maxCatchUp:
+                        # 落后太多：丢弃积压的 tick，从现在重新计时
+                        self.skippedTicks += behind
+                        nextTick += behind * tickTime
+                    tickStart = time.perf_counter()
+                    self._tick()
+                    elapsed = time.perf_counter() - tickStart
+                    self.totalTickTime += elapsed
+                    self.maxTickTime = max(self.maxTickTime, elapsed)
+                    if elapsed > tickTime:
+                        self.overruns += 1
+                    nextTick += tickTime
+                    continue
+                if interpolate and frameTime is not None and now >= nextFrame:
+                    alpha = 1.0 - (nextTick - now) / tickTime
+                    self._render(min(1.0, max(0.0, alpha)))
+                    self.frames += 1
+                    nextFrame = now + frameTime
+                wake = nextTick if not interpolate or frameTime is None else min(nextTick, nextFrame)
+                wait(max(0.0, wake - time.perf_counter()))
+            self.elapsed = time.perf_counter() - start
+        finally:
+            for worker in self.workers:
+                if worker is not None:
+                    worker.stop()
+
+        for agent in game.agents:
+            if hasattr(agent, 'final'):
+                agent.final(game.state)
+        display.finish()
+        if not self.quiet:
+            print(self.report())
+        return game
+
+    def _postObservations(self):
+        for worker in self.workers:
+            if worker is not None:
+                worker.post(self.ticks, self.game.state.deepCopy())
+
+    def _positions(self, state):
+        return [None if agentState.respawnTimer > 0 else agentState.configuration.pos
+                for agentState in state.data.agentStates]
+
+    def _actionFor(self, index, state):
+        agent = self.game.agents[index]
+        worker = self.workers[index]
+        if worker is None:
+            action = agent.pollAction(state)
+        else:
+            if worker.error is not None:
+                raise worker.error
+            result = worker.take()
+            if result is None:
+                self.lateActions[index] += 1
+                action = self.lastActions[index]
+            else:
+                action = result[1]
+        self.lastActions[index] = action
+        legal = state.getLegalActions(index)
+        if action in legal or not legal:
+            return action
+        # 动作已不合法：沿当前方向继续，不能继续时停下（鬼不能停，随机选一个合法方向）
+        direction = state.data.agentStates[index].configuration.direction
+        if direction in legal:
+            return direction
+        if Directions.STOP in legal:
+            return Directions.STOP
+        return random.choice(legal)
+
+    def _tick(self):
+        game = self.game
+        self.ticks += 1
+        game.state.data.updateRespawnTimers()
+        self.previousPositions = self._positions(game.state)
+        for index in range(len(game.agents)):
+            if index > 0 and game.state.data.agentStates[index].respawnTimer > 0:
+                continue
+            action = self._actionFor(index, game.state)
+            game.lastActions[index] = action
+            if game.keepMoveHistory:
+                game.moveHistory.append((index, action))
+            if game.recorder is not None:
+                game.recorder.recordMove(index, action)
+            game.state = game.state.generateSuccessor(index, action)
+            game.display.update(game.state.data)
+            game.rules.process(game.state, game)
+            if game.gameOver:
+                break
+        if not game.gameOver:
+            game.numMoves += 1
+            self._postObservations()
+        self.currentPositions = self._positions(game.state)
+        # display.update 已经把移动过的 agent 画在新位置
+        self.drawnPositions = list(self.currentPositions)
+
+    def _render(self, alpha):
+        """按 alpha（0 为上一个 tick，1 为当前 tick）插值绘制 agent 的位置"""
+        import graphicsUtils
+        display = self.game.display
+        agentStates = self.game.state.data.agentStates
+        graphicsUtils.begin_batch()
+        for index, (previous, current) in enumerate(zip(self.previousPositions, self.currentPositions)):
+            if current is None or index >= len(display.agentImages):
+                continue
+            image = display.agentImages[index][1]
+            if not image:
+                continue
+            if previous is None or abs(current[0] - previous[0]) + abs(current[1] - previous[1]) > 1.5:
+                # 复活、传送、被吃后重置：直接跳到新位置
+                target = current
+            else:
+                target = (previous[0] + (current[0] - previous[0]) * alpha,
+                          previous[1] + (current[1] - previous[1]) * alpha)
+            drawn = self.drawnPositions[index]
+            if drawn == target:
+                continue
+            if agentStates[index].isPacman:
+                display.movePacman(target, agentStates[index].configuration.direction, image)
+            else:
+                oldX, oldY = display.to_screen(drawn)
+                newX, newY = display.to_screen(target)
+                for part in image:
+                    graphicsUtils.move_by(part, (newX - oldX, newY - oldY))
+            self.drawnPositions[index] = target
+        graphicsUtils.end_batch()
+
+    def report(self):
+        elapsed = getattr(self, 'elapsed', 0.0) or 1e-9
+        lines = ['Realtime: %d ticks in %.2fs (%.1f ticks/s, target %.1f), %d frames (%.1f fps)'
+                 % (self.ticks, elapsed, self.ticks / elapsed, self.tickRate, self.frames, self.frames / elapsed),
+                 'Tick time: mean %.2fms max %.2fms budget %.2fms, overruns %d, skipped ticks %d'
+                 % (1000.0 * self.totalTickTime / max(1, self.ticks), 1000.0 * self.maxTickTime,
+                    1000.0 / self.tickRate, self.overruns, self.skippedTicks)]
+        late = ['%d:%d' % (index, count) for index, count in enumerate(self.lateActions) if count]
+        if late:
+            lines.append('Late actions (agent:count): ' + ' '.join(late))
+        return '\n'.join(lines)
+
+
+def main(argv):
+    import argparse
+    import layout as layoutModule
+    import textDisplay
+    from pacman import ClassicGameRules
+    from ghostAgents import DirectionalGhost
+    from simpleAgents import GreedyAgent
+    parser = argparse.ArgumentParser(description='实时模式调度器测试（贪心 Pac-Man 对 DirectionalGhost）')
+    parser.add_argument('-l', '--layout', default='map_0', help='地图名称（默认: map_0）')
+    parser.add_argument('-g', '--ghosts', type=int, default=4, help='Ghost 数量（默认: 4）')
+    parser.add_argument('--tickRate', type=float, default=10.0, help='每秒 tick 数（默认: 10）')
+    parser.add_argument('--fps', type=float, default=60.0, help='渲染帧率上限（默认: 60）')
+    parser.add_argument('-z', '--zoom', type=float, default=0.5, help='窗口缩放比例（默认: 0.5）')
+    parser.add_argument('--headless', action='store_true', help='不显示画面')
+    args = parser.parse_args(argv)
+
+    layout = layoutModule.getLayout(args.layout)
+    if layout is None:
+        raise Exception("The layout " + args.layout + " cannot be found")
+    if args.headless:
+        display = textDisplay.NullGraphics()
+    else:
+        import graphicsDisplay
+        display = graphicsDisplay.PacmanGraphics(zoom=args.zoom)
+    game = ClassicGameRules().newGame(layout, GreedyAgent(), [DirectionalGhost(i + 1) for i in range(args.ghosts)],
+                                      display, quiet=True)
+    RealtimeGame(game, args.tickRate, args.fps).run()
+    print("Score: %d  Turns: %d" % (game.state.getScore(), game.numMoves))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,277 @@
+# remoteAgents.py
+# 远程 agent：让 agent 运行在独立的进程（或机器）上
+#
+# RemoteAgent 是一个普通的 Agent 代理，Game 可以像使用本地 agent 一样使用它：
+# 每次 getAction 把观测用 GameState.to_snapshot 编码后通过
+# multiprocessing.connection 发给 agent 服务器，服务器上托管的真实 agent 计算动作后回传。
+# 地图只在会话开始时发送一次，服务器按地图内容缓存 Layout。
+#
+# 一个 AgentServer 可以同时服务多个对局（每个连接一个会话、一个独立的 agent 实例），
+# 多个对局也可以分别连接到一组服务器上。
+#
+# 用法:
+#   python remoteAgents.py ExpectimaxAgent --port 6000 -a timeLimit=0.5
+#   python pacman.py -p RemoteAgent -a address=localhost:6000
+#
+# 协议（每条消息为 Connection.send_bytes 的一帧，首字节为类型）:
+#   H <agentIndex H> <layoutKey 40 字节> [地图文本]  开始会话；服务器已缓存该地图时回复 K，否则回复 L 要求发送地图文本
+#   I <观测>   registerInitialState，回复 K
+#   A <观测>   getAction，回复 a <方向编码 B>
+#   F <观测>   final，回复 K
+#   Q          结束会话
+# 服务器端出错时回复 E <错误信息>，代理端抛出异常。
+
+from game import Agent
+from game import Directions
+import observations
+import struct
+import threading
+
+DEFAULT_AUTHKEY = b'pacman'
+DEFAULT_PORT = 6000
+
+
+class RemoteAgentError(Exception):
+    """agent 服务器返回错误或连接超时"""
+    pass
+
+
+def parseAddress(address):
+    """
+    'host:port' 或 (host, port) 解析为 TCP 地址，其余字符串视为 Unix 套接字路径
+    """
+    if isinstance(address, tuple):
+        return address
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        return (host or 'localhost', int(port))
+    return address
+
+
+class RemoteAgent(Agent):
+    """
+    远程 agent 的本地代理
+
+    第一次 registerInitialState（或 getAction）时连接服务器并开始会话，
+    final 时结束会话并断开连接。
+    """
+
+    def __init__(self, index=0, address='localhost:%d' % DEFAULT_PORT, authkey=DEFAULT_AUTHKEY, timeout=None):
+        """
+        Args:
+            address: agent 服务器地址，'host:port' 或 Unix 套接字路径
+            authkey: 连接认证密钥
+            timeout: 等待服务器回复的最长时间（秒），None 表示一直等待
+        """
+        self.index = index
+        self.address = parseAddress(address)
+        self.authkey = authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+        # 命令行通过 -a 传入的参数是字符串
+        self.timeout = None if timeout in (None, 'None') else float(timeout)
+        self.connection = None
+        self.layoutKey = None
+
+    def _connect(self, state):
+        from multiprocessing.connection import Client
+        layout = state.data.layout
+        key = observations.layoutKey(layout)
+        if self.connection is not None and key == self.layoutKey:
+            return
+        self.close()
+        self.connection = Client(self.address, authkey=self.authkey)
+        self.layoutKey = key
+        hello = b'H' + struct.pack('<H', self.index) + key.encode('ascii')
+        if self._request(hello) == b'L':
+            self._request(b'H' + struct.pack('<H', self.index) + key.encode('ascii')
+                          + observations.encodeLayout(layout))
+
+    def _request(self, message):
+        self.connection.send_bytes(message)
+        if self.timeout is not None and not self.connection.poll(self.timeout):
+            self.close()
+            raise RemoteAgentError("Agent server %s did not reply within %.3f seconds"
+                                   % (self.address, self.timeout))
+        reply = self.connection.recv_bytes()
+        if reply[:1] == b'E':
+            raise RemoteAgentError(reply[1:].decode('utf-8'))
+        return reply
+
+    def registerInitialState(self, state):
+        self._connect(state)
+        self._request(b'I' + state.to_snapshot())
+
+    def getAction(self, state):
+        self._connect(state)
+        reply = self._request(b'A' + state.to_snapshot())
+        return Directions.ORDER[reply[1]]
+
+    def final(self, state):
+        if self.connection is None:
+            return
+        try:
+            self._request(b'F' + state.to_snapshot())
+        finally:
+            self.close()
+
+    def close(self):
+        """结束会话并断开连接"""
+        if self.connection is None:
+            return
+        try:
+            self.connection.send_bytes(b'Q')
+        except (OSError, EOFError):
+            pass
+        self.connection.close()
+        self.connection = None
+        self.layoutKey = None
+
+
+class AgentServer:
+    """
+    托管任意 Agent 子类的服务器：每个连接是一个会话，使用一个新建的 agent 实例，
+    在各自的线程中处理，因此多个对局可以共用一个服务器。
+    """
+
+    def __init__(self, agentClass, agentArgs=None, address=('localhost', DEFAULT_PORT), authkey=DEFAULT_AUTHKEY):
+        """
+        Args:
+            agentClass: 托管的 agent 类，以 agentClass(index=..., **agentArgs) 创建
+            agentArgs: 创建 agent 时的其他参数
+            address: 监听地址，端口为 0 时由系统分配（见 self.address）
+            authkey: 连接认证密钥
+        """
+        from multiprocessing.connection import Listener
+        self.agentClass = agentClass
+        self.agentArgs = agentArgs or {}
+        self.listener = Listener(parseAddress(address), authkey=authkey)
+        self.address = self.listener.address
+        self.layouts = {}  # layoutKey -> Layout
+        self.lock = threading.Lock()
+        self.running = True
+
+    def serveForever(self):
+        while self.running:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError):
+                if not self.running:
+                    break
+                continue
+            session = threading.Thread(target=self._session, args=(connection,))
+            session.daemon = True
+            session.start()
+
+    def close(self):
+        self.running = False
+        self.listener.close()
+
+    def _session(self, connection):
+        from pacman import GameState
+        agent = None
+        layout = None
+        try:
+            while True:
+                try:
+                    message = connection.recv_bytes()
+                except (EOFError, OSError):
+                    break
+                kind, body = message[:1], message[1:]
+                if kind == b'Q':
+                    break
+                try:
+                    if kind == b'H':
+                        index, = struct.unpack_from('<H', body, 0)
+                        key = body[2:42].decode('ascii')
+                        with self.lock:
+                            layout = self.layouts.get(key)
+                            if layout is None and len(body) > 42:
+                                layout = self.layouts[key] = observations.decodeLayout(body[42:])
+                        if layout is None:
+                            connection.send_bytes(b'L')
+                            continue
+                        agent = self.agentClass(index=index, **self.agentArgs)
+                        connection.send_bytes(b'K')
+                    elif kind == b'I':
+                        if hasattr(agent, 'registerInitialState'):
+                            agent.registerInitialState(GameState.from_snapshot(body, layout))
+                        connection.send_bytes(b'K')
+                    elif kind == b'A':
+                        action = agent.getAction(GameState.from_snapshot(body, layout))
+                        connection.send_bytes(b'a' + bytes([Directions.INDEX[action]]))
+                    elif kind == b'F':
+                        if hasattr(agent, 'final'):
+                            agent.final(GameState.from_snapshot(body, layout))
+                        connection.send_bytes(b'K')
+                    else:
+                        connection.send_bytes(b'E' + ("Unknown message type %r" % kind).encode('utf-8'))
+                except Exception as e:
+                    connection.send_bytes(b'E' + ("%s: %s" % (type(e).__name__, e)).encode('utf-8'))
+        finally:
+            connection.close()
+
+
+def _serveLocal(agentClass, agentArgs, authkey, reply):
+    server = AgentServer(agentClass, agentArgs, ('localhost', 0), authkey)
+    reply.send(server.address)
+    reply.close()
+    server.serveForever()
+
+
+class LocalAgentServer:
+    """
+    本机子进程中的 agent 服务器（用于测试和单机多进程），支持 with 语句
+
+        with LocalAgentServer(ExpectimaxAgent, {'timeLimit': 0.2}) as server:
+            pacman = RemoteAgent(0, server.address)
+    """
+
+    def __init__(self, agentClass, agentArgs=None, authkey=DEFAULT_AUTHKEY):
+        import multiprocessing
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=_serveLocal,
+                                               args=(agentClass, agentArgs, authkey, sender))
+        self.process.daemon = True
+        self.process.start()
+        self.address = receiver.recv()
+        receiver.close()
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def main(argv):
+    import argparse
+    from pacman import loadAgent, parseAgentArgs
+    parser = argparse.ArgumentParser(description='托管 agent 的服务器，供 RemoteAgent 连接')
+    parser.add_argument('agent', help='agent 类名（在 *Agents.py 中查找），例如 ExpectimaxAgent')
+    parser.add_argument('-a', '--agentArgs', default=None, help='agent 参数，例如 "timeLimit=0.5,maxDepth=4"')
+    parser.add_argument('--host', default='localhost', help='监听地址（默认: localhost）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='监听端口（默认: %d）' % DEFAULT_PORT)
+    parser.add_argument('--authkey', default=DEFAULT_AUTHKEY.decode('utf-8'), help='连接认证密钥')
+    args = parser.parse_args(argv)
+
+    agentClass = loadAgent(args.agent, True)
+    server = AgentServer(agentClass, parseAgentArgs(args.agentArgs), (args.host, args.port),
+                         args.authkey.encode('utf-8'))
+    print("Serving %s on %s:%d" % (args.agent, args.host, server.address[1]))
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])
@@ -0,0 +1,339 @@
+"""
+录像录制与回放
+GameRecorder 在对局进行中把动作流式写入紧凑的录像文件；ReplayEngine 读取录制的
+游戏，支持无界面全速快进、通过周期性关键帧跳转到任意回合，以及每 N 帧才渲染一次
+的跳帧播放。
+
+回合（turn）的定义与 Game.run 中的 numMoves 一致：第 t 回合指完成 t 轮
+（Pac-Man 一步 + 所有存活的 Ghost 各一步）之后的状态，第 0 回合为初始状态。
+
+录像文件格式（流式）:
+    RECORD_MAGIC
+    头部：一行 UTF-8 JSON（版本、地图文本、Ghost 数量、随机种子等），以 '\n' 结尾
+    动作：每一步一个字节，取值为 Directions.INDEX 中的方向编码
+agent 下标不写入文件，回放时按 Game.run 的回合顺序推算，因此进程中途崩溃时
+已经刷新到磁盘的部分仍然可以回放。旧的 pickle 格式录像仍然可以读取。
+"""
+import json
+import pickle
+import sys
+import time
+
+from game import Directions
+from pacman import ClassicGameRules, GameState
+import layout as layoutModule
+
+DEFAULT_KEYFRAME_INTERVAL = 500  # 每隔多少回合保存一个关键帧
+DEFAULT_FLUSH_INTERVAL = 256     # 每录制多少步刷新一次文件
+RECORD_MAGIC = b'PACREC\x01\n'
+RECORD_VERSION = 1
+
+
+class GameRecorder:
+    """
+    流式录像：动作按字节编码写入缓冲区，每 flushInterval 步写入并刷新文件
+    通过 Game(recorder=...) 或 game.recorder 挂到对局上
+    """
+
+    def __init__(self, filename, layout, numGhosts, seed=None, flushInterval=DEFAULT_FLUSH_INTERVAL, **extra):
+        """
+        Args:
+            filename: 输出文件路径
+            layout: 对局使用的 Layout（地图文本写入头部）
+            numGhosts: Ghost 数量
+            seed: 对局使用的随机种子（未知时为 None）
+            flushInterval: 每录制多少步刷新一次文件
+            extra: 其他写入头部的信息
+        """
+        self.filename = filename
+        self.flushInterval = max(1, int(flushInterval))
+        self.numMoves = 0
+        self._buffer = bytearray()
+        header = {
+            'version': RECORD_VERSION,
+            'layout': list(layout.layoutText),
+            'numGhosts': numGhosts,
+            'seed': seed,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        header.update(extra)
+        self._file = open(filename, 'wb')
+        self._file.write(RECORD_MAGIC)
+        self._file.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+
+    def recordMove(self, agentIndex, action):
+        """记录一步动作（agent 下标由回合顺序隐含，不写入文件）"""
+        self._buffer.append(Directions.INDEX[action])
+        self.numMoves += 1
+        if len(self._buffer) >= self.flushInterval:
+            self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def readRecording(filename):
+    """
+    读取录像文件（流式格式或旧的 pickle 格式）
+    Returns:
+        (header, layout, actions) 元组；流式格式的 actions 是方向编码的 bytes，
+        pickle 格式的 actions 是 (agentIndex, action) 列表，header 为 None
+    """
+    with open(filename, 'rb') as f:
+        magic = f.read(len(RECORD_MAGIC))
+        if magic != RECORD_MAGIC:
+            f.seek(0)
+            recorded = pickle.load(f)
+            return None, recorded['layout'], recorded['actions']
+        header = json.loads(f.readline().decode('utf-8'))
+        if header.get('version') != RECORD_VERSION:
+            raise Exception("Unsupported recording version: %s" % header.get('version'))
+        actions = f.read()
+    return header, layoutModule.Layout(header['layout']), actions
+
+
+class ReplayEngine:
+    """
+    录像回放引擎
+
+    与旧的 pacman.replayGame 不同，引擎按照 Game.run 的回合顺序推进状态：
+    每轮开始时更新鬼的复活倒计时，然后 Pac-Man 移动，再由存活的鬼依次移动，
+    并调用 ClassicGameRules.process 处理新一轮/胜负，因此回放结果与实际对局一致。
+    """
+
+    def __init__(self, layout, actions, numGhosts=None, keyframeInterval=DEFAULT_KEYFRAME_INTERVAL):
+        """
+        Args:
+            layout: 对局使用的 Layout
+            actions: 动作序列，元素为 (agentIndex, action)（即 Game.moveHistory），
+                     或者流式录像中的方向编码 bytes（agent 下标按回合顺序推算）
+            numGhosts: Ghost 数量，为 None 时从动作序列中推断（方向编码必须指定）
+            keyframeInterval: 关键帧间隔（回合数）
+        """
+        self.layout = layout
+        self.actions = actions
+        self._encoded = isinstance(actions, (bytes, bytearray))
+        if numGhosts is None:
+            if self._encoded:
+                raise Exception("numGhosts is required for encoded recordings")
+            numGhosts = max([agentIndex for agentIndex, action in actions] + [0])
+        self.numGhosts = numGhosts
+        self.keyframeInterval = max(1, int(keyframeInterval))
+
+        self.rules = ClassicGameRules()
+        self.game = self.rules.newGame(layout, None, [None] * numGhosts, None, quiet=True)
+        self.game.display = None
+
+        self.state = self.game.state
+        self.position = 0      # 下一个要执行的动作在 actions 中的下标
+        self.turn = 0          # 已完成的回合数
+        self.nextAgent = 0     # 下一个移动的 agent
+        self.finished = False  # 对局已结束（胜/负）
+        # 关键帧：turn -> (position, 状态副本)
+        self.keyframes = {0: (0, self._copyState(self.state))}
+
+    def __len__(self):
+        return len(self.actions)
+
+    def _copyState(self, state):
+        """复制状态用于关键帧；食物网格为写时复制，可以安全共享"""
+        copy = GameState(state)
+        copy.data._eaten = list(state.data._eaten)
+        return copy
+
+    def _actionAt(self, position):
+        if self._encoded:
+            return Directions.ORDER[self.actions[position]]
+        agentIndex, action = self.actions[position]
+        if agentIndex != self.nextAgent:
+            raise Exception("Recorded move %d belongs to agent %d, expected agent %d"
+                            % (position, agentIndex, self.nextAgent))
+        return action
+
+    def atEnd(self):
+        return self.finished or self.position >= len(self.actions)
+
+    def step(self, display=None):
+        """
+        执行一个录制的动作（一帧）
+        Args:
+            display: 若不为 None，则像 Game.run 一样逐帧更新该显示
+        Returns:
+            是否成功执行了动作
+        """
+        if self.atEnd():
+            return False
+        agentIndex = self.nextAgent
+        action = self._actionAt(self.position)
+        if agentIndex == 0:
+            # 每轮开始：更新所有鬼的复活倒计时
+            self.state.data.updateRespawnTimers()
+
+        self.state = self.state.generateSuccessor(agentIndex, action)
+        self.position += 1
+        self.game.state = self.state
+        if display is not None:
+            display.update(self.state.data)
+        self.game.display = display
+        self.rules.process(self.state, self.game)
+        self.game.display = None
+
+        if self.game.gameOver:
+            self.finished = True
+            return True
+        self.nextAgent = self._nextLivingAgent(agentIndex)
+        if self.nextAgent == 0:
+            self.turn += 1
+            if self.turn % self.keyframeInterval == 0 and self.turn not in self.keyframes:
+                self.keyframes[self.turn] = (self.position, self._copyState(self.state))
+        return True
+
+    def _nextLivingAgent(self, agentIndex):
+        """按 Game.run 的顺序找到下一个移动的 agent（跳过等待复活的鬼）"""
+        agentStates = self.state.data.agentStates
+        for index in range(agentIndex + 1, len(agentStates)):
+            if agentStates[index].respawnTimer == 0:
+                return index
+        return 0
+
+    def stepTurn(self, display=None):
+        """执行一个完整回合；返回是否有动作被执行"""
+        moved = self.step(display)
+        while moved and self.nextAgent != 0 and not self.atEnd():
+            self.step(display)
+        return moved
+
+    def fastForward(self, turn=None):
+        """
+        无界面全速快进到指定回合（为 None 时快进到录像末尾）
+        Returns:
+            当前回合数
+        """
+        while not self.atEnd() and (turn is None or self.turn < turn):
+            self.step()
+        return self.turn
+
+    def seek(self, turn):
+        """
+        跳转到指定回合：从不晚于目标回合的最近关键帧恢复，再快进剩余部分
+        Returns:
+            实际到达的回合数（录像不够长时小于 turn）
+        """
+        turn = max(0, int(turn))
+        start = max(t for t in self.keyframes if t <= turn)
+        if self.finished or not (start <= self.turn <= turn and self.nextAgent == 0):
+            position, state = self.keyframes[start]
+            self.state = self._copyState(state)
+            self.game.state = self.state
+            self.game.gameOver = False
+            self.position = position
+            self.turn = start
+            self.nextAgent = 0
+            self.finished = False
+        return self.fastForward(turn)
+
+    def play(self, display, startTurn=0, endTurn=None, frameStride=1):
+        """
+        使用显示播放录像
+        Args:
+            display: 显示对象（如 graphicsDisplay.PacmanGraphics）
+            startTurn: 从第几回合开始播放（之前的部分无界面快进）
+            endTurn: 播放到第几回合结束，None 表示播放到末尾
+            frameStride: 每隔多少帧渲染一次，1 表示逐帧渲染
+        """
+        frameStride = max(1, int(frameStride))
+        self.seek(startTurn)
+        display.initialize(self.state.data)
+        skipped = 0
+        while not self.atEnd() and (endTurn is None or self.turn < endTurn):
+            if frameStride == 1:
+                self.step(display)
+                continue
+            self.step()
+            skipped += 1
+            if skipped >= frameStride:
+                self._syncDisplay(display)
+                skipped = 0
+        if skipped:
+            self._syncDisplay(display)
+        display.finish()
+
+    def _syncDisplay(self, display):
+        """跳帧后把显示同步到当前状态"""
+        if hasattr(display, 'redrawState'):
+            display.redrawState(self.state.data)
+        else:
+            display.update(self.state.data)
+
+
+def loadRecording(filename, keyframeInterval=DEFAULT_KEYFRAME_INTERVAL):
+    """
+    读取 runGames(record=True) 写出的录像文件
+    Returns:
+        ReplayEngine 对象
+    """
+    header, layout, actions = readRecording(filename)
+    numGhosts = header['numGhosts'] if header is not None else None
+    return ReplayEngine(layout, actions, numGhosts=numGhosts, keyframeInterval=keyframeInterval)
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description='Pac-Man 录像回放（支持快进、跳转和跳帧）')
+    parser.add_argument('recording', help='录像文件')
+    parser.add_argument('-s', '--start', type=int, default=0, help='从第几回合开始播放（默认: 0）')
+    parser.add_argument('-e', '--end', type=int, default=None, help='播放到第几回合结束（默认: 录像末尾）')
+    parser.add_argument('-n', '--stride', type=int, default=1, help='每隔多少帧渲染一次（默认: 1）')
+    parser.add_argument('-k', '--keyframes', type=int, default=DEFAULT_KEYFRAME_INTERVAL,
+                        help='关键帧间隔回合数（默认: %d）' % DEFAULT_KEYFRAME_INTERVAL)
+    parser.add_argument('-z', '--zoom', type=float, default=0.5, help='窗口缩放比例（默认: 0.5）')
+    parser.add_argument('--headless', action='store_true', help='不显示画面，只快进并输出结果')
+    parser.add_argument('--video', default=None, help='不显示窗口，把回放渲染为动画文件（.gif，或需要 ffmpeg 的 .mp4 / .webm）')
+    parser.add_argument('--fps', type=float, default=10.0, help='动画的帧率（默认: 10）')
+    args = parser.parse_args(argv)
+
+    engine = loadRecording(args.recording, args.keyframes)
+    if args.headless:
+        start = time.time()
+        if args.end is None:
+            engine.fastForward()
+        else:
+            engine.seek(args.end)
+        elapsed = time.time() - start
+        print("回合: %d  动作: %d/%d  得分: %d  生命: %d  用时: %.2fs"
+              % (engine.turn, engine.position, len(engine), engine.state.getScore(),
+                 engine.state.data.lives, elapsed))
+        return engine
+
+    if args.video is not None:
+        import videoSink
+        display = videoSink.VideoSink(args.video, fps=args.fps, zoom=args.zoom)
+    else:
+        import graphicsDisplay
+        display = graphicsDisplay.PacmanGraphics(zoom=args.zoom)
+    engine.play(display, startTurn=args.start, endTurn=args.end, frameStride=args.stride)
+    return engine
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
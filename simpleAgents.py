@@ -49,3 +49,46 @@ class GreedyAgent(Agent):
         
         return best_action
 
+
+
+class ScriptedAgent(Agent):
+    """
+    按顺序重放一串预先给定的动作（通常来自 inputRecording 录制的键盘会话），不等待按键，全速运行
+    用法: python pacman.py -p ScriptedAgent -a script=session.inp -q
+    （pacman.py --replayInput 会同时按录制时的地图、Ghost 和随机种子设置对局）
+    """
+
+    def __init__(self, script=None, actions=None, index=0, strict=True):
+        """
+        Args:
+            script: inputRecording 录制的文件
+            actions: 直接给定的动作序列（不指定 script 时使用）
+            index: agent 下标
+            strict: 录制的动作在当前状态不合法时（重放与录制时的对局不一致）是否抛出异常；
+                    为 False 时改为原地不动
+        """
+        Agent.__init__(self, index)
+        if script is not None:
+            from inputRecording import readInputRecording
+            actions = readInputRecording(script)[2]
+        self.actions = list(actions or [])
+        self.position = 0
+        self.strict = strict not in (False, 'False', 'false', '0')
+        self.diverged = 0   # 不合法而被替换的动作数
+        self.exhausted = 0  # 动作用完之后补上的步数
+
+    def getAction(self, state):
+        legal = state.getLegalActions(self.index)
+        if self.position >= len(self.actions):
+            # 录制在对局结束前就停止了（例如关闭了窗口）：之后原地不动
+            self.exhausted += 1
+            return Directions.STOP if Directions.STOP in legal or not legal else legal[0]
+        action = self.actions[self.position]
+        self.position += 1
+        if action in legal:
+            return action
+        if self.strict:
+            raise Exception('Scripted move %d (%s) is illegal at %s: the game has diverged from the recording'
+                            % (self.position, action, state.getPacmanPosition()))
+        self.diverged += 1
+        return Directions.STOP if Directions.STOP in legal or not legal else legal[0]
@@ -0,0 +1,46 @@
+"""
+同一个事件循环中并发进行的对局（runGamesConcurrently）：agent 的静默输出互不干扰
+"""
+import asyncio
+import sys
+
+import layout
+import textDisplay
+from game import Agent, Directions, runGamesConcurrently
+from ghostAgents import RandomGhost
+from pacman import ClassicGameRules
+
+
+class ChattyAgent(Agent):
+    """每一步都输出一行，然后让出事件循环（模拟等待远程/批量推理的 agent）"""
+
+    def __init__(self, name, index=0):
+        Agent.__init__(self, index)
+        self.name = name
+
+    def getAction(self, state):
+        print('%s thinking' % self.name)
+        return self._decide(state)
+
+    async def _decide(self, state):
+        await asyncio.sleep(0)
+        legal = state.getLegalActions(self.index)
+        return Directions.STOP if Directions.STOP in legal else legal[0]
+
+
+def test_concurrent_muted_games():
+    stdout, stderr = sys.stdout, sys.stderr
+    rules = ClassicGameRules()
+    games = []
+    for name in ('A', 'B'):
+        game = rules.newGame(layout.getLayout('map_0'), ChattyAgent(name), [RandomGhost(1)],
+                             textDisplay.NullGraphics(), quiet=True)
+        game.muteAgents = True
+        games.append(game)
+
+    runGamesConcurrently(games)
+
+    assert sys.stdout is stdout and sys.stderr is stderr
+    for game, name in zip(games, ('A', 'B')):
+        lines = game.agentOutput[0].getvalue().splitlines()
+        assert lines and set(lines) == {'%s thinking' % name}
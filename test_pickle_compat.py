@@ -0,0 +1,81 @@
+"""
+旧格式 pickle 的兼容性测试：TurnBasedInterface 导出的 state_*.pkl 等在 Configuration、AgentState、
+GameStateData 加入 __slots__ 之前写出，实例状态是普通的 dict
+"""
+import copyreg
+import io
+import pickle
+
+import layout
+from game import AgentState, Configuration, GameStateData
+from pacman import ExplorationTracker, GameState
+
+# 加入 __slots__ 之后才有的字段，旧 pickle 中没有
+_NEW_FIELDS = ('_ownsFood', '_explorationTracker', '_foodHash')
+
+
+class _LegacyPickler(pickle.Pickler):
+    """按加入 __slots__ 之前的格式写出：NEWOBJ + 以实例字典作为状态的 BUILD"""
+
+    def reducer_override(self, obj):
+        if isinstance(obj, (Configuration, AgentState, GameStateData)):
+            state = dict((name, getattr(obj, name)) for name in obj.__slots__
+                         if hasattr(obj, name) and name not in _NEW_FIELDS)
+            return copyreg.__newobj__, (type(obj),), state
+        if isinstance(obj, layout.Layout):
+            # Layout 驻留之前：可变的实例字典，列表而不是元组
+            state = dict((name, value) for name, value in vars(obj).items()
+                         if not name.startswith('_') and name != 'key')
+            for name in ('capsules', 'agentPositions', 'portals', 'layoutText'):
+                state[name] = list(state[name])
+            return copyreg.__newobj__, (layout.Layout,), state
+        return NotImplemented
+
+
+def _legacyDumps(obj):
+    buffer = io.BytesIO()
+    _LegacyPickler(buffer, protocol=pickle.DEFAULT_PROTOCOL).dump(obj)
+    return buffer.getvalue()
+
+
+def _state():
+    state = GameState()
+    state.initialize(layout.getLayout('map_0'), 2)
+    return state.generateSuccessor(0, state.getLegalActions(0)[0])
+
+
+def test_load_legacy_pickle():
+    state = _state()
+    restored = pickle.loads(_legacyDumps(state))
+    assert restored == state
+    assert restored.getPacmanPosition() == state.getPacmanPosition()
+    assert restored.getNumFood() == state.getNumFood()
+    assert restored.getStateKey() == state.getStateKey()
+    assert restored.data._explorationTracker is None
+    assert restored.data.layout.key == state.data.layout.key
+    assert restored.data.layout.capsules == state.data.layout.capsules
+    # 还原的状态可以继续推进
+    action = restored.getLegalActions(0)[0]
+    assert restored.generateSuccessor(0, action) == state.generateSuccessor(0, action)
+
+
+def test_pickle_round_trip():
+    state = _state()
+    restored = pickle.loads(pickle.dumps(state))
+    assert restored == state
+    assert restored.getStateKey() == state.getStateKey()
+    assert restored.data.agentStates[1].configuration == state.data.agentStates[1].configuration
+
+
+def test_exploration_tracker_not_pickled():
+    state = _state()
+    tracker = ExplorationTracker(capacity=100)
+    state.setExplorationTracker(tracker)
+    for action in state.getLegalActions(0):
+        state.generateSuccessor(0, action)
+    assert tracker.getExplored()
+    size = len(pickle.dumps(state))
+    state.setExplorationTracker(None)
+    assert len(pickle.dumps(state)) == size
+    state.setExplorationTracker(tracker)
+    assert pickle.loads(pickle.dumps(state)).getExplorationTracker() is None
@@ -11,6 +11,7 @@ import layout
 import graphicsDisplay
 from turnBasedInterface import TurnBasedInterface
 import argparse
+import random
 import sys
 
 def load_pacman_agent(agent_name):
@@ -23,6 +24,15 @@ def load_pacman_agent(agent_name):
     elif agent_name.lower() == 'greedy':
         from simpleAgents import GreedyAgent
         return GreedyAgent()
+    elif agent_name.lower() == 'expectimax':
+        from multiAgents import ExpectimaxAgent
+        return ExpectimaxAgent()
+    elif agent_name.lower() == 'minimax':
+        from multiAgents import MinimaxAgent
+        return MinimaxAgent()
+    elif agent_name.lower() == 'mcts':
+        from mctsAgents import MCTSAgent
+        return MCTSAgent()
     else:
         # 尝试从其他模块加载
         try:
@@ -38,12 +48,29 @@ def load_pacman_agent(agent_name):
         print(f"警告: 未找到agent '{agent_name}'，使用默认的KeyboardAgent")
         return KeyboardAgent()
 
+def load_ghost_agents(ghost_type, num_ghosts):
+    """创建Ghost agents；vectorized 类型的所有Ghost共用一个向量化决策引擎"""
+    if ghost_type == 'vectorized':
+        from ghostAgents import VectorizedGhost, VectorizedGhostTeam
+        team = VectorizedGhostTeam()
+        return [VectorizedGhost(i+1, team) for i in range(num_ghosts)]
+    elif ghost_type == 'random':
+        from ghostAgents import RandomGhost
+        return [RandomGhost(i+1) for i in range(num_ghosts)]
+    return [DirectionalGhost(i+1) for i in range(num_ghosts)]
+
 def test_turn_based(layout_name='merged_mask_frame_0_small', 
                     num_ghosts=4, 
                     pacman_agent='keyboard',
                     mode='turn-based',
                     zoom=0.5,
-                    output_dir='turn_based_output'):
+                    output_dir='turn_based_output',
+                    ghost_type='directional',
+                    tick_rate=10.0,
+                    fps=60.0,
+                    state_format='pkl',
+                    record_input=None,
+                    overlays=()):
     """
     测试回合制游戏逻辑（带截图和状态导出）
     
@@ -51,9 +78,15 @@ def test_turn_based(layout_name='merged_mask_frame_0_small',
         layout_name: 地图名称（不包含.lay扩展名）
         num_ghosts: Ghost数量
         pacman_agent: Pac-Man agent类型 ('keyboard', 'random', 'greedy', 或其他agent类名)
-        mode: 游戏模式 ('turn-based' 或 'realtime')，目前只支持turn-based
+        mode: 游戏模式 ('turn-based' 或 'realtime')
         zoom: 窗口缩放比例
         output_dir: 输出目录
+        ghost_type: Ghost类型 ('directional', 'vectorized' 或 'random')
+        tick_rate: 实时模式每秒的 tick 数（每个 tick 所有 agent 各走一步）
+        fps: 实时模式的渲染帧率上限
+        state_format: 每回合导出状态的格式 ('pkl'、'json' 或 'snapshot')
+        record_input: 把键盘操作录制到这个文件（只支持回合制），之后用 pacman.py --replayInput 全速重放
+        overlays: 显示的调试叠加层（见 graphicsDisplay.OVERLAY_LAYERS）
     """
     print("=" * 60)
     if mode == 'turn-based':
@@ -77,37 +110,63 @@ def test_turn_based(layout_name='merged_mask_frame_0_small',
     print(f"实际使用Ghost数量: {num_ghosts}")
     
     # 创建回合制接口（导出截图和状态）
-    export_interface = TurnBasedInterface(output_dir=output_dir)
+    export_interface = TurnBasedInterface(output_dir=output_dir, state_format=state_format)
     print(f"输出目录: {export_interface.output_dir}")
     print(f"截图目录: {export_interface.screenshot_dir}")
     print(f"状态目录: {export_interface.state_dir}")
     
+    # 录制输入时固定随机种子，重放时用同一个种子复现鬼的动作
+    seed = None
+    if record_input:
+        seed = random.randrange(1 << 31)
+        random.seed(seed)
+    
     # 创建agents
     pacman = load_pacman_agent(pacman_agent)
     print(f"Pac-Man Agent: {pacman_agent}")
     
-    ghosts = [DirectionalGhost(i+1) for i in range(num_ghosts)]
+    ghosts = load_ghost_agents(ghost_type, num_ghosts)
+    print(f"Ghost类型: {ghost_type}")
     
     # 创建游戏（传入exportInterface）
     rules = ClassicGameRules()
-    display = graphicsDisplay.PacmanGraphics(zoom=zoom)
+    display = graphicsDisplay.PacmanGraphics(zoom=zoom, overlays=overlays)
     game = rules.newGame(layout_obj, pacman, ghosts, display, quiet=False, catchExceptions=True)
     
-    # 设置导出接口
-    game.exportInterface = export_interface
+    # 设置导出接口（实时模式下逐帧截图会拖慢 tick，不导出）
+    if mode == 'turn-based':
+        game.exportInterface = export_interface
+    
+    if record_input:
+        from inputRecording import InputRecorder
+        pacman.recorder = InputRecorder(record_input, layout_obj, num_ghosts, seed=seed,
+                                        ghost=type(ghosts[0]).__name__, numGames=1)
+        print(f"录制输入到: {record_input}")
     
     print("\n游戏开始！")
     if mode == 'turn-based':
         print("回合制规则：Pac-Man先移动，然后所有Ghost依次移动")
     else:
-        print("实时模式：所有agent同时移动（基于时间）")
+        print(f"实时模式：每秒 {tick_rate:g} 个 tick，迟到的 agent 沿用上一次的动作")
     
     if pacman_agent.lower() == 'keyboard' or pacman_agent.lower() == 'manual':
-        print("控制：WASD 或方向键移动，空格键不走，Q停止")
-    print("每回合会自动导出截图和状态到输出目录\n")
+        if mode == 'turn-based':
+            print("控制：WASD 或方向键移动，空格键不走，Q停止")
+        else:
+            print("控制：WASD 或方向键改变方向（保持到下一次按键），空格键或Q停下")
+    if mode == 'turn-based':
+        print("每回合会自动导出截图和状态到输出目录\n")
     
     # 运行游戏
-    game.run()
+    if mode == 'realtime':
+        from realtime import RealtimeGame
+        RealtimeGame(game, tickRate=tick_rate, renderRate=fps).run()
+    else:
+        game.run()
+    if record_input:
+        pacman.recorder.close()
+        print(f"输入录制: {pacman.recorder}")
+        print(f"重放: python pacman.py --replayInput {record_input} -q")
     
     print(f"\n游戏结束！共 {game.numMoves} 回合")
     print(f"截图保存在: {export_interface.screenshot_dir}")
@@ -132,9 +191,16 @@ def main():
   # 使用贪心agent
   python test_turn_based.py --layout auto_generated --agent greedy
   
+  # 使用搜索agent（迭代加深expectimax，带置换表）
+  python test_turn_based.py --layout auto_generated --agent expectimax
+  
   # 手动控制（默认）
   python test_turn_based.py --layout auto_generated --agent keyboard
   
+  # 录制键盘操作，之后无界面全速重放（回归测试）
+  python test_turn_based.py -l map_0 --record-input session.inp
+  python pacman.py --replayInput session.inp -q
+  
   # 完整参数示例
   python test_turn_based.py -l test_map -g 6 -a keyboard -m turn-based -z 0.5
         """
@@ -158,8 +224,18 @@ def main():
         '-a', '--agent',
         type=str,
         default='keyboard',
-        choices=['keyboard', 'manual', 'random', 'greedy'],
-        help='Pac-Man agent类型: keyboard/manual(手动控制), random(随机), greedy(贪心) (默认: keyboard)'
+        choices=['keyboard', 'manual', 'random', 'greedy', 'expectimax', 'minimax', 'mcts'],
+        help='Pac-Man agent类型: keyboard/manual(手动控制), random(随机), greedy(贪心), '
+             'expectimax/minimax/mcts(搜索) (默认: keyboard)'
+    )
+    
+    parser.add_argument(
+        '-t', '--ghost-type',
+        type=str,
+        default='directional',
+        choices=['directional', 'vectorized', 'random'],
+        help='Ghost类型: directional(A*追踪), vectorized(向量化批量决策，适合大量Ghost，需要numpy), '
+             'random(随机) (默认: directional)'
     )
     
     parser.add_argument(
@@ -167,7 +243,21 @@ def main():
         type=str,
         default='turn-based',
         choices=['turn-based', 'realtime'],
-        help='游戏模式: turn-based(回合制), realtime(实时) (默认: turn-based，注意：realtime模式尚未实现)'
+        help='游戏模式: turn-based(回合制), realtime(实时，固定 tick 频率) (默认: turn-based)'
+    )
+    
+    parser.add_argument(
+        '--tick-rate',
+        type=float,
+        default=10.0,
+        help='实时模式每秒的 tick 数（默认: 10）'
+    )
+    
+    parser.add_argument(
+        '--fps',
+        type=float,
+        default=60.0,
+        help='实时模式的渲染帧率上限（默认: 60）'
     )
     
     parser.add_argument(
@@ -184,9 +274,38 @@ def main():
         help='输出目录（默认: turn_based_output）'
     )
     
+    parser.add_argument(
+        '--state-format',
+        type=str,
+        default='pkl',
+        choices=['pkl', 'json', 'snapshot'],
+        help='每回合导出状态的格式: pkl(完整 pickle), json(关键信息), '
+             'snapshot(紧凑快照，地图只保存一次，用 GameState.from_snapshot 还原) (默认: pkl)'
+    )
+    
+    parser.add_argument(
+        '--record-input',
+        type=str,
+        default=None,
+        help='把键盘操作（带时间戳）录制到这个文件，之后用 python pacman.py --replayInput 文件 -q 全速重放'
+    )
+    
+    parser.add_argument(
+        '--overlay',
+        nargs='+',
+        default=[],
+        choices=list(graphicsDisplay.OVERLAY_LAYERS),
+        help='显示调试叠加层: expanded(搜索展开的格子), ghostDistances(到最近 Ghost 的距离场), '
+             'values(agent 的价值图), distributions(信念分布)'
+    )
+    
     args = parser.parse_args()
     
     # 验证参数
+    if args.record_input and (args.mode != 'turn-based' or args.agent not in ('keyboard', 'manual')):
+        print("错误: --record-input 只支持回合制下的键盘操作")
+        sys.exit(1)
+    
     if args.ghosts < 1:
         print("错误: Ghost数量必须大于0")
         sys.exit(1)
@@ -195,9 +314,9 @@ def main():
         print("错误: 缩放比例必须大于0")
         sys.exit(1)
     
-    if args.mode == 'realtime':
-        print("警告: 实时模式尚未实现，将使用回合制模式")
-        args.mode = 'turn-based'
+    if args.tick_rate <= 0:
+        print("错误: tick 频率必须大于0")
+        sys.exit(1)
     
     # 运行游戏
     test_turn_based(
@@ -206,7 +325,13 @@ def main():
         pacman_agent=args.agent,
         mode=args.mode,
         zoom=args.zoom,
-        output_dir=args.output
+        output_dir=args.output,
+        ghost_type=args.ghost_type,
+        tick_rate=args.tick_rate,
+        fps=args.fps,
+        state_format=args.state_format,
+        record_input=args.record_input,
+        overlays=args.overlay
     )
 
 if __name__ == '__main__':
@@ -0,0 +1,32 @@
+"""
+无界面显示：pacman.py -q 以及批量 / 并发运行对局时使用，不做任何绘制
+"""
+
+
+class NullGraphics:
+    def initialize(self, state, isBlue=False):
+        pass
+
+    def update(self, state):
+        pass
+
+    def checkNullDisplay(self):
+        return True
+
+    def pause(self):
+        pass
+
+    def draw(self, state):
+        pass
+
+    def updateDistributions(self, dist):
+        pass
+
+    def drawExpandedCells(self, cells):
+        pass
+
+    def drawValues(self, values):
+        pass
+
+    def finish(self):
+        pass
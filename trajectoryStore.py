@@ -0,0 +1,353 @@
+"""
+基于 numpy.memmap 的对局轨迹存储：逐回合保存完整的动态状态，支持按 (对局, 回合) 随机访问和批量采样
+
+存储目录包含:
+    records.dat   定长结构化记录（dtype 见 recordDtype），按对局连续存放，容量按倍数增长
+    games.npy     对局表：每局的 id、首条记录的偏移、回合数、最终得分、是否获胜
+    meta.json     地图文本、agent 数量、记录数等
+
+一条记录对应 GameStateData 的动态部分：分数、生命、连续吃鬼数、win/lose/本关完成标志，
+各 agent 的位置、方向、受惊与复活倒计时，以及按位压缩的食物和能量豆网格。
+地图是静态的，只在 meta.json 中保存一次；一个存储只对应一张地图和固定的 agent 数量。
+
+写入（通过 Game.exportInterface）:
+    store = TrajectoryStore.create('trajectories', layout, numAgents=5)
+    store.bindGame(game)             # 每局一个 TrajectoryRecorder，可以并发运行多局
+    game.run()
+    store.close()
+
+读取与采样:
+    store = TrajectoryStore.open('trajectories')
+    record = store.record(gameId, turn)          # 记录视图，不复制
+    state = store.state(gameId, turn)            # 还原为 GameState
+    sampler = TrajectorySampler(store, batchSize=256)
+    batch, nextBatch = sampler.sample()          # 写入复用的缓冲区
+
+用法:
+    python pacman.py -p GreedyAgent -q -n 20 --trajectories trajectories
+    python trajectoryStore.py trajectories
+"""
+import json
+import os
+import sys
+import threading
+
+from game import Configuration
+from game import Directions
+from game import Grid
+from game import ZobristTable
+import layout as layoutModule
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_WIN, _LOSE, _ROUND_COMPLETE = 1, 2, 4
+
+GAME_DTYPE = [('game', '<i8'), ('offset', '<i8'), ('length', '<i4'), ('score', '<f8'), ('win', '?')]
+
+
+def recordDtype(numAgents, width, height):
+    """一条记录的结构化 dtype（食物和能量豆网格按列展开，每格 1 位）"""
+    packed = (width * height + 7) // 8
+    return np.dtype([('game', '<i4'), ('turn', '<i4'), ('score', '<f8'),
+                     ('lives', '<i2'), ('ghostsEatenInRow', '<i2'), ('flags', 'u1'),
+                     ('positions', '<f4', (numAgents, 2)), ('directions', 'i1', (numAgents,)),
+                     ('scaredTimers', '<i2', (numAgents,)), ('respawnTimers', '<i2', (numAgents,)),
+                     ('food', 'u1', (packed,)), ('capsules', 'u1', (packed,))])
+
+
+class TrajectoryStore:
+    """
+    轨迹存储；用 create 新建（可写）或 open 打开已有的目录
+    """
+
+    def __init__(self, directory, meta, writable):
+        if np is None:
+            raise Exception("TrajectoryStore requires numpy (pip install numpy)")
+        self.directory = directory
+        self.meta = meta
+        self.writable = writable
+        self.layout = layoutModule.Layout(meta['layout'])
+        self.numAgents = meta['numAgents']
+        self.dtype = recordDtype(self.numAgents, self.layout.width, self.layout.height)
+        self.count = meta['count']
+        self.capacity = meta['capacity']
+        self._lock = threading.Lock()
+        games = os.path.join(directory, 'games.npy')
+        self.games = np.load(games) if os.path.exists(games) else np.zeros(0, dtype=GAME_DTYPE)
+        self._gameRows = dict((int(game), row) for row, game in enumerate(self.games['game']))
+        self._map()
+
+    def create(directory, layout, numAgents, capacity=4096):
+        """
+        新建存储
+        Args:
+            directory: 存储目录（不存在时创建，已有存储时报错）
+            layout: 对局使用的 Layout
+            numAgents: agent 数量（Pac-Man 加鬼）
+            capacity: 初始容量（记录数），写满后按倍数增长
+        """
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, 'meta.json')):
+            raise Exception("A trajectory store already exists in " + directory)
+        meta = {'layout': list(layout.layoutText), 'numAgents': numAgents, 'count': 0,
+                'capacity': max(1, int(capacity)), 'nextGame': 0}
+        dtype = recordDtype(numAgents, layout.width, layout.height)
+        with open(os.path.join(directory, 'records.dat'), 'wb') as f:
+            f.truncate(meta['capacity'] * dtype.itemsize)
+        store = TrajectoryStore(directory, meta, True)
+        store._writeMeta()
+        return store
+    create = staticmethod(create)
+
+    def open(directory, writable=False):
+        """打开已有的存储；writable 为 True 时可以继续追加对局"""
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        return TrajectoryStore(directory, meta, writable)
+    open = staticmethod(open)
+
+    def _map(self):
+        path = os.path.join(self.directory, 'records.dat')
+        self.records = np.memmap(path, dtype=self.dtype, mode='r+' if self.writable else 'r',
+                                 shape=(self.capacity,))
+
+    # ---------- 写入 ----------
+
+    def bindGame(self, game):
+        """为一局创建 TrajectoryRecorder 并设为 game.exportInterface"""
+        if list(game.state.data.layout.layoutText) != self.meta['layout']:
+            raise Exception("The game is played on a different layout than the store")
+        if len(game.state.data.agentStates) != self.numAgents:
+            raise Exception("The store holds %d agents per state, the game has %d"
+                            % (self.numAgents, len(game.state.data.agentStates)))
+        with self._lock:
+            gameId = self.meta['nextGame']
+            self.meta['nextGame'] += 1
+        recorder = TrajectoryRecorder(self, game, gameId)
+        game.exportInterface = recorder
+        return recorder
+
+    def encode(self, state, out, gameId=0, turn=0):
+        """把 GameState 的动态部分写入一条记录（out 为长度 1 的记录数组或单条记录视图）"""
+        data = state.data
+        layout = self.layout
+        out['game'] = gameId
+        out['turn'] = turn
+        out['score'] = data.score
+        out['lives'] = data.lives
+        out['ghostsEatenInRow'] = data.ghostsEatenInRow
+        out['flags'] = (_WIN if data._win else 0) | (_LOSE if data._lose else 0) \
+            | (_ROUND_COMPLETE if data._roundComplete else 0)
+        agentStates = data.agentStates
+        out['positions'] = [agentState.configuration.pos for agentState in agentStates]
+        out['directions'] = [Directions.INDEX[agentState.configuration.direction] for agentState in agentStates]
+        out['scaredTimers'] = [agentState.scaredTimer for agentState in agentStates]
+        out['respawnTimers'] = [agentState.respawnTimer for agentState in agentStates]
+        out['food'] = np.packbits(np.array(data.food.data, dtype=bool).ravel())
+        capsules = np.zeros(layout.width * layout.height, dtype=bool)
+        for x, y in data.capsules:
+            capsules[x * layout.height + y] = True
+        out['capsules'] = np.packbits(capsules)
+
+    def append(self, gameId, records, score, win):
+        """把一局的全部记录连续写入（由 TrajectoryRecorder 在对局结束时调用）"""
+        with self._lock:
+            offset = self.count
+            if offset + len(records) > self.capacity:
+                self._grow(offset + len(records))
+            self.records[offset:offset + len(records)] = records
+            self.count += len(records)
+            row = np.array([(gameId, offset, len(records), score, win)], dtype=GAME_DTYPE)
+            self._gameRows[gameId] = len(self.games)
+            self.games = np.concatenate([self.games, row])
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self.records.flush()
+        del self.records
+        with open(os.path.join(self.directory, 'records.dat'), 'r+b') as f:
+            f.truncate(capacity * self.dtype.itemsize)
+        self.capacity = capacity
+        self._map()
+
+    def flush(self):
+        """把记录、对局表和元数据写盘（读取方打开存储时只看到已 flush 的对局）"""
+        with self._lock:
+            self.records.flush()
+            with open(os.path.join(self.directory, 'games.npy.tmp'), 'wb') as f:
+                np.save(f, self.games)
+            os.replace(os.path.join(self.directory, 'games.npy.tmp'), os.path.join(self.directory, 'games.npy'))
+            self._writeMeta()
+
+    def _writeMeta(self):
+        self.meta['count'] = self.count
+        self.meta['capacity'] = self.capacity
+        path = os.path.join(self.directory, 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        if self.writable:
+            self.flush()
+        self.records = None
+
+    # ---------- 读取 ----------
+
+    def offset(self, gameId, turn):
+        """(对局, 回合) 对应的记录下标；回合 0 为初始状态"""
+        game = self.games[self._gameRows[gameId]]
+        if not 0 <= turn < game['length']:
+            raise IndexError("Game %d has no turn %d" % (gameId, turn))
+        return int(game['offset']) + turn
+
+    def record(self, gameId, turn):
+        return self.records[self.offset(gameId, turn)]
+
+    def trajectory(self, gameId):
+        """一局的全部记录（memmap 视图，不复制）"""
+        game = self.games[self._gameRows[gameId]]
+        return self.records[game['offset']:game['offset'] + game['length']]
+
+    def state(self, gameId, turn):
+        return self.decode(self.record(gameId, turn))
+
+    def decode(self, record):
+        """把一条记录还原为 GameState（可以继续调用 getLegalActions / generateSuccessor）"""
+        from pacman import GameState
+        layout = self.layout
+        cells = layout.width * layout.height
+        state = GameState()
+        state.initialize(layout, self.numAgents - 1)
+        data = state.data
+        for index, agentState in enumerate(data.agentStates):
+            x, y = record['positions'][index]
+            agentState.configuration = Configuration((float(x), float(y)),
+                                                     Directions.ORDER[record['directions'][index]])
+            agentState.scaredTimer = int(record['scaredTimers'][index])
+            agentState.respawnTimer = int(record['respawnTimers'][index])
+        food = np.unpackbits(record['food'], count=cells).astype(bool).reshape(layout.width, layout.height)
+        data.food = Grid(layout.width, layout.height, False)
+        data.food.data = food.tolist()
+        data._ownsFood = True
+        capsules = set((int(i) // layout.height, int(i) % layout.height)
+                       for i in np.flatnonzero(np.unpackbits(record['capsules'], count=cells)))
+        # 能量豆只会被吃掉或按地图重置，列表保持地图中的顺序
+        data.capsules = [pos for pos in layout.capsules if pos in capsules] + sorted(capsules - set(layout.capsules))
+        data.score = float(record['score'])
+        data.lives = int(record['lives'])
+        data.ghostsEatenInRow = int(record['ghostsEatenInRow'])
+        flags = int(record['flags'])
+        data._win = bool(flags & _WIN)
+        data._lose = bool(flags & _LOSE)
+        data._roundComplete = bool(flags & _ROUND_COMPLETE)
+        data._foodHash = ZobristTable.forLayout(layout).foodHash(data.food, data.capsules)
+        return state
+
+    def __len__(self):
+        return self.count
+
+    def __str__(self):
+        return '%d games, %d states (%s)' % (len(self.games), self.count, self.directory)
+
+
+class TrajectoryRecorder:
+    """
+    Game.exportInterface：在内存中攒下一局的记录，对局结束时整局连续写入存储
+    （多局并发运行时各局的记录不会交错）
+    """
+
+    def __init__(self, store, game, gameId):
+        self.store = store
+        self.game = game
+        self.gameId = gameId
+        self.records = np.zeros(64, dtype=store.dtype)
+        self.length = 0
+        self._add(game.state, 0)
+
+    def _add(self, state, turn):
+        if self.length == len(self.records):
+            self.records = np.concatenate([self.records, np.zeros(len(self.records), dtype=self.store.dtype)])
+        self.store.encode(state, self.records[self.length:self.length + 1], self.gameId, turn)
+        self.length += 1
+
+    def export_turn(self, state, turn):
+        self._add(state, turn)
+        return None, None
+
+    def finalize_game(self, score):
+        state = self.game.state
+        # 结束的那个回合不会经过 export_turn
+        self._add(state, self.game.numMoves + 1)
+        self.store.append(self.gameId, self.records[:self.length], score, state.isWin())
+        self.records = None
+
+
+class TrajectorySampler:
+    """
+    从存储中均匀随机采样 (状态, 下一状态) 记录对；结果写入预先分配并复用的缓冲区，
+    每次采样不分配新的数组
+    """
+
+    def __init__(self, store, batchSize, seed=None):
+        self.store = store
+        self.batchSize = batchSize
+        self.rng = np.random.default_rng(seed)
+        self.batch = np.zeros(batchSize, dtype=store.dtype)
+        self.nextBatch = np.zeros(batchSize, dtype=store.dtype)
+        self.refresh()
+
+    def refresh(self):
+        """存储追加了对局后调用：重新计算可采样的下标（每局最后一条记录没有下一状态）"""
+        games = self.store.games
+        starts = games['offset']
+        lengths = games['length'].astype(np.int64) - 1
+        self._valid = np.concatenate([np.arange(start, start + length) for start, length in zip(starts, lengths)]
+                                     + [np.zeros(0, dtype=np.int64)])
+        if not len(self._valid):
+            raise Exception("The trajectory store has no transitions to sample")
+
+    def sample(self, out=None, nextOut=None):
+        """
+        Args:
+            out, nextOut: 写入采样结果的记录数组（默认使用采样器自带的缓冲区，下一次采样会覆盖）
+        Returns:
+            (状态记录, 下一状态记录)
+        """
+        out = self.batch if out is None else out
+        nextOut = self.nextBatch if nextOut is None else nextOut
+        indices = self._valid[self.rng.integers(0, len(self._valid), len(out))]
+        np.take(self.store.records, indices, out=out)
+        np.take(self.store.records, indices + 1, out=nextOut)
+        return out, nextOut
+
+
+def main(argv):
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='查看轨迹存储并测试采样速度')
+    parser.add_argument('directory', help='存储目录')
+    parser.add_argument('-b', '--batchSize', type=int, default=256, help='采样批大小（默认: 256）')
+    args = parser.parse_args(argv)
+
+    store = TrajectoryStore.open(args.directory)
+    games = store.games
+    print('%d games, %d states, %d bytes per state' % (len(games), len(store), store.dtype.itemsize))
+    if len(games):
+        print('wins: %d, mean score %.1f, mean length %.1f'
+              % (games['win'].sum(), games['score'].mean(), games['length'].mean()))
+        sampler = TrajectorySampler(store, args.batchSize)
+        start = time.perf_counter()
+        for i in range(100):
+            sampler.sample()
+        elapsed = time.perf_counter() - start
+        print('sample: %.3fms per batch of %d' % (elapsed * 10.0, args.batchSize))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
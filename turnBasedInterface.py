@@ -5,6 +5,7 @@
 import pickle
 import os
 import graphicsUtils
+import observations
 import time
 import random
 import shutil
@@ -13,14 +14,17 @@ from datetime import datetime
 class TurnBasedInterface:
     """回合制游戏接口，用于导出截图和状态"""
     
-    def __init__(self, output_dir="turn_based_output", game_id=None):
+    def __init__(self, output_dir="turn_based_output", game_id=None, state_format='pkl'):
         """
         初始化接口
         Args:
             output_dir: 基础输出目录
             game_id: 游戏ID，如果为None则使用临时ID（游戏结束时根据得分重命名）
+            state_format: export_turn 导出状态的格式，'pkl'、'json' 或 'snapshot'（见 export_state）
         """
         self.base_output_dir = output_dir
+        self.state_format = state_format
+        self._layout = None  # load_state 还原快照时共用的地图
         
         # 生成临时游戏ID（如果未提供）
         if game_id is None:
@@ -185,7 +189,8 @@ class TurnBasedInterface:
         Args:
             game_state: GameState对象
             turn: 回合数，如果为None则使用内部计数器
-            format: 导出格式，'pkl'（Python pickle，完整对象）或 'json'（JSON，仅关键信息）
+            format: 导出格式，'pkl'（Python pickle，完整对象）、'json'（JSON，仅关键信息）
+                    或 'snapshot'（GameState.to_snapshot 的紧凑二进制，地图只保存一次）
         Returns:
             状态文件路径
         """
@@ -204,6 +209,22 @@ class TurnBasedInterface:
             except Exception as e:
                 print(f"状态导出错误: {e}")
                 return None
+        elif format == 'snapshot':
+            # 使用快照格式：每回合只保存动态部分（几百字节），地图在 layout.lay 中只保存一次
+            # 优点：文件小，加载快，所有回合共用一个 Layout
+            # 缺点：只能由 GameState.from_snapshot 读取
+            filename = os.path.join(self.state_dir, f"state_{turn:06d}.snap")
+            try:
+                layout_path = os.path.join(self.state_dir, "layout.lay")
+                if not os.path.exists(layout_path):
+                    with open(layout_path, 'w', encoding='utf-8') as f:
+                        f.write('\n'.join(game_state.data.layout.layoutText))
+                with open(filename, 'wb') as f:
+                    f.write(game_state.to_snapshot())
+                return filename
+            except Exception as e:
+                print(f"快照导出错误: {e}")
+                return None
         elif format == 'json':
             # 使用JSON格式：只保存关键信息（人类可读）
             # 优点：人类可读，可以被其他语言读取
@@ -229,7 +250,7 @@ class TurnBasedInterface:
                 print(f"JSON状态导出错误: {e}")
                 return None
         else:
-            print(f"不支持的格式: {format}，使用 'pkl' 或 'json'")
+            print(f"不支持的格式: {format}，使用 'pkl'、'json' 或 'snapshot'")
             return None
     
     def export_turn(self, game_state, turn=None):
@@ -246,23 +267,37 @@ class TurnBasedInterface:
             self.turn_count += 1
         
         screenshot_path = self.export_screenshot(turn)
-        state_path = self.export_state(game_state, turn)
+        state_path = self.export_state(game_state, turn, self.state_format)
         
         return (screenshot_path, state_path)
     
     def load_state(self, turn):
         """
-        加载指定回合的游戏状态
+        加载指定回合的游戏状态（快照优先；同一局的所有状态共用一个 Layout）
         Args:
             turn: 回合数
         Returns:
             GameState对象
         """
+        from pacman import GameState
+        snapshot = os.path.join(self.state_dir, f"state_{turn:06d}.snap")
         filename = os.path.join(self.state_dir, f"state_{turn:06d}.pkl")
         try:
+            if os.path.exists(snapshot):
+                with open(snapshot, 'rb') as f:
+                    return GameState.from_snapshot(f.read(), self._snapshot_layout())
             with open(filename, 'rb') as f:
-                return pickle.load(f)
+                state = pickle.load(f)
+            # pickle 中带有一份地图副本：换成共享的实例，副本随即释放
+            state.data.layout = observations.internLayout(state.data.layout)
+            return state
         except Exception as e:
             print(f"状态加载错误: {e}")
             return None
 
+    def _snapshot_layout(self):
+        if self._layout is None:
+            with open(os.path.join(self.state_dir, "layout.lay"), encoding='utf-8') as f:
+                self._layout = observations.internLayout(observations.decodeLayout(f.read().encode('utf-8')))
+        return self._layout
+
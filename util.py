@@ -522,7 +522,10 @@ def flipCoin( p ):
     return r < p
 
 def chooseFromDistribution( distribution ):
-    "Takes either a counter or a list of (prob, key) pairs and samples"
+    "Takes either a counter, a game.ActionDistribution or a list of (prob, key) pairs and samples"
+    if hasattr(distribution, 'sample'):
+        # game.ActionDistribution：定长数组上的累积概率采样，不需要排序
+        return distribution.sample()
     if type(distribution) == dict or type(distribution) == Counter:
         return sample(distribution)
     r = random.random()
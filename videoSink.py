@@ -0,0 +1,386 @@
+"""
+视频输出：用 Pillow 在内存中离屏渲染每一帧，直接追加写入一个动画文件，不经过窗口截图
+
+VideoSink 实现了显示接口（initialize / update / redrawState / finish），可以替代
+PacmanGraphics 传给 Game、ReplayEngine.play 或 RealtimeGame：
+
+    sink = VideoSink('game.gif', fps=10, stride=2)
+    game = rules.newGame(layout, pacman, ghosts, sink)
+    game.run()
+
+- 每一轮（Pac-Man 和所有存活的鬼各走一步）输出一帧，stride 为每隔多少轮输出一帧
+- .gif 由 Pillow 逐帧编码后追加写入文件（所有帧共用一个固定调色板）；其他扩展名
+  （.mp4 / .webm 等）把原始 RGB 帧通过管道交给本机的 ffmpeg 编码
+- 帧写出后即丢弃，内存占用与对局长度无关
+
+用法:
+    python pacman.py -p GreedyAgent --video game.gif --videoStride 2
+    python replay.py recorded-game-1 --video game.mp4
+"""
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+
+import graphicsDisplay
+from graphicsDisplay import (BACKGROUND_COLOR, WALL_COLOR, FOOD_COLOR, CAPSULE_COLOR, PACMAN_COLOR,
+                             GHOST_COLORS, TEAM_COLORS, SCARED_COLOR, INFO_PANE_HEIGHT, GHOST_SHAPE, GHOST_SIZE,
+                             PACMAN_SCALE, FOOD_WIDTH_SCALE, FOOD_HEIGHT_SCALE, CAPSULE_WIDTH_SCALE,
+                             CAPSULE_HEIGHT_SCALE)
+
+try:
+    from PIL import Image, ImageChops, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+WHITE = '#ffffff'
+BLACK = '#000000'
+
+
+class FrameRenderer:
+    """
+    离屏渲染器：与 PacmanGraphics 使用相同的配色和几何尺寸，把 GameStateData 画成一张调色板图片。
+    墙只在创建时画一次，之后每帧在其副本上绘制食物、能量豆、agent 和分数。
+    """
+
+    def __init__(self, layout, zoom=0.5):
+        if Image is None:
+            raise Exception("Video output requires Pillow (pip install Pillow)")
+        # 借用 PacmanGraphics 的坐标换算和墙体合并（不打开窗口）
+        display = graphicsDisplay.PacmanGraphics(zoom)
+        display.layout = layout
+        display.width = layout.width
+        display.height = layout.height
+        self.display = display
+        boardHeight = (layout.height + 1) * display.gridHeight
+        # ffmpeg 的 yuv420p 要求宽高为偶数
+        self.width = _even((layout.width + 1) * display.gridWidth)
+        self.height = _even(boardHeight + INFO_PANE_HEIGHT)
+        self.scoreOrigin = (int(display.gridWidth), int(boardHeight))
+
+        colors = [BACKGROUND_COLOR, WALL_COLOR, FOOD_COLOR, CAPSULE_COLOR, PACMAN_COLOR, SCARED_COLOR,
+                  WHITE, BLACK] + GHOST_COLORS + TEAM_COLORS
+        self.colors = {}
+        palette = []
+        for color in colors:
+            if color not in self.colors:
+                self.colors[color] = len(self.colors)
+                palette.extend(int(color[i:i + 2], 16) for i in (1, 3, 5))
+        self.palette = palette
+
+        self.board = Image.new('P', (self.width, self.height), 0)
+        self.board.putpalette(palette)
+        draw = ImageDraw.Draw(self.board)
+        for (x0, y0, x1, y1), wallColor in display.wallRectangles(layout.walls):
+            left, top, _, _ = self._box((x0, y1), 0.5, 0.5)
+            _, _, right, bottom = self._box((x1, y0), 0.5, 0.5)
+            draw.rectangle((left, top, right - 1, bottom - 1), fill=self.colors[wallColor])
+        try:
+            self.font = ImageFont.load_default(size=max(10, int(INFO_PANE_HEIGHT * 0.6)))
+        except TypeError:
+            self.font = ImageFont.load_default()
+
+    def _box(self, cell, widthScale, heightScale):
+        x, y = self.display.to_screen(cell)
+        halfWidth = widthScale * self.display.gridWidth
+        halfHeight = heightScale * self.display.gridHeight
+        return (int(round(x - halfWidth)), int(round(y - halfHeight)),
+                int(round(x + halfWidth)), int(round(y + halfHeight)))
+
+    def render(self, state):
+        """
+        Args:
+            state: GameStateData
+        Returns:
+            'P' 模式的 PIL 图片（调色板见 self.palette）
+        """
+        display = self.display
+        colors = self.colors
+        image = self.board.copy()
+        draw = ImageDraw.Draw(image)
+        foodColor = colors[FOOD_COLOR]
+        for xNum, column in enumerate(state.food):
+            for yNum, cell in enumerate(column):
+                if cell:
+                    x0, y0, x1, y1 = self._box((xNum, yNum), FOOD_WIDTH_SCALE, FOOD_HEIGHT_SCALE)
+                    draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=foodColor)
+        for capsule in state.capsules:
+            x0, y0, x1, y1 = self._box(capsule, CAPSULE_WIDTH_SCALE, CAPSULE_HEIGHT_SCALE)
+            draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=colors[CAPSULE_COLOR])
+
+        for index, agentState in enumerate(state.agentStates):
+            if agentState.configuration is None or agentState.respawnTimer > 0:
+                continue
+            if agentState.isPacman:
+                self._drawPacman(draw, agentState)
+            else:
+                self._drawGhost(draw, agentState, index)
+
+        lives = getattr(state, 'lives', None)
+        score = "SCORE: % 4d" % state.score if lives is None else "SCORE: % 4d  LIVES: %d" % (state.score, lives)
+        draw.text(self.scoreOrigin, score, fill=colors[PACMAN_COLOR], font=self.font)
+        return image
+
+    def _drawPacman(self, draw, agentState):
+        display = self.display
+        position = agentState.getPosition()
+        x, y = display.to_screen(position)
+        radiusX = PACMAN_SCALE * display.gridWidth
+        radiusY = PACMAN_SCALE * display.gridHeight
+        e = list(display.getEndpoints(agentState.getDirection(), position))
+        while e[0] > e[1]: e[1] = e[1] + 360
+        # Tk 的角度逆时针、Pillow 的角度顺时针
+        draw.pieslice((x - radiusX, y - radiusY, x + radiusX, y + radiusY), -e[1], -e[0],
+                      fill=self.colors[PACMAN_COLOR])
+
+    def _drawGhost(self, draw, agentState, index):
+        display = self.display
+        x, y = display.to_screen(agentState.getPosition())
+        width, height = display.gridWidth * GHOST_SIZE, display.gridHeight * GHOST_SIZE
+        color = SCARED_COLOR if agentState.scaredTimer > 0 else GHOST_COLORS[index % len(GHOST_COLORS)]
+        draw.polygon([(px * width + x, py * height + y) for px, py in GHOST_SHAPE], fill=self.colors[color])
+
+        dx, dy = {'North': (0, -0.2), 'South': (0, 0.2), 'East': (0.2, 0), 'West': (-0.2, 0)}.get(
+            agentState.getDirection(), (0, 0))
+        eyeRadius = min(display.gridWidth, display.gridHeight) * GHOST_SIZE * 0.2
+        pupilRadius = min(display.gridWidth, display.gridHeight) * GHOST_SIZE * 0.08
+        for side in (-0.3, 0.3):
+            _circle(draw, (x + width * (side + dx / 1.5), y - height * (0.3 - dy / 1.5)), eyeRadius,
+                    self.colors[WHITE])
+            _circle(draw, (x + width * (side + dx), y - height * (0.3 - dy)), pupilRadius, self.colors[BLACK])
+
+
+def _circle(draw, center, radius, fill):
+    x, y = center
+    draw.ellipse((x - radius - 1, y - radius - 1, x + radius, y + radius), fill=fill)
+
+
+def _even(value):
+    value = int(round(value))
+    return value + (value & 1)
+
+
+class GifWriter:
+    """
+    逐帧追加写入的 GIF：每帧单独用 Pillow 编码，只保留第一帧的文件头（全局调色板、循环设置），
+    之后的帧只追加图形控制扩展和图像数据。除第一帧外每帧只编码与上一帧不同的矩形区域。
+    """
+
+    def __init__(self, path, fps):
+        self.file = open(path, 'wb')
+        self.duration = max(20, int(round(1000.0 / fps)))
+        self.frames = 0
+        self.previous = None
+
+    def write(self, image):
+        left, top = 0, 0
+        frame = image
+        if self.previous is not None:
+            # 按颜色下标（而不是换算后的亮度）比较，找到变化的区域
+            bbox = ImageChops.difference(_indices(self.previous), _indices(image)).getbbox() or (0, 0, 1, 1)
+            left, top = bbox[0], bbox[1]
+            frame = image.crop(bbox)
+        self.previous = image
+        buffer = io.BytesIO()
+        frame.save(buffer, 'GIF', duration=self.duration, loop=0, optimize=False)
+        header, data = _splitGif(buffer.getvalue(), (left, top))
+        if self.frames == 0:
+            self.file.write(header)
+        self.file.write(data)
+        self.frames += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.write(b'\x3b')  # trailer
+            self.file.close()
+            self.file = None
+
+
+def _indices(image):
+    "调色板图片的颜色下标，作为 'L' 图片"
+    return Image.frombytes('L', image.size, image.tobytes())
+
+
+def _splitGif(data, offset=(0, 0)):
+    """
+    把 Pillow 写出的单帧 GIF 拆为 (文件头, 帧数据)，并把图像块的位置改为 offset
+    文件头包括签名、逻辑屏幕描述、全局调色板和应用扩展（循环次数），帧数据包括其余扩展和图像块
+    """
+    flags = data[10]
+    position = 13
+    if flags & 0x80:
+        position += 3 << ((flags & 7) + 1)
+    header = bytearray(data[:position])
+    frame = bytearray()
+    while position < len(data) and data[position] != 0x3b:
+        start = position
+        if data[position] == 0x21:
+            label = data[position + 1]
+            position = _skipSubBlocks(data, position + 2)
+            (header if label == 0xff else frame).extend(data[start:position])
+        elif data[position] == 0x2c:
+            packed = data[position + 9]
+            position += 10
+            if packed & 0x80:
+                position += 3 << ((packed & 7) + 1)
+            position = _skipSubBlocks(data, position + 1)  # 跳过 LZW 最小码长
+            block = bytearray(data[start:position])
+            struct.pack_into('<HH', block, 1, offset[0], offset[1])
+            frame.extend(block)
+        else:
+            raise ValueError("Unexpected GIF block 0x%02x" % data[position])
+    return bytes(header), bytes(frame)
+
+
+def _skipSubBlocks(data, position):
+    while data[position]:
+        position += data[position] + 1
+    return position + 1
+
+
+class FfmpegWriter:
+    """把原始 RGB 帧通过管道交给本机的 ffmpeg 编码（.mp4 / .webm 等）"""
+
+    def __init__(self, path, fps, size):
+        executable = shutil.which('ffmpeg')
+        if executable is None:
+            raise Exception("Writing %s requires ffmpeg on PATH; use a .gif file instead" % path)
+        width, height = size
+        self.process = subprocess.Popen(
+            [executable, '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+             '-s', '%dx%d' % (width, height), '-r', '%g' % fps, '-i', '-', '-pix_fmt', 'yuv420p', path],
+            stdin=subprocess.PIPE)
+        self.frames = 0
+
+    def write(self, image):
+        self.process.stdin.write(image.convert('RGB').tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+
+def openVideoWriter(path, fps, size):
+    """按扩展名选择编码方式：.gif 用 Pillow，其余交给 ffmpeg"""
+    if os.path.splitext(path)[1].lower() == '.gif':
+        return GifWriter(path, fps)
+    return FfmpegWriter(path, fps, size)
+
+
+class VideoSink:
+    """
+    把对局渲染为一个动画文件的显示（见模块说明）
+    """
+
+    def __init__(self, path, fps=10.0, stride=1, zoom=0.5, quiet=False):
+        """
+        Args:
+            path: 输出文件；同一个 VideoSink 用于多局时，第 n 局（n > 1）的文件名加上 -n 后缀
+            fps: 动画的帧率
+            stride: 每隔多少轮输出一帧
+            zoom: 与 PacmanGraphics 相同的缩放比例
+            quiet: 结束时是否不打印输出信息
+        """
+        self.path = path
+        self.fps = float(fps)
+        self.stride = max(1, int(stride))
+        self.zoom = zoom
+        self.quiet = quiet
+        self.games = 0
+        self.renderer = None
+        self.writer = None
+        self.pending = None
+
+    def checkNullDisplay(self):
+        return True
+
+    def initialize(self, state, isBlue=False):
+        self.games += 1
+        path = self.path
+        if self.games > 1:
+            root, extension = os.path.splitext(path)
+            path = '%s-%d%s' % (root, self.games, extension)
+        self.currentPath = path
+        if self.renderer is None or self.renderer.display.layout is not state.layout:
+            self.renderer = FrameRenderer(state.layout, self.zoom)
+        self.writer = openVideoWriter(path, self.fps, (self.renderer.width, self.renderer.height))
+        self.rounds = 0
+        self.pending = None
+        self._emit(state)
+
+    def update(self, state):
+        # Pac-Man 移动时上一轮结束：输出上一轮结束时的画面
+        if state._agentMoved == 0 and self.pending is not None:
+            self.rounds += 1
+            if self.rounds % self.stride == 0:
+                self._emit(self.pending)
+        self.pending = state
+
+    def redrawState(self, state):
+        # 回放跳帧：调用方已经按自己的间隔跳过了中间帧
+        self._emit(state)
+        self.pending = None
+
+    def _emit(self, state):
+        self.writer.write(self.renderer.render(state))
+
+    def finish(self):
+        if self.writer is None:
+            return
+        if self.pending is not None:
+            self._emit(self.pending)
+            self.pending = None
+        frames = self.writer.frames
+        self.writer.close()
+        self.writer = None
+        if not self.quiet:
+            print("Video: %d frames written to %s" % (frames, self.currentPath))
+
+    def pause(self):
+        pass
+
+    def draw(self, state):
+        pass
+
+    def updateDistributions(self, dist):
+        pass
+
+    def drawExpandedCells(self, cells):
+        pass
+
+    def drawValues(self, values):
+        pass
+
+
+def main(argv):
+    import argparse
+    import layout as layoutModule
+    from pacman import ClassicGameRules
+    from ghostAgents import DirectionalGhost
+    from simpleAgents import GreedyAgent
+    parser = argparse.ArgumentParser(description='把一局（贪心 Pac-Man 对 DirectionalGhost）直接渲染为动画文件')
+    parser.add_argument('output', help='输出文件（.gif，或需要 ffmpeg 的 .mp4 / .webm）')
+    parser.add_argument('-l', '--layout', default='map_0', help='地图名称（默认: map_0）')
+    parser.add_argument('-g', '--ghosts', type=int, default=4, help='Ghost 数量（默认: 4）')
+    parser.add_argument('--fps', type=float, default=10.0, help='帧率（默认: 10）')
+    parser.add_argument('--stride', type=int, default=1, help='每隔多少轮输出一帧（默认: 1）')
+    parser.add_argument('-z', '--zoom', type=float, default=0.5, help='缩放比例（默认: 0.5）')
+    args = parser.parse_args(argv)
+
+    layout = layoutModule.getLayout(args.layout)
+    if layout is None:
+        raise Exception("The layout " + args.layout + " cannot be found")
+    sink = VideoSink(args.output, args.fps, args.stride, args.zoom)
+    game = ClassicGameRules().newGame(layout, GreedyAgent(), [DirectionalGhost(i + 1) for i in range(args.ghosts)],
+                                      sink, quiet=True)
+    game.run()
+    print("Score: %d  Turns: %d" % (game.state.getScore(), game.numMoves))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])